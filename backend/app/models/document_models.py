@@ -1,6 +1,6 @@
-from sqlalchemy import Column, String, DateTime, Integer, Text, ForeignKey, CheckConstraint
+from sqlalchemy import Column, String, DateTime, Integer, Text, ForeignKey, CheckConstraint, LargeBinary, Index
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from app.database import Base
 import enum
 import uuid
@@ -15,6 +15,14 @@ class ContentFormat(enum.Enum):
     html = "html"
     plain = "plain"
 
+class StorageFormat(enum.Enum):
+    full = "full"    # content 为完整文本（关键帧）
+    delta = "delta"  # content 为相对 diff_from 版本的差分
+
+class ContentCodec(enum.Enum):
+    plain = "plain"  # 存储内容在 content 列中
+    zlib = "zlib"    # 存储内容压缩后在 content_blob 列中，compression_dict_id 非空时使用共享字典
+
 class Document(Base):
     __tablename__ = "documents"
     
@@ -27,6 +35,12 @@ class Document(Base):
     created_at = Column(DateTime, nullable=False, server_default=func.now())
     updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
     deleted_at = Column(DateTime, nullable=True)
+    version_counter = Column(Integer, nullable=False, default=0, server_default="0")  # 已分配的最大版本号（含已删除的版本）
+    
+    # 按 (updated_at, id) 游标分页列出用户的文档
+    __table_args__ = (
+        Index("idx_documents_user_type_updated", "user_id", "type", "updated_at", "id"),
+    )
     
     # 关系
     user = relationship("User", back_populates="documents")
@@ -42,6 +56,13 @@ class DocumentVersion(Base):
     content = Column(Text, nullable=False)
     content_format = Column(String, nullable=False, default=ContentFormat.markdown.value)
     diff_from = Column(String, ForeignKey("document_versions.id"), nullable=True)
+    storage_format = Column(String, nullable=False, default=StorageFormat.full.value, server_default=StorageFormat.full.value)
+    delta_depth = Column(Integer, nullable=False, default=0, server_default="0")  # 距最近关键帧的差分层数
+    content_codec = Column(String, nullable=False, default=ContentCodec.plain.value, server_default=ContentCodec.plain.value)
+    content_blob = deferred(Column(LargeBinary, nullable=True))  # 仅在读取内容时加载
+    compression_dict_id = Column(Integer, ForeignKey("compression_dictionaries.id"), nullable=True)
+    content_length = Column(Integer, nullable=True)  # 完整（未压缩、未差分）文本的字符数
+    content_preview = Column(String, nullable=True)  # 完整文本的开头部分，列表展示时无需还原全文
     checksum_sha256 = Column(String, nullable=True)
     created_by = Column(String, ForeignKey("users.id"), nullable=True)
     created_at = Column(DateTime, nullable=False, server_default=func.now())
@@ -51,10 +72,20 @@ class DocumentVersion(Base):
     
     # 添加约束检查
     __table_args__ = (
-        CheckConstraint("length(content) <= 50000", name="chk_content_len"),
+        CheckConstraint("content_length IS NULL OR content_length <= 50000", name="chk_content_len"),
+        Index("idx_doc_versions_doc_num", "document_id", "version_number"),
     )
     
     # 关系
     document = relationship("Document", back_populates="versions", foreign_keys=[document_id])
     created_by_user = relationship("User", back_populates="document_versions", foreign_keys=[created_by])
-    diff_from_version = relationship("DocumentVersion", remote_side=[id], foreign_keys=[diff_from]) 
\ No newline at end of file
+    diff_from_version = relationship("DocumentVersion", remote_side=[id], foreign_keys=[diff_from]) 
+
+class CompressionDictionary(Base):
+    __tablename__ = "compression_dictionaries"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    codec = Column(String, nullable=False, default=ContentCodec.zlib.value)
+    data = Column(LargeBinary, nullable=False)
+    sample_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
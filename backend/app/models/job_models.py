@@ -0,0 +1,39 @@
+from sqlalchemy import Column, String, DateTime, Integer, Text, Index
+from sqlalchemy.sql import func
+from app.database import Base
+from datetime import datetime
+import enum
+import uuid
+
+class JobKind(enum.Enum):
+    personal_statement = "personal_statement"
+    recommendation = "recommendation"
+    evaluation = "evaluation"
+
+class JobStatus(enum.Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    kind = Column(String, nullable=False)
+    payload_hash = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default=JobStatus.queued.value)
+    result = Column(Text, nullable=True)  # JSON as string for SQLite
+    error = Column(Text, nullable=True)
+    error_status = Column(Integer, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    # 去重窗口按应用的 datetime.utcnow() 计算，创建时间也由应用写入，避免数据库时区不同造成偏差
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, server_default=func.now())
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_generation_jobs_dedup", "kind", "payload_hash"),
+        Index("ix_generation_jobs_status", "status", "created_at"),
+    )
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, String, DateTime, Integer, Text, UniqueConstraint
+from sqlalchemy.sql import func
+from app.database import Base
+import enum
+
+class ParseCacheKeyType(enum.Enum):
+    pdf = "pdf"    # PDF 文件内容的 SHA-256
+    text = "text"  # 规范化后提取文本的 SHA-256
+
+class ParsedResumeCache(Base):
+    __tablename__ = "parsed_resume_cache"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    key_type = Column(String, nullable=False)
+    content_hash = Column(String(64), nullable=False)
+    workflow_version = Column(String, nullable=False)
+    result = Column(Text, nullable=False)  # JSON as string for SQLite
+    hit_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    last_hit_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("key_type", "content_hash", "workflow_version", name="uq_parsed_resume_cache_key"),
+    )
@@ -40,6 +40,10 @@ class UserInDB(BaseModel):
 class TextInput(BaseModel):
     text: str = Field(..., min_length=1)
 
+# 批量文本处理（优化/扩写/缩写）
+class BatchTextInput(BaseModel):
+    texts: List[str] = Field(..., min_length=1)
+
 # 新增：用于接收文本和Prompt的模型
 class PromptTextInput(BaseModel):
     text: str
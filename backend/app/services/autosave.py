@@ -0,0 +1,233 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database import SessionLocal
+from app.services.document_save import current_version_number, save_content
+from app.services.version_store import VersionConflictError
+
+logger = logging.getLogger("cv-agent-autosave")
+
+# (文档所有者 id, 文档类型)
+AutosaveKey = Tuple[str, str]
+
+# 重试也不会成功的写入错误（内容违反约束、用户不存在等），遇到时直接丢弃缓冲内容
+NON_RETRYABLE_ERRORS = (IntegrityError, DataError)
+
+
+@dataclass
+class _Pending:
+    content: str
+    base: int  # 最近一次缓冲时文档的版本计数，写入时作为前置条件
+    since: float  # 窗口开始时间（time.monotonic）
+    saves: int = 1
+    attempts: int = 0  # 已失败的写入次数
+
+
+def autosave_metadata(saves: int = 1) -> str:
+    """自动保存版本的 version_metadata：来源与合并的保存次数。"""
+    return json.dumps({"source": "autosave", "coalesced": saves})
+
+
+class AutosaveCoalescer:
+    """
+    自动保存的写后合并：同一 (用户, 文档类型) 在窗口期内的多次自动保存只在内存中保留最新内容，
+    窗口结束时写入一个版本（version_metadata 记为 source=autosave）。手动保存与添加版本会丢弃缓冲内容（其内容更新），
+    读取该文档前、以及应用停止时写入全部缓冲内容。缓冲仅在当前进程内，多 worker 部署时各自合并。
+
+    同一文档的缓冲与写入（窗口结束写入与手动保存）按分段锁串行，避免较早的缓冲内容在手动保存之后提交。
+    缓冲时记下文档的版本计数，写入时以此为前置条件：期间文档已有新版本（如其他 worker 上的手动保存）时丢弃缓冲内容。
+    """
+
+    def __init__(
+        self,
+        window: float = 300.0,
+        max_pending: int = 10000,
+        max_attempts: int = 5,
+        enabled: bool = True,
+        stripes: int = 64,
+    ):
+        self.window = window
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.enabled = enabled
+        self._pending: Dict[AutosaveKey, _Pending] = {}
+        self._lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+        self._task: Optional[asyncio.Task] = None
+        self.buffered = 0
+        self.flushed = 0
+        self.superseded = 0
+        self.overflow = 0
+        self.failures = 0
+        self.dropped = 0
+        self.stale = 0
+
+    def _stripe(self, key: AutosaveKey) -> threading.Lock:
+        return self._stripes[hash(key) % len(self._stripes)]
+
+    @contextmanager
+    def exclusive(self, owner_id: str, doc_type: str) -> Iterator[Optional[_Pending]]:
+        """持有该文档的写入锁，并取走其缓冲内容（没有时为 None）。"""
+        key = (owner_id, doc_type)
+        with self._stripe(key):
+            with self._lock:
+                pending = self._pending.pop(key, None)
+            yield pending
+
+    def buffer(self, db: Session, owner_id: str, doc_type: str, content: str) -> bool:
+        """缓冲一次自动保存。返回 False 表示未缓冲（未启用或缓冲已满），调用方应直接写入。"""
+        if not self.enabled:
+            return False
+        key = (owner_id, doc_type)
+        # 持有写入锁读取版本计数，避免读取后、缓冲前写入了本进程较早的缓冲内容
+        with self._stripe(key):
+            base = current_version_number(db, owner_id, doc_type)
+            with self._lock:
+                pending = self._pending.get(key)
+                if pending is None:
+                    if len(self._pending) >= self.max_pending:
+                        self.overflow += 1
+                        return False
+                    self._pending[key] = _Pending(content, base, time.monotonic())
+                else:
+                    pending.content = content
+                    pending.base = base
+                    pending.saves += 1
+                self.buffered += 1
+        return True
+
+    @contextmanager
+    def superseding(self, owner_id: str, doc_type: str) -> Iterator[None]:
+        """
+        持有该文档的写入锁，期间写入的内容取代缓冲中的自动保存（手动保存、添加版本）。
+        写入抛出异常（如前置条件不满足）时放回缓冲内容。
+        """
+        with self.exclusive(owner_id, doc_type) as pending:
+            try:
+                yield
+            except BaseException:
+                if pending is not None:
+                    with self._lock:
+                        self._pending.setdefault((owner_id, doc_type), pending)
+                raise
+            if pending is not None:
+                self.superseded += pending.saves
+
+    def save_now(
+        self,
+        db: Session,
+        owner_id: str,
+        doc_type: str,
+        content: str,
+        expected: Optional[int] = None,
+        version_metadata: str = "{}",
+    ):
+        """
+        立即保存（手动保存，或无法缓冲的自动保存）。该文档缓冲中的自动保存被这次保存的内容取代，不再写入。
+        返回值同 save_content。
+        """
+        with self.superseding(owner_id, doc_type):
+            return save_content(db, owner_id, doc_type, content, expected, version_metadata)
+
+    # --- 写入 ---
+    def _write(self, key: AutosaveKey, pending: _Pending) -> bool:
+        """写入缓冲内容，返回是否成功。失败时放回缓冲下一轮重试，不可重试的错误或达到重试上限时丢弃。"""
+        db = SessionLocal()
+        try:
+            save_content(db, key[0], key[1], pending.content, pending.base, autosave_metadata(pending.saves))
+            self.flushed += 1
+            return True
+        except VersionConflictError as e:
+            # 缓冲后文档已有更新的版本：缓冲内容已过时，丢弃
+            db.rollback()
+            self.stale += pending.saves
+            logger.info("文档在缓冲后已更新至版本 %s，丢弃自动保存：%s", e.current, key)
+            return False
+        except Exception as e:
+            db.rollback()
+            self.failures += 1
+            pending.attempts += 1
+            if isinstance(e, NON_RETRYABLE_ERRORS) or pending.attempts >= self.max_attempts:
+                self.dropped += pending.saves
+                logger.exception("写入自动保存失败（第 %s 次），丢弃缓冲内容：%s", pending.attempts, key)
+                return False
+            logger.warning("写入自动保存失败（第 %s 次），稍后重试：%s：%s", pending.attempts, key, e)
+            # 期间没有新的自动保存时放回缓冲，下一轮重试
+            with self._lock:
+                self._pending.setdefault(key, pending)
+            return False
+        finally:
+            db.close()
+
+    def flush(self, owner_id: str, doc_type: str) -> bool:
+        """立即写入该文档的缓冲内容（如读取文档前），返回是否有内容写入成功。"""
+        if not self._pending:
+            return False
+        with self.exclusive(owner_id, doc_type) as pending:
+            if pending is None:
+                return False
+            return self._write((owner_id, doc_type), pending)
+
+    def flush_due(self, force: bool = False) -> int:
+        """写入窗口已结束（force 时为全部）的缓冲内容，返回写入成功的文档数。"""
+        now = time.monotonic()
+        with self._lock:
+            due = [key for key, p in self._pending.items() if force or now - p.since >= self.window]
+        return sum(self.flush(*key) for key in due)
+
+    # --- 后台任务 ---
+    async def start(self) -> None:
+        if self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台任务并写入全部缓冲内容。"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._pending:
+            written = await run_in_threadpool(self.flush_due, True)
+            logger.info("停止前写入 %s 个文档的自动保存", written)
+
+    async def _run(self) -> None:
+        tick = max(0.1, min(self.window / 4, 5.0))
+        while True:
+            await asyncio.sleep(tick)
+            try:
+                await run_in_threadpool(self.flush_due)
+            except Exception:
+                logger.exception("写入自动保存失败")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "window": self.window,
+            "pending": len(self._pending),
+            "buffered": self.buffered,
+            "flushed": self.flushed,
+            "superseded": self.superseded,
+            "overflow": self.overflow,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "stale": self.stale,
+        }
+
+
+autosave_coalescer = AutosaveCoalescer(
+    window=settings.AUTOSAVE_WINDOW,
+    max_pending=settings.AUTOSAVE_MAX_PENDING,
+    max_attempts=settings.AUTOSAVE_MAX_ATTEMPTS,
+    enabled=settings.AUTOSAVE_COALESCE_ENABLED,
+)
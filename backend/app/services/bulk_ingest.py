@@ -0,0 +1,117 @@
+import asyncio
+import os
+import zipfile
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.services.uploads import SpooledUpload, SpoolWriter, UploadRejectedError, PDF_MAGIC
+
+# 批量条目：(文件名, 打开函数)。打开函数把条目写入临时文件并返回，调用方负责 cleanup()
+BulkItem = Tuple[str, Callable[[], Awaitable[SpooledUpload]]]
+
+
+def _is_pdf_entry(info: zipfile.ZipInfo) -> bool:
+    name = info.filename
+    if info.is_dir() or name.startswith("__MACOSX/") or os.path.basename(name).startswith("."):
+        return False
+    return name.lower().endswith(".pdf")
+
+
+def list_zip_pdfs(zip_path: str) -> List[zipfile.ZipInfo]:
+    """
+    列出 ZIP 中的 PDF 条目，并按声明的大小做防 ZIP 炸弹检查：
+    条目数、单个文件解压后大小、解压后总大小、压缩比均有上限，超限时抛出 UploadRejectedError。
+    """
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            infos = [info for info in archive.infolist() if _is_pdf_entry(info)]
+    except zipfile.BadZipFile:
+        raise UploadRejectedError("无效的ZIP文件。", 400)
+
+    if not infos:
+        raise UploadRejectedError("ZIP中没有PDF文件。", 400)
+    if len(infos) > settings.BULK_PARSE_MAX_FILES:
+        raise UploadRejectedError(f"单次最多处理 {settings.BULK_PARSE_MAX_FILES} 个文件。", 413)
+    total = 0
+    for info in infos:
+        if info.flag_bits & 0x1:
+            raise UploadRejectedError(f"不支持加密的ZIP条目：{info.filename}", 400)
+        if info.file_size > settings.UPLOAD_MAX_BYTES:
+            raise UploadRejectedError(f"文件过大：{info.filename}", 413)
+        if info.compress_size and info.file_size / info.compress_size > settings.BULK_PARSE_MAX_COMPRESSION_RATIO:
+            raise UploadRejectedError(f"压缩比异常：{info.filename}", 413)
+        total += info.file_size
+    if total > settings.BULK_PARSE_MAX_TOTAL_BYTES:
+        raise UploadRejectedError("ZIP解压后总大小超过上限。", 413)
+    return infos
+
+
+def extract_zip_entry(zip_path: str, info: zipfile.ZipInfo) -> SpooledUpload:
+    """
+    把单个 ZIP 条目解压到临时文件。实际解压字节数按声明大小限制，
+    防止伪造文件头中的大小绕过 list_zip_pdfs 的检查。
+    """
+    writer = SpoolWriter(min(info.file_size, settings.UPLOAD_MAX_BYTES), PDF_MAGIC)
+    try:
+        with zipfile.ZipFile(zip_path) as archive, archive.open(info) as entry:
+            while True:
+                chunk = entry.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+    except zipfile.BadZipFile as e:
+        writer.abort()
+        raise UploadRejectedError(f"ZIP条目损坏：{e}", 400)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.finish(info.filename)
+
+
+def zip_items(zip_path: str, infos: List[zipfile.ZipInfo]) -> List[BulkItem]:
+    return [
+        (info.filename, lambda info=info: run_in_threadpool(extract_zip_entry, zip_path, info))
+        for info in infos
+    ]
+
+
+async def run_bulk(
+    items: List[BulkItem],
+    process: Callable[[SpooledUpload], Awaitable[Any]],
+    concurrency: int,
+    on_error: Callable[[Exception], Tuple[str, Optional[int]]],
+) -> AsyncIterator[dict]:
+    """
+    以受限并发处理批量条目，每完成一个即产出 {"index", "filename", "result"}，
+    失败时为 {"index", "filename", "error", "status_code"}。
+
+    条目在轮到处理时才写入临时文件，处理完立即删除，磁盘与内存占用与并发数成正比；
+    迭代被中断（客户端断开）时取消尚未完成的条目。
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    pending = iter(enumerate(items))
+
+    async def worker():
+        for index, (filename, open_item) in pending:
+            line = {"index": index, "filename": filename}
+            spooled = None
+            try:
+                spooled = await open_item()
+                line["result"] = await process(spooled)
+            except Exception as e:
+                line["error"], line["status_code"] = on_error(e)
+            finally:
+                if spooled is not None:
+                    spooled.cleanup()
+            await queue.put(line)
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, len(items))))]
+    try:
+        for _ in range(len(items)):
+            yield await queue.get()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
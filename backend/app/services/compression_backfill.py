@@ -0,0 +1,113 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.database import SessionLocal
+from app.models import document_models
+from app.services.version_store import PREVIEW_CHARS, VersionStore, version_store
+
+logger = logging.getLogger("cv-agent-compression")
+
+
+class CompressionBackfill:
+    """
+    后台把压缩功能启用前写入的版本转换为压缩存储，并补齐 content_length 与 content_preview。
+
+    以 content_length 为空标识未处理的旧版本（新版本写入时总会填写），每批处理 batch_size 行后
+    休眠 interval 秒，避免与在线请求争抢数据库；全部处理完后任务自行结束。
+    启动时加载最新的压缩字典，尚无字典且样本足够时先训练一个。
+    """
+
+    def __init__(self, store: VersionStore, batch_size: int = 200, interval: float = 1.0, enabled: bool = True):
+        self.store = store
+        self.batch_size = batch_size
+        self.interval = interval
+        self.enabled = enabled
+        self._task: Optional[asyncio.Task] = None
+        self.converted = 0
+        self.batches = 0
+        self.finished = False
+
+    async def start(self) -> None:
+        if not self.store.compressor.enabled:
+            return
+        try:
+            await run_in_threadpool(self.prepare_dictionary)
+        except Exception:
+            logger.exception("加载压缩字典失败")
+        if self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def prepare_dictionary(self) -> Optional[int]:
+        db = SessionLocal()
+        try:
+            dict_id = self.store.compressor.load_active_dictionary(db)
+            if dict_id is None:
+                dict_id = self.store.compressor.train(db)
+                if dict_id is not None:
+                    logger.info("已训练压缩字典 %s", dict_id)
+            return dict_id
+        finally:
+            db.close()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                converted = await run_in_threadpool(self.convert_batch)
+            except Exception:
+                # 同一批会反复失败，停止任务等待人工处理（可用 migrate_db.py --compress 重跑）
+                logger.exception("转换历史版本失败，后台转换已停止")
+                return
+            if converted == 0:
+                self.finished = True
+                logger.info("历史版本压缩转换完成，共 %s 行", self.converted)
+                return
+            await asyncio.sleep(self.interval)
+
+    def convert_batch(self) -> int:
+        """处理一批未转换的旧版本，返回处理的行数。"""
+        db = SessionLocal()
+        try:
+            rows = db.query(document_models.DocumentVersion).filter(
+                document_models.DocumentVersion.content_length.is_(None)
+            ).order_by(document_models.DocumentVersion.id).limit(self.batch_size).all()
+            for row in rows:
+                content = self.store.get_content(db, row)
+                row.content_length = len(content)
+                row.content_preview = content[:PREVIEW_CHARS]
+                if row.content_codec == document_models.ContentCodec.plain.value:
+                    for key, value in self.store.compress_fields(row.content).items():
+                        setattr(row, key, value)
+            db.commit()
+            self.converted += len(rows)
+            self.batches += 1
+            return len(rows)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.store.compressor.stats(),
+            "backfill_converted": self.converted,
+            "backfill_finished": self.finished,
+        }
+
+
+compression_backfill = CompressionBackfill(
+    version_store,
+    batch_size=settings.VERSION_COMPRESSION_BACKFILL_BATCH,
+    interval=settings.VERSION_COMPRESSION_BACKFILL_INTERVAL,
+    enabled=settings.VERSION_COMPRESSION_BACKFILL,
+)
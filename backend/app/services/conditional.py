@@ -0,0 +1,44 @@
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Response
+
+
+def make_etag(*parts: Any) -> str:
+    """由决定响应内容的各部分生成强 ETag。"""
+    material = "\x1f".join("" if p is None else str(p) for p in parts)
+    return '"' + hashlib.sha256(material.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否命中（支持 "*"、逗号分隔的多个值与 W/ 前缀）。"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def if_match_version(if_match: Optional[str]) -> Optional[int]:
+    """
+    解析保存请求的 If-Match：值为客户端编辑所基于的版本号（如 "7"，可带 W/ 前缀）。
+    缺省或为 "*" 时返回 None（不做检查），格式不合法时抛出 ValueError。
+    """
+    if not if_match or if_match.strip() == "*":
+        return None
+    value = if_match.strip().removeprefix("W/").strip('"')
+    if not value.isdigit():
+        raise ValueError(f"Invalid If-Match: {if_match}")
+    return int(value)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+
+def set_etag(response: Response, etag: str) -> None:
+    """响应可被缓存，但每次使用前须携带 If-None-Match 重新验证。"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
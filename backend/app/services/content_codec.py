@@ -0,0 +1,151 @@
+import threading
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database import SessionLocal
+from app.models import document_models
+
+# zlib 的窗口为 32KB，更长的字典没有意义
+MAX_DICTIONARY_SIZE = 32 * 1024
+
+
+def train_dictionary(samples: Iterable[str], size: int = MAX_DICTIONARY_SIZE) -> bytes:
+    """
+    从样本文档中训练 zlib 预设字典：取在多份样本中重复出现的行，
+    按 (出现次数 × 长度) 排序，价值最高的放在字典末尾（离待压缩数据最近，回溯距离最短）。
+    """
+    document_freq: Counter = Counter()
+    for sample in samples:
+        document_freq.update({line for line in sample.splitlines(keepends=True) if len(line.strip()) >= 4})
+    candidates = [(count * len(line.encode("utf-8")), line) for line, count in document_freq.items() if count >= 2]
+    candidates.sort(reverse=True)
+    chosen, used = [], 0
+    for _, line in candidates:
+        data = line.encode("utf-8")
+        if used + len(data) > size:
+            continue
+        chosen.append(data)
+        used += len(data)
+    return b"".join(reversed(chosen))
+
+
+class ContentCompressor:
+    """
+    版本存储内容的压缩与解压。
+
+    不足 min_size 的内容不压缩；不超过 dict_max_size 的小文档使用共享的预设字典（若已训练），
+    其余使用普通 zlib。压缩后不比原文小时保持明文。字典不可变，按 id 缓存在内存中。
+    """
+
+    def __init__(self, enabled: bool = False, level: int = 6, min_size: int = 256, dict_max_size: int = 8192):
+        self.enabled = enabled
+        self.level = level
+        self.min_size = min_size
+        self.dict_max_size = dict_max_size
+        self._dictionaries: Dict[int, bytes] = {}
+        self._active_dict_id: Optional[int] = None
+        self._lock = threading.Lock()
+        self.compressed = 0
+        self.decompressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    # --- 字典 ---
+    def load_active_dictionary(self, db: Session) -> Optional[int]:
+        """加载最新训练的字典作为压缩时使用的字典。"""
+        row = db.query(document_models.CompressionDictionary).order_by(
+            document_models.CompressionDictionary.id.desc()
+        ).first()
+        if row is not None:
+            with self._lock:
+                self._dictionaries[row.id] = row.data
+                self._active_dict_id = row.id
+        return self._active_dict_id
+
+    def train(self, db: Session, sample_limit: int = 500) -> Optional[int]:
+        """从最近的完整版本中采样训练新字典并设为当前字典，样本不足时返回 None。"""
+        rows = db.query(document_models.DocumentVersion).filter(
+            document_models.DocumentVersion.storage_format == document_models.StorageFormat.full.value,
+            document_models.DocumentVersion.content_codec == document_models.ContentCodec.plain.value,
+        ).order_by(document_models.DocumentVersion.created_at.desc()).limit(sample_limit).all()
+        if len(rows) < 10:
+            return None
+        data = train_dictionary(row.content for row in rows)
+        if not data:
+            return None
+        dictionary = document_models.CompressionDictionary(
+            codec=document_models.ContentCodec.zlib.value, data=data, sample_count=len(rows)
+        )
+        db.add(dictionary)
+        db.commit()
+        with self._lock:
+            self._dictionaries[dictionary.id] = data
+            self._active_dict_id = dictionary.id
+        return dictionary.id
+
+    def _dictionary(self, dict_id: int) -> bytes:
+        data = self._dictionaries.get(dict_id)
+        if data is None:
+            db = SessionLocal()
+            try:
+                row = db.query(document_models.CompressionDictionary).filter(
+                    document_models.CompressionDictionary.id == dict_id
+                ).first()
+            finally:
+                db.close()
+            if row is None:
+                raise ValueError(f"压缩字典 {dict_id} 不存在")
+            data = row.data
+            with self._lock:
+                self._dictionaries[dict_id] = data
+        return data
+
+    # --- 压缩 ---
+    def compress(self, payload: str) -> Optional[Tuple[bytes, Optional[int]]]:
+        """返回 (压缩数据, 字典 id)；不值得压缩时返回 None。"""
+        if not self.enabled:
+            return None
+        raw = payload.encode("utf-8")
+        if len(raw) < self.min_size:
+            return None
+        dict_id = self._active_dict_id if len(raw) <= self.dict_max_size else None
+        if dict_id is not None:
+            compressor = zlib.compressobj(self.level, zdict=self._dictionary(dict_id))
+        else:
+            compressor = zlib.compressobj(self.level)
+        blob = compressor.compress(raw) + compressor.flush()
+        if len(blob) >= len(raw):
+            return None
+        self.compressed += 1
+        self.bytes_in += len(raw)
+        self.bytes_out += len(blob)
+        return blob, dict_id
+
+    def decompress(self, blob: bytes, dict_id: Optional[int] = None) -> str:
+        if dict_id is not None:
+            decompressor = zlib.decompressobj(zdict=self._dictionary(dict_id))
+        else:
+            decompressor = zlib.decompressobj()
+        self.decompressed += 1
+        return (decompressor.decompress(blob) + decompressor.flush()).decode("utf-8")
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "enabled": self.enabled,
+            "active_dictionary": self._active_dict_id,
+            "compressed": self.compressed,
+            "decompressed": self.decompressed,
+            "ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else None,
+        }
+
+
+content_compressor = ContentCompressor(
+    enabled=settings.VERSION_COMPRESSION_ENABLED,
+    level=settings.VERSION_COMPRESSION_LEVEL,
+    min_size=settings.VERSION_COMPRESSION_MIN_SIZE,
+    dict_max_size=settings.VERSION_COMPRESSION_DICT_MAX_SIZE,
+)
@@ -1,35 +1,327 @@
-
-
-import requests
+import asyncio
+import httpx
 import json
-from typing import Dict, Any
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, AsyncIterator, Iterable
 from urllib.parse import urlparse, urlunparse
 from app.core.config import settings
+from app.services.llm_cache import LLMResponseCache, LRUTTLCache, SQLiteCacheTier, make_cache_key
+from app.services.resilience import Bulkhead, BulkheadFullError, CircuitBreaker, CircuitOpenError, retry_async
+from app.services.singleflight import SingleFlight
+
+logger = logging.getLogger("cv-agent-dify")
+
+# 说明 Dify 暂不可用（计入熔断失败、向前端返回 503）的上游状态码
+UNAVAILABLE_STATUS_CODES = {429, 502, 503, 504}
+
+
+class DifyServiceError(Exception):
+    """
+    调用 Dify 失败。status_code 为应返回给前端的 HTTP 状态码：
+    503 表示 Dify 暂不可用（熔断、限流、连接失败、5xx），504 表示超时，
+    502 表示 Dify 返回了无法使用的响应。
+    """
+
+    def __init__(self, message: str, status_code: int = 503, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def load_statement_json(statement_text: str) -> Dict[str, Any]:
+    """将 Dify 返回的个人陈述（JSON 字符串）解析为 dict。"""
+    # 清理可能存在的 ```json ``` 包裹（如果有）
+    clean = statement_text
+    if clean.startswith("```"):
+        clean = clean.strip("`").strip("json").strip()
+    return json.loads(clean)
+
+
+def _is_retryable(exc: Exception) -> bool:
+    """
+    chat-messages 的 POST 不是幂等的，只重试确定没有被处理的请求：连接阶段的错误、429，
+    以及带 Retry-After 的 503（明确拒绝处理）。502/504、读超时和连接中断时 Dify 可能已在生成，不重试。
+    """
+    if isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    if not isinstance(exc, httpx.HTTPStatusError):
+        return False
+    code = exc.response.status_code
+    return code == 429 or (code == 503 and "retry-after" in exc.response.headers)
+
+
+def _is_upstream_failure(exc: Exception) -> bool:
+    """是否说明 Dify 本身不健康（计入熔断器失败次数）。"""
+    if isinstance(exc, (httpx.TransportError, DifyServiceError)):
+        return True
+    return isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code in UNAVAILABLE_STATUS_CODES
 
 
 class DifyClient:
     """
     Dify API 客户端，封装了对Dify各项功能的调用。
+
+    基于 httpx.AsyncClient 的原生异步实现：所有请求共享同一个连接池（keep-alive），
+    避免每次调用都重新进行 TCP/TLS 握手，也不再占用 starlette 的线程池线程。
     """
 
-    def __init__(self, base_url: str, api_keys: Dict[str, str], timeout: int = 120):
+    # 各工作流调用 Dify 时使用的 user 标识
+    WORKFLOW_USERS = {
+        'parse': 'resume-parser-user',
+        'rewrite': 'rewrite-user',
+        'expand': 'expand-user',
+        'contract': 'contract-user',
+        'process_text': 'process-text-user',
+        'personal_statement': 'statement-user',
+        'recommendation': 'recommendation-user',
+        'prompt_based': 'prompt-based-user',
+    }
+
+    def __init__(
+        self,
+        base_url: str,
+        api_keys: Dict[str, str],
+        timeout: float = 120,
+        connect_timeout: float = 10,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30,
+        cache: Optional[LLMResponseCache] = None,
+        cached_workflows: Iterable[str] = (),
+        single_flight: bool = True,
+        retry_attempts: int = 2,
+        retry_base_delay: float = 0.5,
+        retry_max_delay: float = 8,
+        breaker_failure_threshold: int = 5,
+        breaker_reset_timeout: float = 30,
+        bulkhead_default_limit: int = 16,
+        bulkhead_limits: Optional[Dict[str, int]] = None,
+        bulkhead_queue_timeout: float = 10,
+    ):
         # 解析传入的URL，并只保留 scheme 和 netloc (例如 'http://localhost:8681')
         parsed_url = urlparse(base_url)
         self.base_url = urlunparse((parsed_url.scheme, parsed_url.netloc, '', '', '', ''))
 
         self.api_keys = api_keys
         self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        # 客户端只访问 Dify 一个主机，因此连接池上限即为对该主机的连接上限
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self.cache = cache
+        self.cached_workflows = set(cached_workflows)
+        self.single_flight = SingleFlight() if single_flight else None
+        self.retry_attempts = retry_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.retries = 0
+        self.retry_reasons: Dict[str, int] = {}
+        # 每个工作流密钥各自拥有熔断器和舱壁，一个慢工作流不会拖垮其他工作流
+        bulkhead_limits = bulkhead_limits or {}
+        self._breakers = {
+            name: CircuitBreaker(name, breaker_failure_threshold, breaker_reset_timeout) for name in api_keys
+        }
+        self._bulkheads = {
+            name: Bulkhead(name, bulkhead_limits.get(name, bulkhead_default_limit), bulkhead_queue_timeout)
+            for name in api_keys
+        }
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """懒加载共享的 AsyncClient，保证它在应用的事件循环中创建。"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                limits=self.limits,
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """关闭连接池，在应用关闭时调用。"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    def _headers(self, key_name: str) -> Dict[str, str]:
+        return {
+            'Authorization': f"Bearer {self.api_keys[key_name]}",
+            'Content-Type': 'application/json'
+        }
 
-    def _post(self, path: str, key_name: str, payload: Dict[str, Any]) -> requests.Response:
+    async def _post(self, path: str, key_name: str, payload: Dict[str, Any]) -> httpx.Response:
         """
         一个通用的POST请求方法。
         """
-        url = f"{self.base_url}{path}"
-        headers = {
-            'Authorization': f"Bearer {self.api_keys[key_name]}",
-            'Content-Type': 'application/json'
+        return await self._get_client().post(path, headers=self._headers(key_name), json=payload)
+
+    def _to_service_error(self, key_name: str, exc: Exception) -> DifyServiceError:
+        if isinstance(exc, httpx.TimeoutException) and not isinstance(exc, (httpx.ConnectTimeout, httpx.PoolTimeout)):
+            return DifyServiceError(f"调用Dify {key_name} 接口超时", 504)
+        if isinstance(exc, httpx.HTTPStatusError):
+            code = exc.response.status_code
+            if code in UNAVAILABLE_STATUS_CODES:
+                return DifyServiceError(f"Dify {key_name} 服务暂不可用: HTTP {code}", 503)
+            return DifyServiceError(f"调用Dify {key_name} 接口失败: HTTP {code}", 502)
+        if _is_upstream_failure(exc):
+            return DifyServiceError(f"Dify {key_name} 服务暂不可用: {exc}", 503)
+        return DifyServiceError(f"调用Dify {key_name} 接口失败: {exc}", 502)
+
+    def ensure_available(self, key_name: str) -> None:
+        """熔断器打开时直接抛出 503，供流式接口在开始响应前快速失败。"""
+        breaker = self._breakers[key_name]
+        if breaker.is_open():
+            raise DifyServiceError(
+                f"Dify {key_name} 服务暂不可用，请稍后重试", 503, retry_after=breaker.retry_after()
+            )
+
+    @asynccontextmanager
+    async def _guard(self, key_name: str, hold_slot: bool = True):
+        """
+        按工作流的熔断器 + 舱壁保护一次上游调用，并把异常统一转换为 DifyServiceError。
+        hold_slot=False 时不占用舱壁名额，由调用方在每次尝试时自行获取（重试的退避等待期间不占名额）。
+        """
+        breaker = self._breakers[key_name]
+        try:
+            breaker.before_call()
+        except CircuitOpenError as e:
+            raise DifyServiceError(f"Dify {key_name} 服务暂不可用: {e}", 503, retry_after=e.retry_after)
+        try:
+            if hold_slot:
+                async with self._bulkheads[key_name].acquire():
+                    yield
+            else:
+                yield
+        except BulkheadFullError as e:
+            breaker.record_ignored()
+            raise DifyServiceError(str(e), 503, retry_after=1)
+        except (asyncio.CancelledError, GeneratorExit):
+            breaker.record_ignored()
+            raise
+        except Exception as e:
+            if _is_upstream_failure(e):
+                breaker.record_failure()
+            else:
+                breaker.record_ignored()
+            if isinstance(e, DifyServiceError):
+                raise
+            raise self._to_service_error(key_name, e) from e
+        else:
+            breaker.record_success()
+
+    def _count_retry(self, attempt: int, exc: Exception) -> None:
+        """retry_async 每次重试前调用：按原因（状态码或异常类型）计数。"""
+        reason = f"HTTP {exc.response.status_code}" if isinstance(exc, httpx.HTTPStatusError) else type(exc).__name__
+        self.retries += 1
+        self.retry_reasons[reason] = self.retry_reasons.get(reason, 0) + 1
+        logger.warning("调用 Dify 失败（%s），第 %s 次重试", reason, attempt)
+
+    def _cache_key(self, key_name: str, query: str, inputs: Optional[Dict[str, Any]]) -> Optional[str]:
+        """返回本次调用的缓存键；该工作流不参与缓存时返回 None。"""
+        if self.cache is None or key_name not in self.cached_workflows:
+            return None
+        return make_cache_key(key_name, query, inputs)
+
+    async def _chat(
+        self, key_name: str, query: str, inputs: Optional[Dict[str, Any]] = None, use_cache: bool = True
+    ) -> Optional[str]:
+        """以 blocking 模式调用 /v1/chat-messages，返回 'answer' 字段（可能为 None）。"""
+        # use_cache=False 时跳过读取，但新结果仍会写回缓存
+        cache_key = self._cache_key(key_name, query, inputs)
+        if cache_key is not None and use_cache:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        if self.single_flight is None:
+            return await self._fetch_answer(key_name, query, inputs, cache_key)
+        # 相同 工作流+请求内容 的并发调用合并为一次上游请求
+        fingerprint = cache_key or make_cache_key(key_name, query, inputs)
+        return await self.single_flight.do(
+            fingerprint, lambda: self._fetch_answer(key_name, query, inputs, cache_key)
+        )
+
+    async def _fetch_answer(
+        self, key_name: str, query: str, inputs: Optional[Dict[str, Any]], cache_key: Optional[str]
+    ) -> Optional[str]:
+        """实际发起上游请求，成功的回答写入缓存。"""
+        payload = {
+            "inputs": inputs or {},
+            "query": query,
+            "response_mode": "blocking",
+            "user": self.WORKFLOW_USERS[key_name],
+        }
+
+        async def attempt() -> httpx.Response:
+            async with self._bulkheads[key_name].acquire():
+                response = await self._post('/v1/chat-messages', key_name, payload)
+            response.raise_for_status()
+            return response
+
+        async with self._guard(key_name, hold_slot=False):
+            response = await retry_async(
+                attempt,
+                self.retry_attempts,
+                self.retry_base_delay,
+                self.retry_max_delay,
+                should_retry=_is_retryable,
+                on_retry=self._count_retry,
+            )
+            answer = response.json().get('answer')
+        if cache_key is not None and answer:
+            await self.cache.set(cache_key, answer)
+        return answer
+
+    async def stream_chat(
+        self, key_name: str, query: str, inputs: Optional[Dict[str, Any]] = None, use_cache: bool = True
+    ) -> AsyncIterator[str]:
+        """
+        以 streaming 模式调用 /v1/chat-messages，逐段产出 answer 文本。
+
+        迭代器被关闭或所在任务被取消时，`async with` 会关闭上游连接，
+        Dify 端随之停止生成。命中缓存时一次性产出完整回答；
+        完整读完的回答会写入缓存。流式调用同样受熔断器和舱壁保护，
+        但已开始输出后不会重试。
+        """
+        # use_cache=False 时跳过读取，但新结果仍会写回缓存
+        cache_key = self._cache_key(key_name, query, inputs)
+        if cache_key is not None and use_cache:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        parts = []
+        payload = {
+            "inputs": inputs or {},
+            "query": query,
+            "response_mode": "streaming",
+            "user": self.WORKFLOW_USERS[key_name],
         }
-        return requests.post(url, headers=headers, json=payload, timeout=self.timeout)
+        client = self._get_client()
+        async with self._guard(key_name):
+            async with client.stream('POST', '/v1/chat-messages', headers=self._headers(key_name), json=payload) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if not data:
+                        continue
+                    event = json.loads(data)
+                    kind = event.get("event")
+                    if kind in ("message", "agent_message"):
+                        if event.get("answer"):
+                            parts.append(event["answer"])
+                            yield event["answer"]
+                    elif kind == "message_end":
+                        break
+                    elif kind == "error":
+                        raise DifyServiceError(f"调用Dify {key_name} 流式接口失败: {event.get('message')}", 502)
+        if cache_key is not None and parts:
+            await self.cache.set(cache_key, "".join(parts))
 
     def _clean_response(self, text: str) -> str:
         """清理Dify返回的字符串，移除Markdown代码块标记。"""
@@ -37,74 +329,93 @@ class DifyClient:
             text = text.strip()[7:-3].strip()
         return text
 
-    def parse_text(self, text: str) -> Dict[str, Any]:
+    async def parse_text(self, text: str, use_cache: bool = True) -> Dict[str, Any]:
         """调用Dify解析文本，返回结构化JSON。"""
-        payload = {"inputs": {}, "query": text, "response_mode": "blocking", "user": "resume-parser-user"}
+        answer = await self._chat('parse', text, use_cache=use_cache) or '{}'
         try:
-            response = self._post('/v1/chat-messages', 'parse', payload)
-            response.raise_for_status()
-            answer = response.json().get('answer', '{}')
             cleaned_answer = self._clean_response(answer)
             return json.loads(cleaned_answer)
         except Exception as e:
             return {"error": f"调用Dify解析接口失败: {e}"}
 
-    def _call_text_modification_api(self, key_name: str, text: str, user: str) -> str:
-        """调用文本修改类API（改写、扩写、缩写）的通用方法。"""
-        payload = {"inputs": {}, "query": text, "response_mode": "blocking", "user": user}
-        try:
-            response = self._post('/v1/chat-messages', key_name, payload)
-            response.raise_for_status()
-            return response.json().get('answer', 'Dify未能返回有效结果。')
-        except Exception as e:
-            return f"调用Dify {key_name} 接口失败: {e}"
+    async def _call_text_modification_api(self, key_name: str, text: str, use_cache: bool = True) -> str:
+        """调用文本修改类API（改写、扩写、缩写）的通用方法。失败时抛出 DifyServiceError。"""
+        return await self._chat(key_name, text, use_cache=use_cache) or 'Dify未能返回有效结果。'
 
-    def rewrite_text(self, text: str) -> str:
-        return self._call_text_modification_api('rewrite', text, 'rewrite-user')
+    async def rewrite_text(self, text: str, use_cache: bool = True) -> str:
+        return await self._call_text_modification_api('rewrite', text, use_cache)
 
-    def expand_text(self, text: str) -> str:
-        return self._call_text_modification_api('expand', text, 'expand-user')
+    async def expand_text(self, text: str, use_cache: bool = True) -> str:
+        return await self._call_text_modification_api('expand', text, use_cache)
 
-    def contract_text(self, text: str) -> str:
-        return self._call_text_modification_api('contract', text, 'contract-user')
+    async def contract_text(self, text: str, use_cache: bool = True) -> str:
+        return await self._call_text_modification_api('contract', text, use_cache)
 
-    def process_json_as_text(self, text: str) -> str:
-        return self._call_text_modification_api('process_text', text, 'process-text-user')
+    async def process_json_as_text(self, text: str, use_cache: bool = True) -> str:
+        return await self._call_text_modification_api('process_text', text, use_cache)
 
-    def generate_statement(self, text: str) -> str:
-        return self._call_text_modification_api('personal_statement', text, 'statement-user')
+    async def generate_statement(self, text: str, use_cache: bool = True) -> str:
+        return await self._call_text_modification_api('personal_statement', text, use_cache)
 
-    def generate_recommendation(self, text: str) -> Dict[str, Any]:
+    async def generate_recommendation(self, text: str, use_cache: bool = True) -> Dict[str, Any]:
         """调用Dify生成推荐信，期望返回一个包含Markdown的JSON结构。"""
-        payload = {"inputs": {}, "query": text, "response_mode": "blocking", "user": "recommendation-user"}
+        # 假设Dify的'answer'字段本身就是一个JSON字符串
+        answer = await self._chat('recommendation', text, use_cache=use_cache) or '{}'
         try:
-            response = self._post('/v1/chat-messages', 'recommendation', payload)
-            response.raise_for_status()
-            # 假设Dify的'answer'字段本身就是一个JSON字符串
-            answer = response.json().get('answer', '{}')
             return json.loads(self._clean_response(answer))
         except Exception as e:
             return {"error": f"调用Dify推荐信接口失败: {e}"}
 
-    def generate_with_prompt(self, text: str, prompt: str) -> str:
+    async def generate_with_prompt(self, text: str, prompt: str, use_cache: bool = True) -> str:
         """
         调用Dify，将前端传入的 'prompt' 放入 Dify 的 'inputs.prompt'，
         将前端传入的 'text' 放入 Dify 的 'query'。
         """
-        payload = {
-            "inputs": {"prompt": prompt},  # 'prompt' 字段进入 inputs
-            "query": text,                 # 'text' 字段进入 query (sys.query)
-            "response_mode": "blocking",
-            "user": "prompt-based-user"
+        # 'prompt' 字段进入 inputs，'text' 字段进入 query (sys.query)
+        # 假设此功能也使用 'prompt_based' 的密钥
+        answer = await self._chat('prompt_based', text, inputs={"prompt": prompt}, use_cache=use_cache)
+        return answer or 'Dify未能返回有效结果。'
+
+    def stats(self) -> Dict[str, Any]:
+        """客户端运行指标。"""
+        return {
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "single_flight": self.single_flight.stats() if self.single_flight is not None else None,
+            "retries": self.retries,
+            "retry_reasons": dict(self.retry_reasons),
+            "circuit_breakers": {name: b.stats() for name, b in self._breakers.items()},
+            "bulkheads": {name: b.stats() for name, b in self._bulkheads.items()},
         }
-        try:
-            # 假设此功能也使用 'prompt_based' 的密钥
-            response = self._post('/v1/chat-messages', 'prompt_based', payload)
-            response.raise_for_status()
-            return response.json().get('answer', 'Dify未能返回有效结果。')
-        except Exception as e:
-            return f"调用Dify prompt-based接口失败: {e}"
 
 
-# 创建一个全局的Dify客户端实例
-dify_client = DifyClient(settings.DIFY_API_URL, settings.DIFY_API_KEYS)
\ No newline at end of file
+def _build_cache() -> Optional[LLMResponseCache]:
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    disk = None
+    if settings.LLM_CACHE_SQLITE_PATH:
+        disk = SQLiteCacheTier(settings.LLM_CACHE_SQLITE_PATH, ttl=settings.LLM_CACHE_TTL)
+    memory = LRUTTLCache(max_entries=settings.LLM_CACHE_MAX_ENTRIES, ttl=settings.LLM_CACHE_TTL)
+    return LLMResponseCache(memory, disk, purge_interval=settings.LLM_CACHE_PURGE_INTERVAL)
+
+
+# 创建一个全局的Dify客户端实例（共享连接池）
+dify_client = DifyClient(
+    settings.DIFY_API_URL,
+    settings.DIFY_API_KEYS,
+    timeout=settings.DIFY_TIMEOUT,
+    connect_timeout=settings.DIFY_CONNECT_TIMEOUT,
+    max_connections=settings.DIFY_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.DIFY_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=settings.DIFY_KEEPALIVE_EXPIRY,
+    cache=_build_cache(),
+    cached_workflows=settings.LLM_CACHE_WORKFLOWS,
+    single_flight=settings.DIFY_SINGLE_FLIGHT_ENABLED,
+    retry_attempts=settings.DIFY_RETRY_ATTEMPTS,
+    retry_base_delay=settings.DIFY_RETRY_BASE_DELAY,
+    retry_max_delay=settings.DIFY_RETRY_MAX_DELAY,
+    breaker_failure_threshold=settings.DIFY_BREAKER_FAILURE_THRESHOLD,
+    breaker_reset_timeout=settings.DIFY_BREAKER_RESET_TIMEOUT,
+    bulkhead_default_limit=settings.DIFY_BULKHEAD_DEFAULT_LIMIT,
+    bulkhead_limits=settings.DIFY_BULKHEAD_LIMITS,
+    bulkhead_queue_timeout=settings.DIFY_BULKHEAD_QUEUE_TIMEOUT,
+)
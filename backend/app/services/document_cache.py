@@ -0,0 +1,186 @@
+import logging
+import select
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database import engine
+from app.models import document_models
+from app.services.llm_cache import LRUTTLCache
+from app.services.version_store import version_store
+
+logger = logging.getLogger("cv-agent-document-cache")
+
+
+def _cache_key(owner_id: str, doc_type: str) -> str:
+    return f"{owner_id}:{doc_type}"
+
+
+class PgNotifyChannel:
+    """
+    基于 Postgres LISTEN/NOTIFY 的跨 worker 失效通知：publish 发出缓存键，
+    各进程的监听线程收到后调用 on_message 丢弃本地条目。
+    """
+
+    def __init__(self, engine: Engine, channel: str = "document_cache"):
+        self.engine = engine
+        self.channel = channel
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self.published = 0
+        self.received = 0
+
+    def publish(self, key: str) -> None:
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :key)"), {"channel": self.channel, "key": key})
+        self.published += 1
+
+    def start(self, on_message: Callable[[str], None]) -> None:
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._listen, args=(on_message,), name="document-cache-listen", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _listen(self, on_message: Callable[[str], None]) -> None:
+        while not self._stopped.is_set():
+            try:
+                raw = self.engine.raw_connection()
+                try:
+                    conn = raw.driver_connection
+                    conn.autocommit = True
+                    conn.cursor().execute(f"LISTEN {self.channel}")
+                    while not self._stopped.is_set():
+                        if select.select([conn], [], [], 1.0)[0]:
+                            conn.poll()
+                            while conn.notifies:
+                                self.received += 1
+                                on_message(conn.notifies.pop(0).payload)
+                finally:
+                    raw.invalidate()
+            except Exception:
+                # 连接断开期间可能漏掉通知，清空本地缓存后重连
+                logger.exception("文档缓存失效通知监听中断，重连")
+                on_message("*")
+                self._stopped.wait(5)
+
+
+class CurrentDocumentCache:
+    """
+    用户每类文档的当前文档（元数据与当前版本内容）的进程内读穿缓存，键为 (用户, 文档类型)。
+    保存、添加版本、删除版本提交后调用 invalidate；多 worker 部署时可通过 channel（Postgres LISTEN/NOTIFY）
+    通知其他进程，未配置时其他进程的条目最多在 TTL 后过期。
+
+    读取时记录失效次数，查询期间发生过失效则不回填，避免把失效前读到的旧数据写入缓存。
+    """
+
+    def __init__(self, cache: Optional[LRUTTLCache] = None, channel: Optional[PgNotifyChannel] = None):
+        self.cache = cache
+        self.channel = channel
+        self._invalidations = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db: Session, owner_id: str, doc_type: str) -> Optional[Dict[str, Any]]:
+        """返回当前文档（含 content）；用户没有该类型的文档时返回 None。返回值为共享对象，调用方不得修改。"""
+        key = _cache_key(owner_id, doc_type)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+        self.misses += 1
+        generation = self._invalidations
+        entry = self._load(db, owner_id, doc_type)
+        if entry is not None and self.cache is not None and generation == self._invalidations:
+            self.cache.set(key, entry)
+        return entry
+
+    def _load(self, db: Session, owner_id: str, doc_type: str) -> Optional[Dict[str, Any]]:
+        Document, Version = document_models.Document, document_models.DocumentVersion
+        document = db.query(Document).filter(
+            Document.user_id == owner_id,
+            Document.type == doc_type,
+            Document.deleted_at.is_(None)
+        ).first()
+        if document is None:
+            return None
+        version = db.query(Version).filter(Version.id == document.current_version_id).first() \
+            if document.current_version_id else None
+        return {
+            "id": str(document.id),
+            "user_id": str(document.user_id),
+            "type": document.type,
+            "title": document.title,
+            "current_version_id": str(version.id) if version else None,
+            "version_number": version.version_number if version else None,
+            "version_counter": document.version_counter,
+            "content_format": version.content_format if version else None,
+            "checksum_sha256": version.checksum_sha256 if version else None,
+            "content": version_store.get_content(db, version) if version else None,
+            "created_at": document.created_at.isoformat(),
+            "updated_at": document.updated_at.isoformat(),
+        }
+
+    def invalidate(self, owner_id: str, doc_type: str) -> None:
+        """文档写入并提交后调用：丢弃本地条目并通知其他 worker。"""
+        key = _cache_key(owner_id, doc_type)
+        self.drop(key)
+        if self.channel is not None:
+            try:
+                self.channel.publish(key)
+            except Exception:
+                logger.exception("发送文档缓存失效通知失败")
+
+    def drop(self, key: str) -> None:
+        """丢弃本地条目；"*" 表示全部。"""
+        self._invalidations += 1
+        if self.cache is None:
+            return
+        if key == "*":
+            self.cache.clear()
+        else:
+            self.cache.pop(key)
+
+    def start(self) -> None:
+        if self.channel is not None and self.cache is not None:
+            self.channel.start(self.drop)
+
+    def stop(self) -> None:
+        if self.channel is not None:
+            self.channel.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.cache is not None,
+            "entries": len(self.cache) if self.cache is not None else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self._invalidations,
+            "notify": {"published": self.channel.published, "received": self.channel.received}
+            if self.channel is not None else None,
+        }
+
+
+def _make_channel() -> Optional[PgNotifyChannel]:
+    if not settings.DOCUMENT_CACHE_NOTIFY:
+        return None
+    if engine.dialect.name != "postgresql":
+        logger.warning("DOCUMENT_CACHE_NOTIFY 仅支持 Postgres，已忽略")
+        return None
+    return PgNotifyChannel(engine)
+
+
+document_cache = CurrentDocumentCache(
+    cache=LRUTTLCache(max_entries=settings.DOCUMENT_CACHE_MAX_ENTRIES, ttl=settings.DOCUMENT_CACHE_TTL)
+    if settings.DOCUMENT_CACHE_ENABLED else None,
+    channel=_make_channel() if settings.DOCUMENT_CACHE_ENABLED else None,
+)
@@ -0,0 +1,124 @@
+import io
+import json
+import zipfile
+from typing import Any, Dict, Iterator, List, Tuple
+
+from sqlalchemy.orm import Session, undefer
+
+from app.core.config import settings
+from app.database import SessionLocal
+from app.models import document_models
+from app.services.version_store import version_store
+
+_EXTENSIONS = {"markdown": "md", "html": "html", "plain": "txt"}
+
+
+def _document_record(document: document_models.Document) -> Dict[str, Any]:
+    return {
+        "id": str(document.id),
+        "user_id": str(document.user_id),
+        "type": document.type,
+        "title": document.title,
+        "current_version_id": str(document.current_version_id) if document.current_version_id else None,
+        "created_at": document.created_at.isoformat(),
+        "updated_at": document.updated_at.isoformat(),
+    }
+
+
+def _version_record(version: document_models.DocumentVersion) -> Dict[str, Any]:
+    return {
+        "id": str(version.id),
+        "document_id": str(version.document_id),
+        "version_number": version.version_number,
+        "content_format": version.content_format,
+        "checksum_sha256": version.checksum_sha256,
+        "created_at": version.created_at.isoformat(),
+    }
+
+
+def iter_export(
+    db: Session, user_ids: List[str]
+) -> Iterator[Tuple[document_models.Document, document_models.DocumentVersion, str]]:
+    """
+    按 (用户, 文档, 版本号) 顺序逐个产出有效版本及其完整内容。
+    使用服务端游标（yield_per）分批读取，差分版本在上一个版本的内容上还原，内存占用与版本数无关。
+    """
+    Version, Document = document_models.DocumentVersion, document_models.Document
+    rows = db.query(Version, Document).join(Document, Document.id == Version.document_id).options(
+        undefer(Version.content_blob)
+    ).filter(
+        Document.user_id.in_(user_ids),
+        Document.deleted_at.is_(None),
+        Version.deleted_at.is_(None),
+    ).order_by(Document.user_id, Document.id, Version.version_number).yield_per(settings.EXPORT_BATCH_SIZE)
+
+    previous = None
+    for version, document in rows:
+        content = version_store.next_content(db, version, previous)
+        previous = (version.id, content)
+        yield document, version, content
+
+
+def ndjson_chunks(user_ids: List[str]) -> Iterator[bytes]:
+    """
+    NDJSON 导出：每个文档先输出一行 {"record": "document", ...}，随后每个版本一行 {"record": "version", ..., "content"}。
+    自行管理数据库会话，供 StreamingResponse 在线程池中迭代。
+    """
+    db = SessionLocal()
+    try:
+        current = None
+        for document, version, content in iter_export(db, user_ids):
+            if document.id != current:
+                current = document.id
+                yield (json.dumps({"record": "document", **_document_record(document)}, ensure_ascii=False) + "\n").encode("utf-8")
+            record = {"record": "version", **_version_record(version), "content": content}
+            yield (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+    finally:
+        db.close()
+
+
+class _StreamSink(io.RawIOBase):
+    """只追加、不可 seek 的输出，zipfile 据此改用数据描述符，写完一个条目即可把数据交给响应。"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def zip_chunks(user_ids: List[str]) -> Iterator[bytes]:
+    """
+    ZIP 导出：{用户}/{类型}_{文档}/document.json 为文档信息，同目录下 v0001.md 等为各版本内容。
+    每写完一个条目即产出已压缩的数据。
+    """
+    db = SessionLocal()
+    sink = _StreamSink()
+    try:
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            current = None
+            for document, version, content in iter_export(db, user_ids):
+                folder = f"{document.user_id}/{document.type}_{document.id}"
+                if document.id != current:
+                    current = document.id
+                    archive.writestr(f"{folder}/document.json", json.dumps(_document_record(document), ensure_ascii=False, indent=2))
+                extension = _EXTENSIONS.get(version.content_format, "txt")
+                archive.writestr(f"{folder}/v{version.version_number:04d}.{extension}", content)
+                yield sink.drain()
+        yield sink.drain()
+    finally:
+        db.close()
@@ -0,0 +1,79 @@
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models import document_models
+from app.services.document_cache import document_cache
+from app.services.version_store import VersionConflictError, version_store
+
+
+def current_version_number(db: Session, owner_id: str, doc_type: str) -> int:
+    """用户该类型文档当前的版本计数（文档不存在时为 0），可作为保存前置条件的基准版本号。"""
+    counter = db.query(document_models.Document.version_counter).filter(
+        document_models.Document.user_id == owner_id,
+        document_models.Document.type == doc_type,
+        document_models.Document.deleted_at.is_(None)
+    ).limit(1).scalar()
+    return counter or 0
+
+
+def save_content(
+    db: Session,
+    owner_id: str,
+    doc_type: str,
+    content_md: str,
+    expected: Optional[int] = None,
+    version_metadata: str = "{}",
+) -> Tuple[document_models.Document, document_models.DocumentVersion, bool]:
+    """
+    把内容保存为用户该类型文档的新版本（文档不存在时新建）并提交，返回 (文档, 版本, 是否未变化)。
+    内容与当前版本相同时不写入，返回当前版本。expected 为前置条件中的基准版本号，不满足时抛出 VersionConflictError。
+    手动保存与自动保存合并后的写入共用此函数。
+    """
+    document = db.query(document_models.Document).filter(
+        document_models.Document.user_id == owner_id,
+        document_models.Document.type == doc_type,
+        document_models.Document.deleted_at.is_(None)
+    ).first()
+
+    if document is not None:
+        # 内容与当前版本相同（如自动保存时未修改）：不产生新版本，也不更新 updated_at
+        unchanged = version_store.unchanged_version(db, document, content_md)
+        if unchanged is not None:
+            return document, unchanged, True
+
+        # 原子地分配版本号（同时检查前置条件），再取最新版本作为差分基准
+        version_number = version_store.allocate_version_number(db, document, expected)
+        base = version_store.latest_version(db, document.id)
+    else:
+        if expected:
+            raise VersionConflictError(0)
+        document = document_models.Document(
+            user_id=owner_id,
+            type=doc_type,
+            title=f"{doc_type.title()} Document",
+            doc_metadata="{}"
+        )
+        db.add(document)
+        db.flush()
+        version_number = version_store.allocate_version_number(db, document)
+        base = None
+
+    version = version_store.create_version(
+        db,
+        document_id=document.id,
+        version_number=version_number,
+        content=content_md,
+        base=base,
+        created_by=owner_id,
+        version_metadata=version_metadata,
+    )
+
+    # 更新文档的当前版本
+    document.current_version_id = version.id
+    document.updated_at = datetime.utcnow()
+
+    db.commit()
+    document_cache.invalidate(owner_id, doc_type)
+    return document, version, False
@@ -0,0 +1,301 @@
+import asyncio
+import hashlib
+import json
+import logging
+import weakref
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.database import SessionLocal
+from app.models.job_models import GenerationJob, JobKind, JobStatus
+from app.services.dify_client import dify_client, DifyServiceError, load_statement_json
+
+logger = logging.getLogger("cv-agent-jobs")
+
+TERMINAL_STATUSES = {JobStatus.succeeded.value, JobStatus.failed.value}
+
+
+async def _run_personal_statement(payload: str) -> Dict[str, Any]:
+    return load_statement_json(await dify_client.generate_statement(payload))
+
+
+async def _run_recommendation(payload: str) -> Dict[str, Any]:
+    result = await dify_client.generate_recommendation(payload)
+    if "error" in result:
+        raise DifyServiceError(result["error"], 502)
+    return result
+
+
+async def _run_evaluation(payload: str) -> Dict[str, Any]:
+    return {"processed_text": await dify_client.process_json_as_text(payload)}
+
+
+# 每种任务对应的执行函数：输入为提交时的 payload 文本，返回可 JSON 序列化的结果
+JOB_RUNNERS: Dict[str, Callable[[str], Awaitable[Dict[str, Any]]]] = {
+    JobKind.personal_statement.value: _run_personal_statement,
+    JobKind.recommendation.value: _run_recommendation,
+    JobKind.evaluation.value: _run_evaluation,
+}
+
+
+def job_to_dict(job: GenerationJob) -> Dict[str, Any]:
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "error_status": job.error_status,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+class JobQueue:
+    """
+    长耗时生成任务（个人陈述、推荐信、简历评估）的异步队列。
+
+    - 任务状态持久化在 generation_jobs 表中，进程重启后未完成的任务会被重新执行；
+    - 新提交的任务直接放入进程内队列，同时后台定期扫描数据库中排队的任务，
+      多个 uvicorn worker 之间通过条件更新（status='queued' → 'running'）抢占，保证每个任务只执行一次；
+    - 相同 (kind, payload) 的重复提交返回已有的排队中/执行中/已成功的任务。去重的查询与创建由进程内的锁串行，
+      只在同一 worker 内保证；不同 worker 几乎同时收到相同提交时可能各自创建一个任务（结果相同，只是多执行一次）。
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 4,
+        poll_interval: float = 5,
+        stale_after: float = 600,
+        dedup_ttl: float = 86400,
+        max_attempts: int = 3,
+    ):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.dedup_ttl = dedup_ttl
+        self.max_attempts = max_attempts
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: Set[str] = set()
+        self._tasks = []
+        # 等待中的请求持有事件的引用，全部等待结束后条目自动移除
+        self._events: "weakref.WeakValueDictionary[str, asyncio.Event]" = weakref.WeakValueDictionary()
+        self._submit_lock: Optional[asyncio.Lock] = None
+        self.submitted = 0
+        self.deduplicated = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.failed_by_status: Dict[int, int] = {}
+        self.abandoned = 0
+
+    # --- 生命周期 ---
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._submit_lock = asyncio.Lock()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+
+    async def stop(self) -> None:
+        # 执行中的任务保持 running 状态，超过 stale_after 后会被重新排队
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # --- 提交与查询 ---
+    @staticmethod
+    def payload_hash(kind: str, payload: str) -> str:
+        return hashlib.sha256(f"{kind}\n{payload}".encode("utf-8")).hexdigest()
+
+    async def submit(self, kind: str, payload: str) -> Dict[str, Any]:
+        """提交任务，返回任务信息；重复提交时 deduplicated 为 True。"""
+        digest = self.payload_hash(kind, payload)
+        async with self._submit_lock:
+            job, created = await run_in_threadpool(self._find_or_create, kind, payload, digest)
+        if created:
+            self.submitted += 1
+            self._enqueue(job["job_id"])
+        else:
+            self.deduplicated += 1
+        job["deduplicated"] = not created
+        return job
+
+    def _find_or_create(self, kind: str, payload: str, digest: str):
+        db = SessionLocal()
+        try:
+            cutoff = datetime.utcnow() - timedelta(seconds=self.dedup_ttl)
+            existing = db.query(GenerationJob).filter(
+                GenerationJob.kind == kind,
+                GenerationJob.payload_hash == digest,
+                GenerationJob.status != JobStatus.failed.value,
+                GenerationJob.created_at >= cutoff,
+            ).order_by(GenerationJob.created_at.desc()).first()
+            if existing:
+                return job_to_dict(existing), False
+            job = GenerationJob(kind=kind, payload_hash=digest, payload=payload, status=JobStatus.queued.value)
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            return job_to_dict(job), True
+        finally:
+            db.close()
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await run_in_threadpool(self._load, job_id)
+
+    def _load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            job = db.query(GenerationJob).filter(GenerationJob.id == job_id).first()
+            return job_to_dict(job) if job else None
+        finally:
+            db.close()
+
+    async def wait_for_change(self, job_id: str, timeout: float) -> None:
+        """等待本进程内该任务完成，或超时后返回（由调用方重新查询数据库）。"""
+        event = self._events.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    # --- 执行 ---
+    def _enqueue(self, job_id: str) -> None:
+        if job_id not in self._pending:
+            self._pending.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._execute(job_id)
+            except Exception:
+                logger.exception("执行任务 %s 时发生异常", job_id)
+            finally:
+                self._pending.discard(job_id)
+
+    async def _execute(self, job_id: str) -> None:
+        claimed = await run_in_threadpool(self._claim, job_id)
+        if claimed is None:
+            return  # 已被其他 worker 抢占或已完成
+        kind, payload = claimed
+        try:
+            result = await JOB_RUNNERS[kind](payload)
+        except Exception as e:
+            status = e.status_code if isinstance(e, DifyServiceError) else 500
+            await run_in_threadpool(self._finish, job_id, None, str(e), status)
+            self.failed += 1
+            self.failed_by_status[status] = self.failed_by_status.get(status, 0) + 1
+        else:
+            await run_in_threadpool(self._finish, job_id, result, None, None)
+            self.succeeded += 1
+        event = self._events.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    def _claim(self, job_id: str):
+        """原子地把任务从 queued 改为 running，成功时返回 (kind, payload)。"""
+        db = SessionLocal()
+        try:
+            updated = db.query(GenerationJob).filter(
+                GenerationJob.id == job_id,
+                GenerationJob.status == JobStatus.queued.value,
+                GenerationJob.attempts < self.max_attempts,
+            ).update(
+                {
+                    GenerationJob.status: JobStatus.running.value,
+                    GenerationJob.started_at: datetime.utcnow(),
+                    GenerationJob.attempts: GenerationJob.attempts + 1,
+                },
+                synchronize_session=False,
+            )
+            db.commit()
+            if not updated:
+                return None
+            job = db.query(GenerationJob).filter(GenerationJob.id == job_id).first()
+            return job.kind, job.payload
+        finally:
+            db.close()
+
+    def _finish(self, job_id: str, result: Optional[Dict[str, Any]], error: Optional[str], error_status: Optional[int]):
+        db = SessionLocal()
+        try:
+            db.query(GenerationJob).filter(GenerationJob.id == job_id).update(
+                {
+                    GenerationJob.status: JobStatus.failed.value if error else JobStatus.succeeded.value,
+                    GenerationJob.result: json.dumps(result, ensure_ascii=False) if result is not None else None,
+                    GenerationJob.error: error,
+                    GenerationJob.error_status: error_status,
+                    GenerationJob.finished_at: datetime.utcnow(),
+                },
+                synchronize_session=False,
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    async def _sweeper(self) -> None:
+        """定期把超时未完成的 running 任务重新排队，并领取数据库中排队的任务。"""
+        while True:
+            try:
+                for job_id in await run_in_threadpool(self._collect_queued):
+                    self._enqueue(job_id)
+            except Exception:
+                logger.exception("扫描任务队列失败")
+            await asyncio.sleep(self.poll_interval)
+
+    def _collect_queued(self):
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            stale_before = now - timedelta(seconds=self.stale_after)
+            stale = db.query(GenerationJob).filter(
+                GenerationJob.status == JobStatus.running.value,
+                GenerationJob.started_at < stale_before,
+            )
+            # 已达到最多执行次数的任务不再重新排队（如每次执行都导致进程退出）
+            abandoned = stale.filter(GenerationJob.attempts >= self.max_attempts).update(
+                {
+                    GenerationJob.status: JobStatus.failed.value,
+                    GenerationJob.error: f"Job did not finish after {self.max_attempts} attempts",
+                    GenerationJob.error_status: 500,
+                    GenerationJob.finished_at: now,
+                },
+                synchronize_session=False,
+            )
+            stale.filter(GenerationJob.attempts < self.max_attempts).update(
+                {GenerationJob.status: JobStatus.queued.value}, synchronize_session=False
+            )
+            db.commit()
+            self.abandoned += abandoned
+            rows = db.query(GenerationJob.id).filter(
+                GenerationJob.status == JobStatus.queued.value
+            ).order_by(GenerationJob.created_at).limit(self.concurrency * 4).all()
+            return [row.id for row in rows]
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "failed_by_status": dict(self.failed_by_status),
+            "abandoned": self.abandoned,
+            "pending_local": len(self._pending),
+        }
+
+
+job_queue = JobQueue(
+    concurrency=settings.JOB_WORKER_CONCURRENCY,
+    poll_interval=settings.JOB_POLL_INTERVAL,
+    stale_after=settings.JOB_STALE_AFTER,
+    dedup_ttl=settings.JOB_DEDUP_TTL,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+)
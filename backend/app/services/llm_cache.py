@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger("cv-agent-llm-cache")
+
+_MISSING = object()
+
+
+def normalize_query(text: str) -> str:
+    """规范化查询文本：统一 Unicode 形式与换行，去掉行尾及首尾空白。"""
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in text.split("\n")).strip()
+
+
+def make_cache_key(key_name: str, query: str, inputs: Optional[Dict[str, Any]] = None) -> str:
+    """基于 (工作流密钥名, 规范化查询, inputs) 计算内容寻址的缓存键。"""
+    material = json.dumps(
+        [key_name, normalize_query(query), inputs or {}],
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class LRUTTLCache:
+    """
+    进程内 LRU 缓存，条目带过期时间（TTL），条目数有上限。
+    线程安全，值可以是任意对象。
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+            return default if item is _MISSING else item[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCacheTier:
+    """
+    基于 SQLite 的磁盘缓存层。数据在重启后依然保留，
+    并通过 WAL 模式让同一台机器上的多个 uvicorn worker 共享同一个文件。
+    """
+
+    def __init__(self, path: str, ttl: float = 86400):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 连接不能跨线程共享，每个线程各自持有一个
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, time.time() + self.ttl),
+        )
+        conn.commit()
+
+    def purge_expired(self) -> int:
+        """删除已过期的行，返回删除的行数。"""
+        conn = self._connect()
+        cursor = conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+        conn.commit()
+        return cursor.rowcount
+
+
+class LLMResponseCache:
+    """
+    Dify 响应缓存：内存 LRU+TTL 为第一层，可选的 SQLite 磁盘层为第二层。
+    只缓存成功的回答，错误结果不会写入。启用磁盘层时，后台任务在启动时及每 purge_interval 秒删除过期的行。
+    """
+
+    def __init__(self, memory: LRUTTLCache, disk: Optional[SQLiteCacheTier] = None, purge_interval: float = 3600):
+        self.memory = memory
+        self.disk = disk
+        self.purge_interval = purge_interval
+        self._task: Optional[asyncio.Task] = None
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.stores = 0
+        self.disk_purged = 0
+
+    # --- 后台清理 ---
+    async def start(self) -> None:
+        if self.disk is not None and self.purge_interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                self.disk_purged += await run_in_threadpool(self.disk.purge_expired)
+            except Exception:
+                logger.exception("清理磁盘缓存中的过期条目失败")
+            await asyncio.sleep(self.purge_interval)
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.hits_memory += 1
+            return value
+        if self.disk is not None:
+            value = await run_in_threadpool(self.disk.get, key)
+            if value is not None:
+                self.hits_disk += 1
+                self.memory.set(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str) -> None:
+        self.memory.set(key, value)
+        self.stores += 1
+        if self.disk is not None:
+            await run_in_threadpool(self.disk.set, key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_ratio": round((self.hits_memory + self.hits_disk) / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_enabled": self.disk is not None,
+            "disk_purged": self.disk_purged,
+        }
@@ -0,0 +1,48 @@
+import base64
+import json
+from typing import Any, List, Optional, Sequence
+
+from app.core.config import settings
+
+
+class PageParamsError(ValueError):
+    """分页或字段投影参数无效（对应 400）。"""
+
+
+def page_limit(limit: Optional[int]) -> int:
+    """每页条数：缺省为 LIST_PAGE_SIZE，上限为 LIST_MAX_PAGE_SIZE。"""
+    if limit is None:
+        return settings.LIST_PAGE_SIZE
+    if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+        raise PageParamsError("limit 必须为正整数")
+    return min(limit, settings.LIST_MAX_PAGE_SIZE)
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """把排序键编码为不透明的游标字符串。"""
+    raw = json.dumps(list(values), ensure_ascii=False, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise PageParamsError("无效的 cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise PageParamsError("无效的 cursor")
+    return values
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str], default: Optional[Sequence[str]] = None) -> List[str]:
+    """解析逗号分隔的 fields 参数；缺省时返回 default（默认为全部字段），含未知字段时报错。"""
+    if fields is not None and not isinstance(fields, str):
+        raise PageParamsError("fields 必须为逗号分隔的字符串")
+    if not fields:
+        return list(default if default is not None else allowed)
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in allowed]
+    if unknown:
+        raise PageParamsError(f"未知字段：{', '.join(unknown)}，可选字段：{', '.join(allowed)}")
+    return selected
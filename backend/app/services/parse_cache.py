@@ -0,0 +1,147 @@
+import hashlib
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from app.core.config import settings
+from app.database import SessionLocal
+from app.models.parse_cache_models import ParsedResumeCache, ParseCacheKeyType
+from app.services.llm_cache import LRUTTLCache, normalize_query
+
+logger = logging.getLogger("cv-agent-parse-cache")
+
+
+def text_hash(text: str) -> str:
+    """提取文本的内容摘要：先规范化空白与换行，避免无意义的差异导致未命中。"""
+    return hashlib.sha256(normalize_query(text).encode("utf-8")).hexdigest()
+
+
+class ParsedResumeStore:
+    """
+    简历解析结果的持久化缓存，分别按 PDF 内容摘要和提取文本摘要索引。
+
+    条目带解析工作流版本号，版本变更后旧结果不再命中；
+    数据库前有一层进程内 LRU，热点文件的重复上传无需访问数据库。
+    """
+
+    def __init__(self, workflow_version: str, memory: LRUTTLCache, enabled: bool = True):
+        self.workflow_version = workflow_version
+        self.memory = memory
+        self.enabled = enabled
+        self.hits = {ParseCacheKeyType.pdf.value: 0, ParseCacheKeyType.text.value: 0}
+        self.misses = 0
+        self.stores = 0
+
+    def _memory_key(self, key_type: str, digest: str) -> str:
+        return f"{key_type}:{self.workflow_version}:{digest}"
+
+    async def _get(self, key_type: str, digest: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        memory_key = self._memory_key(key_type, digest)
+        result = self.memory.get(memory_key)
+        if result is None:
+            try:
+                result = await run_in_threadpool(self._load, key_type, digest)
+            except SQLAlchemyError:
+                # 缓存不可用时按未命中处理，不影响解析
+                logger.warning("读取解析缓存失败", exc_info=True)
+            if result is not None:
+                self.memory.set(memory_key, result)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits[key_type] += 1
+        return result
+
+    async def get_by_pdf(self, pdf_sha256: str) -> Optional[Dict[str, Any]]:
+        return await self._get(ParseCacheKeyType.pdf.value, pdf_sha256)
+
+    async def get_by_text(self, text: str) -> Optional[Dict[str, Any]]:
+        return await self._get(ParseCacheKeyType.text.value, text_hash(text))
+
+    async def put(self, result: Dict[str, Any], pdf_sha256: Optional[str] = None, text: Optional[str] = None) -> None:
+        """保存解析结果；pdf_sha256 与 text 分别建立索引，均可省略。"""
+        if not self.enabled:
+            return
+        keys = []
+        if pdf_sha256:
+            keys.append((ParseCacheKeyType.pdf.value, pdf_sha256))
+        if text is not None:
+            keys.append((ParseCacheKeyType.text.value, text_hash(text)))
+        for key_type, digest in keys:
+            self.memory.set(self._memory_key(key_type, digest), result)
+            try:
+                await run_in_threadpool(self._store, key_type, digest, result)
+            except SQLAlchemyError:
+                logger.warning("写入解析缓存失败", exc_info=True)
+                continue
+            self.stores += 1
+
+    # --- 数据库读写（在线程池中执行） ---
+    def _load(self, key_type: str, digest: str) -> Optional[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            row = db.query(ParsedResumeCache).filter(
+                ParsedResumeCache.key_type == key_type,
+                ParsedResumeCache.content_hash == digest,
+                ParsedResumeCache.workflow_version == self.workflow_version,
+            ).first()
+            if row is None:
+                return None
+            row.hit_count = (row.hit_count or 0) + 1
+            row.last_hit_at = datetime.utcnow()
+            db.commit()
+            return json.loads(row.result)
+        finally:
+            db.close()
+
+    def _store(self, key_type: str, digest: str, result: Dict[str, Any]) -> None:
+        payload = json.dumps(result, ensure_ascii=False)
+        db = SessionLocal()
+        try:
+            row = db.query(ParsedResumeCache).filter(
+                ParsedResumeCache.key_type == key_type,
+                ParsedResumeCache.content_hash == digest,
+                ParsedResumeCache.workflow_version == self.workflow_version,
+            ).first()
+            if row is None:
+                db.add(ParsedResumeCache(
+                    key_type=key_type,
+                    content_hash=digest,
+                    workflow_version=self.workflow_version,
+                    result=payload,
+                ))
+            else:
+                row.result = payload
+            db.commit()
+        except IntegrityError:
+            # 并发上传同一文件时另一请求已写入，保留先写入的结果
+            db.rollback()
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        hits = sum(self.hits.values())
+        lookups = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "workflow_version": self.workflow_version,
+            "hits_pdf": self.hits[ParseCacheKeyType.pdf.value],
+            "hits_text": self.hits[ParseCacheKeyType.text.value],
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+        }
+
+
+parsed_resume_store = ParsedResumeStore(
+    workflow_version=settings.DIFY_PARSE_WORKFLOW_VERSION,
+    memory=LRUTTLCache(max_entries=settings.PARSE_CACHE_MEMORY_ENTRIES, ttl=settings.LLM_CACHE_TTL),
+    enabled=settings.PARSE_CACHE_ENABLED,
+)
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Tuple, Union
+
+from app.core.config import settings
+from app.services.process_pool import RestartableProcessPool
+
+logger = logging.getLogger("cv-agent-pdf")
+
+# PDF 来源：内存中的字节，或磁盘上的文件路径
+PDFSource = Union[bytes, str]
+
+
+class PDFExtractionError(Exception):
+    """PDF 文本提取失败：文件无效时为 400，超时为 504，进程池不可用为 503。"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def _open(source: PDFSource):
+    import fitz  # PyMuPDF，仅在子进程中导入
+
+    if isinstance(source, str):
+        return fitz.open(source, filetype="pdf")
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def _extract_range(source: PDFSource, start: int, stop: int) -> Tuple[int, str]:
+    """在子进程中提取 [start, stop) 页的文本，同时返回总页数。"""
+    try:
+        with _open(source) as doc:
+            page_count = doc.page_count
+            return page_count, "".join(doc[i].get_text() for i in range(start, min(stop, page_count)))
+    except Exception as e:
+        # PyMuPDF 的异常无法跨进程序列化，统一转换为 ValueError
+        raise ValueError(str(e)) from None
+
+
+class PDFExtractor:
+    """
+    在独立进程池中提取 PDF 文本，避免 PyMuPDF 的 CPU 计算阻塞事件循环。
+
+    第一个任务提取前 pages_per_task 页并返回总页数，页数较多时其余页按分段并行提取；
+    单个文件整体超过 timeout 秒即放弃，并重建进程池以回收卡住的子进程。
+    """
+
+    def __init__(self, max_workers: int = 2, timeout: float = 30, pages_per_task: int = 4):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.pages_per_task = max(1, pages_per_task)
+        self.pool = RestartableProcessPool(max_workers)
+        self.extracted = 0
+        self.timeouts = 0
+
+    def shutdown(self) -> None:
+        self.pool.shutdown()
+
+    async def _extract(self, executor: ProcessPoolExecutor, source: PDFSource) -> str:
+        loop = asyncio.get_running_loop()
+        step = self.pages_per_task
+        page_count, head = await loop.run_in_executor(executor, _extract_range, source, 0, step)
+        if page_count <= step:
+            return head
+        rest = await asyncio.gather(*[
+            loop.run_in_executor(executor, _extract_range, source, start, start + step)
+            for start in range(step, page_count, step)
+        ])
+        return head + "".join(text for _, text in rest)
+
+    async def extract_text(self, source: PDFSource) -> str:
+        """提取整个 PDF 的文本，按页顺序拼接。"""
+        for attempt in range(2):
+            executor = self.pool.get()
+            try:
+                text = await asyncio.wait_for(self._extract(executor, source), self.timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                self.pool.reset(executor)
+                raise PDFExtractionError("PDF解析超时。", 504)
+            except BrokenProcessPool:
+                # 子进程崩溃或进程池被其他超时请求重建，换新进程池重试一次
+                self.pool.reset(executor)
+                if attempt:
+                    raise PDFExtractionError("PDF解析服务暂不可用。", 503)
+                continue
+            except ValueError as e:
+                raise PDFExtractionError(f"无效的PDF文件：{e}", 400)
+            self.extracted += 1
+            return text
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "extracted": self.extracted,
+            "timeouts": self.timeouts,
+            "pool_restarts": self.pool.restarts,
+        }
+
+
+pdf_extractor = PDFExtractor(
+    max_workers=settings.PDF_EXTRACT_WORKERS,
+    timeout=settings.PDF_EXTRACT_TIMEOUT,
+    pages_per_task=settings.PDF_PAGES_PER_TASK,
+)
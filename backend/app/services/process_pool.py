@@ -0,0 +1,42 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+
+class RestartableProcessPool:
+    """
+    延迟创建的进程池，供 CPU 密集的解析/渲染任务使用。
+
+    任务超时或子进程崩溃时调用 reset() 丢弃当前进程池并终止其子进程，
+    下一次 get() 会创建新的进程池，卡住的子进程不会一直占用名额。
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.restarts = 0
+
+    def get(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn 避免在多线程的父进程中 fork
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def reset(self, executor: ProcessPoolExecutor) -> None:
+        if self._executor is not executor:
+            return  # 已被其他请求重建
+        self._executor = None
+        self.restarts += 1
+        processes = list((executor._processes or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
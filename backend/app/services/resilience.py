@@ -0,0 +1,141 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，调用被直接拒绝。"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} 熔断中，{retry_after:.0f} 秒后重试")
+        self.retry_after = retry_after
+
+
+class BulkheadFullError(Exception):
+    """舱壁并发已满，且在排队超时内没有空位。"""
+
+    def __init__(self, name: str):
+        super().__init__(f"{name} 并发已满，请稍后重试")
+
+
+class CircuitBreaker:
+    """
+    简单的三态熔断器：
+    - closed：正常放行，连续失败达到 failure_threshold 次后转为 open
+    - open：直接拒绝，reset_timeout 秒后转为 half_open
+    - half_open：只放行一个探测请求，成功则 closed，失败则重新 open
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._probe_in_flight = False
+
+    def is_open(self) -> bool:
+        """是否处于拒绝请求的状态（不改变状态）。"""
+        return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def retry_after(self) -> float:
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def before_call(self) -> None:
+        if self.state == self.OPEN:
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.reset_timeout - elapsed)
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.reset_timeout)
+            self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def record_ignored(self) -> None:
+        """调用结束但不计入健康状况（例如 4xx 请求错误）。"""
+        self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "rejected": self.rejected,
+        }
+
+
+class Bulkhead:
+    """
+    舱壁隔离：限制单个工作流的并发请求数，排队超过 queue_timeout 秒则拒绝，
+    避免一个慢工作流占满整个连接池。
+    """
+
+    def __init__(self, name: str, limit: int, queue_timeout: float = 10):
+        self.name = name
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    @asynccontextmanager
+    async def acquire(self):
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise BulkheadFullError(self.name)
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"limit": self.limit, "active": self.active, "rejected": self.rejected}
+
+
+async def retry_async(
+    fn: Callable[[], Awaitable[Any]],
+    attempts: int,
+    base_delay: float,
+    max_delay: float,
+    should_retry: Callable[[Exception], bool],
+    on_retry: Optional[Callable[[int, Exception], None]] = None,
+) -> Any:
+    """
+    带抖动的指数退避重试（full jitter）：第 n 次重试前等待
+    random(0, min(max_delay, base_delay * 2**n)) 秒。只重试 should_retry 判定为可重试的异常。
+    """
+    for attempt in range(attempts + 1):
+        try:
+            return await fn()
+        except Exception as e:
+            if attempt >= attempts or not should_retry(e):
+                raise
+            if on_retry is not None:
+                on_retry(attempt + 1, e)
+            await asyncio.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
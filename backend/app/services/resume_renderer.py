@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import json
+import os
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+from jinja2 import Environment, FileSystemLoader, Template, select_autoescape
+
+from app.core.config import settings
+from app.services.llm_cache import LRUTTLCache
+from app.services.process_pool import RestartableProcessPool
+from app.services.singleflight import SingleFlight
+
+
+class ResumeRenderError(Exception):
+    """简历渲染失败：模板不存在为 404，超时为 504，渲染服务不可用为 503。"""
+
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def _write_pdf(html: str, base_url: str) -> bytes:
+    """在子进程中用 WeasyPrint 把 HTML 渲染为 PDF。"""
+    try:
+        from weasyprint import HTML
+    except OSError as e:
+        # 缺少 Pango 等系统库；原始异常可能无法跨进程序列化
+        raise RuntimeError(f"WeasyPrint 不可用：{e}") from None
+    return HTML(string=html, base_url=base_url).write_pdf()
+
+
+def profile_hash(profile: Dict[str, Any]) -> str:
+    material = json.dumps(profile, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResumeRenderer:
+    """
+    简历 PDF 渲染：Jinja2 模板在启动时一次性编译，WeasyPrint 排版在独立进程池中执行。
+
+    模板目录下以 "_" 开头的文件为公共布局，其余 .html 文件为可选模板；
+    模板版本为模板及公共布局源码的摘要，修改模板后旧的渲染结果自动失效。
+    渲染结果按 (简历内容摘要, 模板名, 模板版本) 缓存，相同内容的并发请求只渲染一次。
+    """
+
+    def __init__(
+        self,
+        template_dir: str,
+        max_workers: int = 2,
+        timeout: float = 60,
+        cache: Optional[LRUTTLCache] = None,
+    ):
+        self.template_dir = template_dir
+        self.timeout = timeout
+        self.pool = RestartableProcessPool(max_workers)
+        self.cache = cache
+        self._single_flight = SingleFlight()
+        self._templates: Dict[str, Template] = {}
+        self.versions: Dict[str, str] = {}
+        self.rendered = 0
+        self.cache_hits = 0
+        self.timeouts = 0
+
+    def load_templates(self) -> None:
+        """编译模板目录下的全部模板并计算版本号。"""
+        env = Environment(
+            loader=FileSystemLoader(self.template_dir),
+            autoescape=select_autoescape(["html"]),
+            trim_blocks=True,
+            lstrip_blocks=True,
+        )
+        names = sorted(n for n in os.listdir(self.template_dir) if n.endswith(".html"))
+        shared = "".join(self._read(n) for n in names if n.startswith("_"))
+        templates, versions = {}, {}
+        for name in names:
+            if name.startswith("_"):
+                continue
+            key = name[:-len(".html")]
+            templates[key] = env.get_template(name)
+            versions[key] = hashlib.sha256((shared + self._read(name)).encode("utf-8")).hexdigest()[:12]
+        self._templates, self.versions = templates, versions
+
+    def _read(self, name: str) -> str:
+        with open(os.path.join(self.template_dir, name), encoding="utf-8") as f:
+            return f.read()
+
+    def shutdown(self) -> None:
+        self.pool.shutdown()
+
+    async def render(self, profile: Dict[str, Any], template: str) -> bytes:
+        if not self._templates:
+            self.load_templates()
+        compiled = self._templates.get(template)
+        if compiled is None:
+            raise ResumeRenderError(
+                f"模板 {template} 不存在，可选模板：{', '.join(sorted(self._templates))}", 404
+            )
+        key = f"{profile_hash(profile)}:{template}:{self.versions[template]}"
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.cache_hits += 1
+                return cached
+        return await self._single_flight.do(key, lambda: self._render(key, compiled, profile))
+
+    async def _render(self, key: str, compiled: Template, profile: Dict[str, Any]) -> bytes:
+        html = compiled.render(profile=profile)
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            executor = self.pool.get()
+            try:
+                pdf = await asyncio.wait_for(
+                    loop.run_in_executor(executor, _write_pdf, html, self.template_dir), self.timeout
+                )
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                self.pool.reset(executor)
+                raise ResumeRenderError("简历渲染超时。", 504)
+            except BrokenProcessPool:
+                self.pool.reset(executor)
+                if attempt:
+                    raise ResumeRenderError("简历渲染服务暂不可用。", 503)
+                continue
+            except RuntimeError as e:
+                raise ResumeRenderError(str(e), 503)
+            self.rendered += 1
+            if self.cache is not None:
+                self.cache.set(key, pdf)
+            return pdf
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "templates": self.versions,
+            "rendered": self.rendered,
+            "cache_hits": self.cache_hits,
+            "cache_entries": len(self.cache) if self.cache is not None else 0,
+            "timeouts": self.timeouts,
+            "pool_restarts": self.pool.restarts,
+            "single_flight": self._single_flight.stats(),
+        }
+
+
+resume_renderer = ResumeRenderer(
+    template_dir=settings.RESUME_TEMPLATE_DIR,
+    max_workers=settings.RESUME_RENDER_WORKERS,
+    timeout=settings.RESUME_RENDER_TIMEOUT,
+    cache=LRUTTLCache(
+        max_entries=settings.RESUME_CACHE_MAX_ENTRIES,
+        ttl=settings.RESUME_CACHE_TTL,
+    ) if settings.RESUME_CACHE_MAX_ENTRIES > 0 else None,
+)
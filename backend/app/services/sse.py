@@ -0,0 +1,81 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from fastapi.responses import StreamingResponse
+
+from app.core.config import settings
+
+# 关闭 nginx 等反向代理的响应缓冲，保证事件能即时到达浏览器
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+_END = object()
+
+
+def format_sse(data: Any, event: Optional[str] = None) -> str:
+    """将数据编码为一条 SSE 消息。"""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def relay_as_sse(
+    chunks: AsyncIterator[str],
+    build_result: Callable[[str], Dict[str, Any]],
+    buffer_size: int = settings.SSE_BUFFER_SIZE,
+) -> AsyncIterator[str]:
+    """
+    将上游的文本片段转发为 SSE 事件流。
+
+    - 每个片段产出一条 `message` 事件：{"answer": 片段}
+    - 结束时产出 `done` 事件，内容为 build_result(完整文本)
+    - 出错时产出 `error` 事件：{"detail": 错误信息}
+
+    上游读取在独立任务中进行，中间使用有界队列：浏览器读得慢时最多缓冲
+    buffer_size 个片段，之后对上游形成背压。客户端断开时本生成器被取消，
+    读取任务随之取消，上游请求也会被关闭。
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+
+    async def produce():
+        try:
+            async for chunk in chunks:
+                await queue.put(chunk)
+            await queue.put(_END)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put(e)
+
+    producer = asyncio.create_task(produce())
+    parts = []
+    try:
+        while True:
+            item = await queue.get()
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                yield format_sse({"detail": str(item)}, event="error")
+                return
+            parts.append(item)
+            yield format_sse({"answer": item}, event="message")
+        try:
+            result = build_result("".join(parts))
+        except Exception as e:
+            yield format_sse({"detail": str(e)}, event="error")
+            return
+        yield format_sse(result, event="done")
+    finally:
+        producer.cancel()
+        try:
+            await producer
+        except (asyncio.CancelledError, Exception):
+            pass
+        await chunks.aclose()
+
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    """构造 text/event-stream 响应。"""
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,281 @@
+import re
+from bisect import bisect_left
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.services.llm_cache import LRUTTLCache
+
+# 差异操作：("=", 文本) 未改动，("-", 文本) 删除，("+", 文本) 新增
+DiffOp = Tuple[str, str]
+
+# 中日韩字符逐字切分，其余按单词、连续空白与单个标点切分
+_CJK = "぀-ヿ㐀-䶿一-鿿가-힯豈-﫿"
+_TOKEN_RE = re.compile(rf"[{_CJK}]|[^\W{_CJK}]+|\s+|.", re.S)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text)
+
+
+class _Budget:
+    """一次比较中 Myers 搜索允许的总步数（前沿上的对角线数），用尽后其余区段不再细化。"""
+
+    def __init__(self, steps: int):
+        self.remaining = steps
+
+
+def _myers(a: Sequence[str], b: Sequence[str], budget: _Budget) -> Optional[List[DiffOp]]:
+    """
+    Myers O(ND) 差分算法，返回逐个元素的操作序列；超出步数预算时返回 None。
+    trace[d] 保存第 d 轮开始前的前沿（k ∈ [-d-1, d+1]），用于回溯最短编辑路径。
+    """
+    n, m = len(a), len(b)
+    # 两侧元素多重集之差是编辑距离 D 的下界，搜索至少需要约 D²/2 步
+    lower = sum(((Counter(a) - Counter(b)) + (Counter(b) - Counter(a))).values())
+    if lower * lower // 2 > budget.remaining:
+        return None
+    offset = n + m + 1
+    v = [0] * (2 * (n + m) + 3)
+    trace = []
+    for d in range(n + m + 1):
+        budget.remaining -= d + 1
+        if budget.remaining < 0:
+            return None
+        trace.append(v[offset - d - 1:offset + d + 2])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, a, b)
+    return None
+
+
+def _backtrack(trace: List[List[int]], a: Sequence[str], b: Sequence[str]) -> List[DiffOp]:
+    ops: List[DiffOp] = []
+    x, y = len(a), len(b)
+    for d in range(len(trace) - 1, -1, -1):
+        frontier = trace[d]
+        k = x - y
+        if k == -d or (k != d and frontier[k - 1 + d + 1] < frontier[k + 1 + d + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = frontier[prev_k + d + 1]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            ops.append(("=", a[x]))
+        if d > 0:
+            if x == prev_x:
+                ops.append(("+", b[prev_y]))
+            else:
+                ops.append(("-", a[prev_x]))
+        x, y = prev_x, prev_y
+    ops.reverse()
+    return ops
+
+
+def _merge(ops: List[DiffOp]) -> List[DiffOp]:
+    """合并相邻的同类操作；两段未改动文本之间的改动合并为一个删除加一个新增。"""
+    merged: List[DiffOp] = []
+    removed: List[str] = []
+    added: List[str] = []
+
+    def flush():
+        if removed:
+            merged.append(("-", "".join(removed)))
+        if added:
+            merged.append(("+", "".join(added)))
+        removed.clear()
+        added.clear()
+
+    for tag, text in ops:
+        if not text:
+            continue
+        if tag == "-":
+            removed.append(text)
+        elif tag == "+":
+            added.append(text)
+        else:
+            flush()
+            if merged and merged[-1][0] == "=":
+                merged[-1] = ("=", merged[-1][1] + text)
+            else:
+                merged.append((tag, text))
+    flush()
+    return merged
+
+
+def _unique_anchors(a: Sequence[str], b: Sequence[str]) -> List[Tuple[int, int]]:
+    """
+    两侧都只出现一次的行作为锚点，取其中位置在两侧同序的最长子序列（patience 排序），
+    锚点之间的区段再交给 Myers 算法。
+    """
+    count_a, count_b = Counter(a), Counter(b)
+    index_b = {line: j for j, line in enumerate(b) if count_b[line] == 1}
+    pairs = [(i, index_b[line]) for i, line in enumerate(a) if count_a[line] == 1 and line in index_b]
+    tails: List[int] = []
+    tail_index: List[int] = []
+    previous: List[int] = []
+    for index, (_, j) in enumerate(pairs):
+        pos = bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tail_index.append(index)
+        else:
+            tails[pos] = j
+            tail_index[pos] = index
+        previous.append(tail_index[pos - 1] if pos else -1)
+    anchors = []
+    index = tail_index[-1] if tail_index else -1
+    while index >= 0:
+        anchors.append(pairs[index])
+        index = previous[index]
+    anchors.reverse()
+    return anchors
+
+
+def _diff_lines(a: List[str], b: List[str], budget: _Budget) -> List[DiffOp]:
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    ops: List[DiffOp] = [("=", line) for line in a[:start]]
+    ma, mb = a[start:len(a) - end], b[start:len(b) - end]
+
+    pa = pb = 0
+    for i, j in _unique_anchors(ma, mb) + [(len(ma), len(mb))]:
+        gap_a, gap_b = ma[pa:i], mb[pb:j]
+        gap = _myers(gap_a, gap_b, budget) if gap_a and gap_b else None
+        if gap is None:
+            gap = [("-", line) for line in gap_a] + [("+", line) for line in gap_b]
+        ops.extend(gap)
+        if i < len(ma):
+            ops.append(("=", ma[i]))
+        pa, pb = i + 1, j + 1
+    ops.extend(("=", line) for line in a[len(a) - end:])
+    return ops
+
+
+def diff_texts(a: str, b: str, max_steps: int = 500000) -> List[DiffOp]:
+    """
+    按词（中日韩逐字）计算两段文本的差异：先按行对齐（公共前后缀与唯一行锚点之外用 Myers 算法），
+    再对每段改动的行在词级别用 Myers 算法细化。搜索总步数以 max_steps 为上限，
+    超出后剩余的区段整体视为删除加新增，保证最坏情况下的耗时。
+    """
+    if a == b:
+        return [("=", a)] if a else []
+    budget = _Budget(max_steps)
+    ops: List[DiffOp] = []
+    removed: List[str] = []
+    added: List[str] = []
+
+    def refine():
+        if removed and added:
+            words = _myers(tokenize("".join(removed)), tokenize("".join(added)), budget)
+            ops.extend(words if words is not None else [("-", "".join(removed)), ("+", "".join(added))])
+        else:
+            ops.extend([("-", "".join(removed)), ("+", "".join(added))])
+        removed.clear()
+        added.clear()
+
+    for tag, line in _diff_lines(a.splitlines(keepends=True), b.splitlines(keepends=True), budget):
+        if tag == "-":
+            removed.append(line)
+        elif tag == "+":
+            added.append(line)
+        else:
+            refine()
+            ops.append((tag, line))
+    refine()
+    return _merge(ops)
+
+
+def make_hunks(ops: List[DiffOp], context: int = 40) -> List[Dict[str, Any]]:
+    """
+    把差异压缩为若干片段：每个片段只保留改动及其前后 context 个字符的上下文，
+    间隔不超过 2 × context 的改动合并为一个片段。a_start / b_start 为片段在两版本中的字符偏移。
+    """
+    hunks: List[Dict[str, Any]] = []
+    current: Optional[Dict[str, Any]] = None
+    pos_a = pos_b = 0
+    for index, (tag, text) in enumerate(ops):
+        if tag == "=":
+            is_last = index == len(ops) - 1
+            if current is not None and (len(text) <= 2 * context and not is_last):
+                current["ops"].append(["=", text])
+            elif current is not None:
+                if context:
+                    current["ops"].append(["=", text[:context]])
+                hunks.append(current)
+                current = None
+            pos_a += len(text)
+            pos_b += len(text)
+            continue
+        if current is None:
+            lead = ""
+            if index > 0 and ops[index - 1][0] == "=" and context:
+                lead = ops[index - 1][1][-context:]
+            current = {"a_start": pos_a - len(lead), "b_start": pos_b - len(lead), "ops": [["=", lead]] if lead else []}
+        current["ops"].append([tag, text])
+        if tag == "-":
+            pos_a += len(text)
+        else:
+            pos_b += len(text)
+    if current is not None:
+        hunks.append(current)
+    return hunks
+
+
+class TextDiffer:
+    """版本差异计算，结果按两版本内容的校验和缓存（版本内容不可变）。"""
+
+    def __init__(self, max_steps: int = 500000, cache: Optional[LRUTTLCache] = None):
+        self.max_steps = max_steps
+        self.cache = cache
+        self.computed = 0
+        self.cache_hits = 0
+
+    def diff(self, a: str, b: str, cache_key: Optional[str] = None, context: int = 40) -> Dict[str, Any]:
+        key = f"{cache_key}:{context}" if cache_key else None
+        if key and self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.cache_hits += 1
+                return cached
+        ops = diff_texts(a, b, self.max_steps)
+        result = {
+            "identical": a == b,
+            "insertions": sum(len(text) for tag, text in ops if tag == "+"),
+            "deletions": sum(len(text) for tag, text in ops if tag == "-"),
+            "hunks": make_hunks(ops, context),
+        }
+        self.computed += 1
+        if key and self.cache is not None:
+            self.cache.set(key, result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "computed": self.computed,
+            "cache_hits": self.cache_hits,
+            "cache_entries": len(self.cache) if self.cache is not None else 0,
+        }
+
+
+text_differ = TextDiffer(
+    max_steps=settings.VERSION_DIFF_MAX_STEPS,
+    cache=LRUTTLCache(max_entries=settings.VERSION_DIFF_CACHE_MAX_ENTRIES, ttl=86400)
+    if settings.VERSION_DIFF_CACHE_MAX_ENTRIES > 0 else None,
+)
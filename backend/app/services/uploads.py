@@ -0,0 +1,174 @@
+import hashlib
+import os
+import tempfile
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+PDF_MAGIC = b"%PDF-"
+ZIP_MAGIC = b"PK\x03\x04"
+# PDF 规范允许文件头前出现少量字节，只在开头这段范围内查找魔数
+MAGIC_WINDOW = 1024
+
+_TYPE_NAMES = {PDF_MAGIC: "PDF", ZIP_MAGIC: "ZIP"}
+
+
+class UploadRejectedError(Exception):
+    """上传被拒绝：超过大小限制为 413，文件类型不符为 400。"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class SpooledUpload:
+    """已写入临时文件的上传内容：path 为磁盘路径，sha256 为内容摘要。"""
+
+    def __init__(self, path: str, size: int, sha256: str, filename: Optional[str] = None):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.filename = filename
+
+    def cleanup(self) -> None:
+        _remove(self.path)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _too_large(max_bytes: int) -> UploadRejectedError:
+    return UploadRejectedError(f"文件过大，最大允许 {max_bytes / (1024 * 1024):.1f} MB。", 413)
+
+
+class SpoolWriter:
+    """
+    把分块读取的内容写入临时文件，同时校验文件头魔数、限制大小并计算 SHA-256。
+    内存中只保留当前分块；任何校验失败都会删除临时文件并抛出 UploadRejectedError。
+    """
+
+    def __init__(self, max_bytes: int, magic: Optional[bytes] = PDF_MAGIC):
+        self.max_bytes = max_bytes
+        self.magic = magic
+        suffix = f".{_TYPE_NAMES.get(magic, 'bin').lower()}"
+        fd, self.path = tempfile.mkstemp(suffix=suffix, dir=settings.UPLOAD_TMP_DIR or None)
+        self._out = os.fdopen(fd, "wb")
+        self._digest = hashlib.sha256()
+        self._head = b""
+        self.size = 0
+
+    def _check_magic(self) -> None:
+        if self.magic is not None and self.magic not in self._head[:MAGIC_WINDOW]:
+            raise UploadRejectedError(f"无效的文件类型，请上传{_TYPE_NAMES.get(self.magic, '正确格式的文件')}。", 400)
+
+    def write(self, chunk: bytes) -> None:
+        try:
+            if len(self._head) < MAGIC_WINDOW:
+                self._head += chunk[:MAGIC_WINDOW - len(self._head)]
+                if len(self._head) >= MAGIC_WINDOW:
+                    self._check_magic()
+            self.size += len(chunk)
+            if self.size > self.max_bytes:
+                raise _too_large(self.max_bytes)
+            self._digest.update(chunk)
+            self._out.write(chunk)
+        except BaseException:
+            self.abort()
+            raise
+
+    def finish(self, filename: Optional[str] = None) -> SpooledUpload:
+        self._out.close()
+        try:
+            self._check_magic()
+        except UploadRejectedError:
+            _remove(self.path)
+            raise
+        return SpooledUpload(self.path, self.size, self._digest.hexdigest(), filename)
+
+    def abort(self) -> None:
+        self._out.close()
+        _remove(self.path)
+
+
+async def spool_upload(
+    file: UploadFile,
+    max_bytes: Optional[int] = None,
+    magic: Optional[bytes] = PDF_MAGIC,
+) -> SpooledUpload:
+    """
+    分块把上传文件写入临时文件并返回，调用方负责 cleanup()。
+    开头不含指定魔数或超过 max_bytes 时停止复制并删除临时文件。
+    此时请求体已由 Starlette 接收并解析完毕，整个请求的大小由 RequestSizeLimitMiddleware 在接收时限制。
+    """
+    max_bytes = max_bytes or settings.UPLOAD_MAX_BYTES
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large(max_bytes)
+
+    writer = SpoolWriter(max_bytes, magic)
+    try:
+        while True:
+            chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            await run_in_threadpool(writer.write, chunk)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.finish(file.filename)
+
+
+@asynccontextmanager
+async def spool_pdf_upload(file: UploadFile, max_bytes: Optional[int] = None) -> AsyncIterator[SpooledUpload]:
+    """把上传的 PDF 写入临时文件，退出时删除。"""
+    spooled = await spool_upload(file, max_bytes, PDF_MAGIC)
+    try:
+        yield spooled
+    finally:
+        spooled.cleanup()
+
+
+class RequestSizeLimitMiddleware:
+    """
+    在 Starlette 接收并解析 multipart 请求体之前限制其大小：Content-Length 超过上限时直接返回 413，
+    未声明长度（分块传输）时累计已接收的字节数，超过上限即中止接收并返回 413。
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    def _detail(self) -> str:
+        return f"请求过大，最大允许 {self.max_bytes / (1024 * 1024):.1f} MB。"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.max_bytes <= 0:
+            await self.app(scope, receive, send)
+            return
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            await JSONResponse({"detail": self._detail()}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=self._detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
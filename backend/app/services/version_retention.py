@@ -0,0 +1,246 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, text
+
+from app.core.config import settings
+from app.database import SessionLocal, engine
+from app.models import document_models
+from app.services.version_search import version_search
+from app.services.version_store import VersionStore, version_store
+
+logger = logging.getLogger("cv-agent-retention")
+
+
+def is_autosave(version_metadata: Optional[str]) -> bool:
+    try:
+        return json.loads(version_metadata or "{}").get("source") == "autosave"
+    except (ValueError, AttributeError):
+        return False
+
+
+class VersionRetention:
+    """
+    版本保留策略与压缩的后台任务，每 interval 秒运行一轮：
+
+    1. 稀疏化：手动保存的版本与文档的当前版本全部保留；自动保存的版本在 hourly_after_days 天后每小时只保留最后一个，
+       daily_after_days 天后每天只保留最后一个，其余软删除（与用户删除的版本一样，到清除期满才物理删除）。
+    2. 清除：软删除超过 purge_after_days 天的版本物理删除。以其为差分基准的版本先改为基于它的基准重新编码，
+       差分链不会断裂；同时移除全文索引。
+    3. 有版本被清除时执行 ANALYZE，并按 vacuum 执行 VACUUM 回收空间。
+
+    每批处理 batch_size 个文档（或版本）后休眠 pause 秒，避免与在线请求争抢数据库。
+    """
+
+    def __init__(
+        self,
+        store: VersionStore,
+        interval: float = 3600.0,
+        batch_size: int = 100,
+        pause: float = 0.5,
+        hourly_after_days: float = 1,
+        daily_after_days: float = 30,
+        purge_after_days: float = 30,
+        vacuum: bool = True,
+        enabled: bool = False,
+    ):
+        self.store = store
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self.hourly_after_days = hourly_after_days
+        self.daily_after_days = daily_after_days
+        self.purge_after_days = purge_after_days
+        self.vacuum = vacuum
+        self.enabled = enabled
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.thinned = 0
+        self.purged = 0
+        self.rebased = 0
+        self.maintenance_runs = 0
+        self.last_run_at: Optional[str] = None
+        self.last_run_seconds: Optional[float] = None
+
+    # --- 后台任务 ---
+    async def start(self) -> None:
+        if self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("版本保留任务失败，下一轮重试")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> None:
+        started = time.monotonic()
+        cursor = await run_in_threadpool(self.thin_batch, None)
+        while cursor is not None:
+            await asyncio.sleep(self.pause)
+            cursor = await run_in_threadpool(self.thin_batch, cursor)
+        purged = 0
+        while True:
+            count = await run_in_threadpool(self.purge_batch)
+            if count == 0:
+                break
+            purged += count
+            await asyncio.sleep(self.pause)
+        if purged:
+            await run_in_threadpool(self.maintain)
+        self._finish_run(started, purged)
+
+    def _finish_run(self, started: float, purged: int) -> None:
+        self.runs += 1
+        self.last_run_at = datetime.utcnow().isoformat()
+        self.last_run_seconds = round(time.monotonic() - started, 3)
+        logger.info("版本保留任务完成：累计稀疏化 %s 个、本轮清除 %s 个版本", self.thinned, purged)
+
+    # --- 稀疏化 ---
+    def thin_batch(self, after: Optional[str]) -> Optional[str]:
+        """稀疏化 id 在 after 之后的一批文档的自动保存版本，返回本批最后一个文档 id；没有更多文档时返回 None。"""
+        Document, Version = document_models.Document, document_models.DocumentVersion
+        now = datetime.utcnow()
+        hourly_before = now - timedelta(days=self.hourly_after_days)
+        daily_before = now - timedelta(days=self.daily_after_days)
+        db = SessionLocal()
+        try:
+            query = db.query(Document.id, Document.current_version_id)
+            if after is not None:
+                query = query.filter(Document.id > after)
+            documents = query.order_by(Document.id).limit(self.batch_size).all()
+            if not documents:
+                return None
+            current_ids = {d.current_version_id for d in documents}
+            rows = db.query(Version.id, Version.document_id, Version.created_at, Version.version_metadata).filter(
+                Version.document_id.in_([d.id for d in documents]),
+                Version.deleted_at.is_(None),
+                Version.created_at < hourly_before,
+            ).order_by(Version.document_id, Version.version_number.desc()).all()
+
+            # 每个 (文档, 时间段) 保留最新的一个自动保存版本（按版本号倒序，先遇到的保留）
+            kept, thinned = set(), []
+            for row in rows:
+                if row.id in current_ids or not is_autosave(row.version_metadata):
+                    continue
+                if row.created_at < daily_before:
+                    bucket = (row.document_id, row.created_at.date())
+                else:
+                    bucket = (row.document_id, row.created_at.replace(minute=0, second=0, microsecond=0))
+                if bucket in kept:
+                    thinned.append(row.id)
+                else:
+                    kept.add(bucket)
+
+            if thinned:
+                db.query(Version).filter(Version.id.in_(thinned)).update(
+                    {Version.deleted_at: now}, synchronize_session=False
+                )
+                for version_id in thinned:
+                    version_search.remove_version(db, version_id)
+                db.commit()
+                self.thinned += len(thinned)
+            return documents[-1].id
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    # --- 清除 ---
+    def _rebase_dependents(self, db, version: document_models.DocumentVersion) -> None:
+        """以 version 为基准的版本改为以 version 的基准为基准；差分版本按新基准重新编码（内容不变）。"""
+        Version = document_models.DocumentVersion
+        dependents = db.query(Version).filter(Version.diff_from == version.id).all()
+        if not dependents:
+            return
+        base = db.query(Version).filter(Version.id == version.diff_from).first() if version.diff_from else None
+        base_content = self.store.get_content(db, base) if base is not None else None
+        for dependent in dependents:
+            if dependent.storage_format == document_models.StorageFormat.delta.value:
+                content = self.store.get_content(db, dependent)
+                for key, value in self.store.encode(content, base, base_content).items():
+                    setattr(dependent, key, value)
+            else:
+                dependent.diff_from = base.id if base is not None else None
+            self.rebased += 1
+        db.flush()
+
+    def purge_batch(self) -> int:
+        """物理删除一批软删除期满的版本，返回删除的行数。文档的当前版本不删除。"""
+        Document, Version = document_models.Document, document_models.DocumentVersion
+        cutoff = datetime.utcnow() - timedelta(days=self.purge_after_days)
+        db = SessionLocal()
+        try:
+            current = select(Document.current_version_id).where(Document.current_version_id.isnot(None))
+            victims = db.query(Version).filter(
+                Version.deleted_at.isnot(None),
+                Version.deleted_at < cutoff,
+                Version.id.notin_(current),
+            ).order_by(Version.deleted_at, Version.id).limit(self.batch_size).all()
+            for version in victims:
+                self._rebase_dependents(db, version)
+                version_search.remove_version(db, version.id)
+                db.delete(version)
+                db.flush()
+            db.commit()
+            for version in victims:
+                self.store.cache.pop(version.id)
+            self.purged += len(victims)
+            return len(victims)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def maintain(self) -> None:
+        """清除后更新统计信息并回收空间（VACUUM 不能在事务中执行）。"""
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            if engine.dialect.name == "postgresql":
+                tables = ["document_versions"] + (["version_search"] if version_search.available else [])
+                for table in tables:
+                    conn.execute(text(f"VACUUM (ANALYZE) {table}" if self.vacuum else f"ANALYZE {table}"))
+            elif engine.dialect.name == "sqlite":
+                conn.execute(text("ANALYZE"))
+                if self.vacuum:
+                    conn.execute(text("VACUUM"))
+        self.maintenance_runs += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "runs": self.runs,
+            "thinned": self.thinned,
+            "purged": self.purged,
+            "rebased": self.rebased,
+            "maintenance_runs": self.maintenance_runs,
+            "last_run_at": self.last_run_at,
+            "last_run_seconds": self.last_run_seconds,
+        }
+
+
+version_retention = VersionRetention(
+    version_store,
+    interval=settings.RETENTION_INTERVAL,
+    batch_size=settings.RETENTION_BATCH_SIZE,
+    pause=settings.RETENTION_BATCH_PAUSE,
+    hourly_after_days=settings.RETENTION_HOURLY_AFTER_DAYS,
+    daily_after_days=settings.RETENTION_DAILY_AFTER_DAYS,
+    purge_after_days=settings.RETENTION_PURGE_AFTER_DAYS,
+    vacuum=settings.RETENTION_VACUUM,
+    enabled=settings.RETENTION_ENABLED,
+)
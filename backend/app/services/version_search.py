@@ -0,0 +1,232 @@
+import html
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import DateTime, literal_column, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models import document_models
+
+logger = logging.getLogger("cv-agent-search")
+
+_CJK = "぀-ヿ㐀-䶿一-鿿가-힯豈-﫿"
+_CJK_RUN_RE = re.compile(rf"[{_CJK}]+")
+_TERM_RE = re.compile(r'[^\s"]+')
+
+
+class SearchUnavailableError(Exception):
+    """当前数据库不支持全文检索（如 SQLite 未编译 FTS5）。"""
+
+
+def search_text(content: str, query: bool = False) -> str:
+    """
+    生成用于索引与查询的文本：中日韩字符连续段拆成相邻二元组（bigram），其余文本交给数据库分词器。
+    建索引时在每段末尾补上最后一个字符，使单字查询可通过前缀匹配命中；查询时不补，以便多字词按短语匹配。
+    """
+    def split_run(match: "re.Match[str]") -> str:
+        run = match.group(0)
+        if len(run) == 1:
+            return f" {run} "
+        bigrams = " ".join(run[i:i + 2] for i in range(len(run) - 1))
+        return f" {bigrams} " if query else f" {bigrams} {run[-1]} "
+
+    return _CJK_RUN_RE.sub(split_run, content.lower())
+
+
+def query_terms(query: str) -> List[str]:
+    """把查询拆成词项（按空白分隔，去掉引号）。"""
+    return _TERM_RE.findall(query.lower())[:settings.SEARCH_MAX_TERMS]
+
+
+def highlight(content: str, terms: List[str], width: int = 60) -> str:
+    """截取第一个命中词附近的片段，命中处用 <mark> 包裹，其余文本做 HTML 转义。"""
+    lowered = content.lower()
+    positions = [lowered.find(t) for t in terms]
+    hits = [p for p in positions if p >= 0]
+    first = min(hits) if hits else 0
+    start = max(0, first - width)
+    end = min(len(content), first + width * 2)
+    window = content[start:end]
+    pattern = re.compile("|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True)), re.I) if terms else None
+    out, pos = [], 0
+    if pattern is not None:
+        for match in pattern.finditer(window):
+            out.append(html.escape(window[pos:match.start()]))
+            out.append(f"<mark>{html.escape(match.group(0))}</mark>")
+            pos = match.end()
+    out.append(html.escape(window[pos:]))
+    return ("…" if start > 0 else "") + "".join(out) + ("…" if end < len(content) else "")
+
+
+class VersionSearchIndex:
+    """
+    文档版本的全文索引。版本内容以差分/压缩形式存储，无法直接建索引，
+    因此在写入版本时把完整文本（经 search_text 处理）写入旁路索引表：
+    SQLite 使用 FTS5 虚拟表并按 bm25 排序，Postgres 使用 tsvector + GIN 索引并按 ts_rank_cd 排序。
+    版本软删除时从索引中移除；查询时仍与版本、文档表关联过滤，已删除的数据不会出现在结果中。
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.dialect: Optional[str] = None
+        self.available = False
+        self.indexed = 0
+        self.searches = 0
+
+    def ensure_schema(self, engine: Engine) -> None:
+        """创建索引表（create_all 无法创建 FTS5 虚拟表与 tsvector 列）。"""
+        self.dialect = engine.dialect.name
+        if not self.enabled:
+            return
+        try:
+            with engine.begin() as conn:
+                if self.dialect == "sqlite":
+                    conn.execute(text(
+                        "CREATE VIRTUAL TABLE IF NOT EXISTS version_search "
+                        "USING fts5(version_id UNINDEXED, document_id UNINDEXED, body, tokenize='unicode61')"
+                    ))
+                elif self.dialect == "postgresql":
+                    conn.execute(text(
+                        "CREATE TABLE IF NOT EXISTS version_search ("
+                        "version_id TEXT PRIMARY KEY, document_id TEXT NOT NULL, body_tsv TSVECTOR NOT NULL)"
+                    ))
+                    conn.execute(text(
+                        "CREATE INDEX IF NOT EXISTS idx_version_search_tsv ON version_search USING GIN (body_tsv)"
+                    ))
+                else:
+                    return
+            self.available = True
+        except OperationalError as e:
+            logger.warning("全文检索不可用：%s", e)
+
+    # --- 维护 ---
+    def index_version(self, db: Session, version: document_models.DocumentVersion, content: str) -> None:
+        """把新版本写入索引（与版本在同一事务中提交）。"""
+        if not self.available:
+            return
+        params = {"version_id": version.id, "document_id": version.document_id, "body": search_text(content)}
+        if self.dialect == "sqlite":
+            db.execute(text("DELETE FROM version_search WHERE version_id = :version_id"), params)
+            db.execute(text(
+                "INSERT INTO version_search (version_id, document_id, body) VALUES (:version_id, :document_id, :body)"
+            ), params)
+        else:
+            db.execute(text(
+                "INSERT INTO version_search (version_id, document_id, body_tsv) "
+                "VALUES (:version_id, :document_id, to_tsvector('simple', :body)) "
+                "ON CONFLICT (version_id) DO UPDATE SET body_tsv = EXCLUDED.body_tsv"
+            ), params)
+        self.indexed += 1
+
+    def remove_version(self, db: Session, version_id: str) -> None:
+        if not self.available:
+            return
+        db.execute(text("DELETE FROM version_search WHERE version_id = :version_id"), {"version_id": version_id})
+
+    def rebuild(self, db: Session, batch: int = 200) -> int:
+        """为尚未建索引的有效版本补建索引，返回补建的版本数。"""
+        from app.services.version_store import version_store
+
+        if not self.available:
+            raise SearchUnavailableError("全文检索不可用")
+        Version = document_models.DocumentVersion
+        done = 0
+        while True:
+            indexed = select(literal_column("version_id")).select_from(text("version_search"))
+            versions = db.query(Version).filter(
+                Version.deleted_at.is_(None),
+                Version.id.notin_(indexed)
+            ).order_by(Version.id).limit(batch).all()
+            if not versions:
+                return done
+            for version in versions:
+                self.index_version(db, version, version_store.get_content(db, version))
+            db.commit()
+            version_store.cache.clear()
+            done += len(versions)
+
+    # --- 查询 ---
+    def _match(self, terms: List[str], params: Dict[str, Any]) -> Tuple[str, str]:
+        """返回 (匹配条件, 相关度表达式)。所有词项都须命中；多字词按短语匹配。"""
+        if self.dialect == "sqlite":
+            phrases = []
+            for term in terms:
+                tokens = search_text(term, query=True).split()
+                # 单个中日韩字符只出现在二元组开头或连续段末尾，用前缀匹配
+                if len(tokens) == 1 and _CJK_RUN_RE.fullmatch(tokens[0]):
+                    phrases.append(f'"{tokens[0]}"*')
+                elif tokens:
+                    phrases.append('"' + " ".join(tokens) + '"')
+            if not phrases:
+                return "", ""
+            params["match"] = " AND ".join(phrases)
+            return "version_search MATCH :match", "-bm25(version_search)"
+        queries = []
+        for i, term in enumerate(terms):
+            tokens = search_text(term, query=True).split()
+            if len(tokens) == 1 and _CJK_RUN_RE.fullmatch(tokens[0]):
+                params[f"t{i}"] = tokens[0] + ":*"
+                queries.append(f"to_tsquery('simple', :t{i})")
+            else:
+                params[f"t{i}"] = " ".join(tokens)
+                queries.append(f"phraseto_tsquery('simple', :t{i})")
+        tsquery = "(" + " && ".join(queries) + ")"
+        return f"version_search.body_tsv @@ {tsquery}", f"ts_rank_cd(version_search.body_tsv, {tsquery})"
+
+    def search(
+        self,
+        db: Session,
+        user_id: str,
+        query: str,
+        doc_type: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> List[Dict[str, Any]]:
+        """按相关度检索用户的有效版本，返回至多 limit + 1 条以便判断是否还有下一页。"""
+        if not self.available:
+            raise SearchUnavailableError("全文检索不可用")
+        terms = query_terms(query)
+        if not terms:
+            return []
+        params: Dict[str, Any] = {"user_id": user_id, "limit": limit + 1, "offset": offset}
+        match, score = self._match(terms, params)
+        if not match:
+            return []
+        type_filter = ""
+        if doc_type:
+            params["doc_type"] = doc_type
+            type_filter = "AND d.type = :doc_type "
+        statement = text(
+            f"SELECT v.id, v.document_id, v.version_number, v.created_at, d.type, d.title, {score} AS score "
+            "FROM version_search "
+            "JOIN document_versions v ON v.id = version_search.version_id "
+            "JOIN documents d ON d.id = v.document_id "
+            f"WHERE {match} AND d.user_id = :user_id AND v.deleted_at IS NULL AND d.deleted_at IS NULL {type_filter}"
+            "ORDER BY score DESC, v.created_at DESC, v.id "
+            "LIMIT :limit OFFSET :offset"
+        ).columns(created_at=DateTime)
+        rows = db.execute(statement, params).all()
+        self.searches += 1
+        return [
+            {
+                "version_id": row.id,
+                "document_id": row.document_id,
+                "version_number": row.version_number,
+                "created_at": row.created_at,
+                "type": row.type,
+                "title": row.title,
+                "score": round(float(row.score), 4),
+                "terms": terms,
+            }
+            for row in rows
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"available": self.available, "indexed": self.indexed, "searches": self.searches}
+
+
+version_search = VersionSearchIndex(enabled=settings.SEARCH_ENABLED)
@@ -0,0 +1,383 @@
+import difflib
+import json
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import and_, case, func, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.core.config import settings
+from app.models import document_models
+from app.services.auth import calculate_checksum
+from app.services.content_codec import ContentCompressor, content_compressor
+from app.services.llm_cache import LRUTTLCache
+from app.services.version_search import version_search
+
+DeltaOp = Union[int, str]
+
+# content_preview 保存的完整文本开头字符数
+PREVIEW_CHARS = 200
+
+
+class VersionStorageError(Exception):
+    """版本内容无法还原（差分链断裂或校验和不一致）。"""
+
+
+class VersionConflictError(Exception):
+    """保存时的基准版本号已不是文档的最新版本号（期间有其他保存）。"""
+
+    def __init__(self, current: int):
+        super().__init__(f"文档已更新到版本 {current}")
+        self.current = current
+
+
+# --- 差分编码 ---
+# 差分为按行的操作序列：正整数 n 表示从基准版本复制 n 行，负整数 -n 表示跳过基准版本的 n 行，
+# 字符串表示插入的文本。例如 [12, -1, "新的一行\n", 30]。
+
+def _lines(text: str) -> List[str]:
+    return text.splitlines(keepends=True)
+
+
+def make_delta(base: str, target: str) -> List[DeltaOp]:
+    base_lines, target_lines = _lines(base), _lines(target)
+    ops: List[DeltaOp] = []
+    matcher = difflib.SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(i2 - i1)
+            continue
+        if tag in ("delete", "replace"):
+            ops.append(-(i2 - i1))
+        if tag in ("insert", "replace"):
+            inserted = "".join(target_lines[j1:j2])
+            if ops and isinstance(ops[-1], str):
+                ops[-1] += inserted
+            else:
+                ops.append(inserted)
+    return ops
+
+
+def apply_delta(base: str, ops: List[DeltaOp]) -> str:
+    base_lines = _lines(base)
+    out: List[str] = []
+    pos = 0
+    for op in ops:
+        if isinstance(op, str):
+            out.append(op)
+        elif op > 0:
+            out.extend(base_lines[pos:pos + op])
+            pos += op
+        else:
+            pos -= op
+    return "".join(out)
+
+
+def encode_delta(ops: List[DeltaOp]) -> str:
+    return json.dumps(ops, ensure_ascii=False, separators=(",", ":"))
+
+
+def stored_size(version: document_models.DocumentVersion) -> int:
+    """版本在数据库中实际占用的内容字节数。"""
+    if version.content_blob is not None:
+        return len(version.content_blob)
+    return len((version.content or "").encode("utf-8"))
+
+
+def _plain_full():
+    return and_(
+        document_models.DocumentVersion.storage_format == document_models.StorageFormat.full.value,
+        document_models.DocumentVersion.content_codec == document_models.ContentCodec.plain.value,
+    )
+
+
+def preview_column():
+    """
+    列表展示用的内容预览（SQL 表达式）：优先取 content_preview；
+    尚未补齐的历史版本若为完整明文，直接在 SQL 中截取 content，不把全文读入应用。
+    """
+    V = document_models.DocumentVersion
+    return func.coalesce(V.content_preview, case((_plain_full(), func.substr(V.content, 1, PREVIEW_CHARS)), else_=None))
+
+
+def length_column():
+    """完整文本的字符数（SQL 表达式），规则同 preview_column。"""
+    V = document_models.DocumentVersion
+    return func.coalesce(V.content_length, case((_plain_full(), func.length(V.content)), else_=None))
+
+
+class VersionStore:
+    """
+    文档版本内容的读写入口。
+
+    新版本默认存为相对前一版本（diff_from）的按行差分，每 keyframe_interval 个版本
+    或差分不比全文小时存一次完整文本（关键帧）。存储内容（全文或差分）可再经 compressor 压缩。
+    读取时沿 diff_from 链回溯到最近的关键帧或已还原的版本再依次解压、应用差分，
+    已还原的内容保存在有上限的 LRU 中（版本内容不可变，无需失效）。
+    """
+
+    def __init__(
+        self,
+        keyframe_interval: int = 20,
+        delta_enabled: bool = True,
+        cache: Optional[LRUTTLCache] = None,
+        compressor: Optional[ContentCompressor] = None,
+    ):
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.delta_enabled = delta_enabled
+        self.cache = cache if cache is not None else LRUTTLCache(max_entries=512, ttl=86400)
+        self.compressor = compressor if compressor is not None else ContentCompressor(enabled=False)
+        self.keyframes_written = 0
+        self.unchanged_saves = 0
+        self.version_conflicts = 0
+        self.deltas_written = 0
+        self.bytes_saved = 0
+        self.cache_hits = 0
+        self.reconstructions = 0
+        self.versions_reencoded = 0
+
+    # --- 写入 ---
+    def encode(self, content: str, base: Optional[document_models.DocumentVersion], base_content: Optional[str] = None) -> Dict[str, Any]:
+        """
+        计算新版本的全部存储字段（差分、压缩、长度与校验和）。
+        base 为前一版本；base_content 为其完整内容，省略时自动还原。
+        """
+        fields = {
+            "content": content,
+            "storage_format": document_models.StorageFormat.full.value,
+            "delta_depth": 0,
+            "diff_from": base.id if base is not None else None,
+            "checksum_sha256": calculate_checksum(content),
+            "content_length": len(content),
+            "content_preview": content[:PREVIEW_CHARS],
+        }
+        if base is not None and self.delta_enabled:
+            depth = (base.delta_depth or 0) + 1
+            if depth < self.keyframe_interval:
+                if base_content is None:
+                    base_content = self.get_content(None, base)
+                delta = encode_delta(make_delta(base_content, content))
+                if len(delta) < len(content):
+                    fields.update(content=delta, storage_format=document_models.StorageFormat.delta.value, delta_depth=depth)
+        fields.update(self.compress_fields(fields["content"]))
+        return fields
+
+    def compress_fields(self, payload: str) -> Dict[str, Any]:
+        """存储内容的压缩相关字段；不压缩时内容留在 content 列。"""
+        compressed = self.compressor.compress(payload)
+        if compressed is None:
+            return {
+                "content": payload,
+                "content_codec": document_models.ContentCodec.plain.value,
+                "content_blob": None,
+                "compression_dict_id": None,
+            }
+        blob, dict_id = compressed
+        return {
+            "content": "",
+            "content_codec": document_models.ContentCodec.zlib.value,
+            "content_blob": blob,
+            "compression_dict_id": dict_id,
+        }
+
+    def allocate_version_number(
+        self,
+        db: Session,
+        document: document_models.Document,
+        expected: Optional[int] = None,
+    ) -> int:
+        """
+        分配文档的下一个版本号：在同一条 UPDATE 中递增 documents.version_counter 并返回新值，
+        并发保存各自得到不同的版本号，无需读后写或重试。该行锁持有到事务提交，同一文档的保存依次进行。
+        expected 不为空时仅当计数器仍等于 expected 才递增，否则抛出 VersionConflictError。
+        """
+        Document = document_models.Document
+        statement = update(Document).where(Document.id == document.id)
+        if expected is not None:
+            statement = statement.where(Document.version_counter == expected)
+        number = db.execute(
+            statement.values(version_counter=Document.version_counter + 1)
+            .returning(Document.version_counter)
+            .execution_options(synchronize_session=False)
+        ).scalar()
+        if number is None:
+            current = db.query(Document.version_counter).filter(Document.id == document.id).scalar()
+            self.version_conflicts += 1
+            raise VersionConflictError(current or 0)
+        set_committed_value(document, "version_counter", number)
+        return number
+
+    def latest_version(self, db: Session, document_id: str) -> Optional[document_models.DocumentVersion]:
+        """文档中版本号最大的有效版本（新版本的差分基准）。"""
+        return db.query(document_models.DocumentVersion).filter(
+            document_models.DocumentVersion.document_id == document_id,
+            document_models.DocumentVersion.deleted_at.is_(None)
+        ).order_by(document_models.DocumentVersion.version_number.desc()).first()
+
+    def create_version(
+        self,
+        db: Session,
+        document_id: str,
+        version_number: int,
+        content: str,
+        base: Optional[document_models.DocumentVersion] = None,
+        content_format: str = document_models.ContentFormat.markdown.value,
+        created_by: Optional[str] = None,
+        version_metadata: str = "{}",
+    ) -> document_models.DocumentVersion:
+        """创建新版本（已 flush，未提交）并写入全文索引，base 为前一版本。"""
+        fields = self.encode(content, base, None if base is None else self.get_content(db, base))
+        version = document_models.DocumentVersion(
+            document_id=document_id,
+            version_number=version_number,
+            content_format=content_format,
+            created_by=created_by,
+            version_metadata=version_metadata,
+            **fields,
+        )
+        db.add(version)
+        db.flush()
+        version_search.index_version(db, version, content)
+        self._count_write(version, content)
+        self.cache.set(version.id, content)
+        return version
+
+    def unchanged_version(
+        self,
+        db: Session,
+        document: document_models.Document,
+        content: str,
+        content_format: Optional[str] = None,
+    ) -> Optional[document_models.DocumentVersion]:
+        """内容（及格式）与文档当前版本相同时返回当前版本，调用方据此跳过写入；否则返回 None。"""
+        if document.current_version_id is None:
+            return None
+        current = db.query(document_models.DocumentVersion).filter(
+            document_models.DocumentVersion.id == document.current_version_id,
+            document_models.DocumentVersion.deleted_at.is_(None),
+        ).first()
+        if current is None or current.checksum_sha256 != calculate_checksum(content):
+            return None
+        if content_format is not None and current.content_format != content_format:
+            return None
+        self.unchanged_saves += 1
+        return current
+
+    def _count_write(self, version: document_models.DocumentVersion, content: str) -> None:
+        if version.storage_format == document_models.StorageFormat.delta.value:
+            self.deltas_written += 1
+        else:
+            self.keyframes_written += 1
+        self.bytes_saved += len(content.encode("utf-8")) - stored_size(version)
+
+    # --- 读取 ---
+    def payload(self, version: document_models.DocumentVersion) -> str:
+        """版本的存储内容（全文或差分），按需解压。"""
+        if version.content_codec == document_models.ContentCodec.zlib.value:
+            return self.compressor.decompress(version.content_blob, version.compression_dict_id)
+        return version.content
+
+    def get_content(self, db: Optional[Session], version: document_models.DocumentVersion) -> str:
+        """还原版本的完整内容。db 为 None 时通过 ORM 关系加载差分链。"""
+        cached = self.cache.get(version.id)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached
+
+        chain = []
+        current = version
+        while True:
+            cached = self.cache.get(current.id)
+            if cached is not None:
+                text = cached
+                break
+            if current.storage_format != document_models.StorageFormat.delta.value:
+                text = self.payload(current)
+                self.cache.set(current.id, text)
+                break
+            chain.append(current)
+            if db is not None:
+                base = db.query(document_models.DocumentVersion).filter(
+                    document_models.DocumentVersion.id == current.diff_from
+                ).first()
+            else:
+                base = current.diff_from_version
+            if base is None:
+                raise VersionStorageError(f"版本 {current.id} 的差分基准 {current.diff_from} 不存在")
+            current = base
+
+        for delta_version in reversed(chain):
+            text = apply_delta(text, json.loads(self.payload(delta_version)))
+            self.cache.set(delta_version.id, text)
+        if chain:
+            self.reconstructions += 1
+        if version.checksum_sha256 and calculate_checksum(text) != version.checksum_sha256:
+            self.cache.pop(version.id)
+            raise VersionStorageError(f"版本 {version.id} 还原后的内容校验失败")
+        return text
+
+    def next_content(
+        self,
+        db: Session,
+        version: document_models.DocumentVersion,
+        previous: Optional[Tuple[str, str]] = None,
+    ) -> str:
+        """
+        顺序读取时还原版本内容：previous 为上一个读取的 (版本 id, 内容)，差分基准恰为它时直接在其上应用差分，
+        不查询差分链也不写入 LRU。按文档、版本号顺序全量读取（如导出）时内存占用与版本数无关。
+        """
+        if (
+            previous is not None
+            and version.storage_format == document_models.StorageFormat.delta.value
+            and version.diff_from == previous[0]
+        ):
+            content = apply_delta(previous[1], json.loads(self.payload(version)))
+            if version.checksum_sha256 and calculate_checksum(content) != version.checksum_sha256:
+                raise VersionStorageError(f"版本 {version.id} 还原后的内容校验失败")
+            return content
+        return self.get_content(db, version)
+
+    # --- 迁移 ---
+    def reencode_document(self, db: Session, document_id: str) -> Dict[str, int]:
+        """
+        按当前策略重新编码一个文档的全部版本（含已软删除的版本），返回重新编码前后的存储字节数。
+        调用方负责提交。
+        """
+        versions = db.query(document_models.DocumentVersion).filter(
+            document_models.DocumentVersion.document_id == document_id
+        ).order_by(document_models.DocumentVersion.version_number, document_models.DocumentVersion.created_at).all()
+        contents = [self.get_content(db, v) for v in versions]
+        before = sum(stored_size(v) for v in versions)
+        base, base_content = None, None
+        for version, content in zip(versions, contents):
+            fields = self.encode(content, base, base_content)
+            for key, value in fields.items():
+                setattr(version, key, value)
+            # 重新编码不是新写入，单独计数，不计入 keyframes_written / deltas_written / bytes_saved
+            self.versions_reencoded += 1
+            base, base_content = version, content
+        db.flush()
+        return {"versions": len(versions), "bytes_before": before, "bytes_after": sum(stored_size(v) for v in versions)}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "delta_enabled": self.delta_enabled,
+            "keyframe_interval": self.keyframe_interval,
+            "keyframes_written": self.keyframes_written,
+            "deltas_written": self.deltas_written,
+            "unchanged_saves": self.unchanged_saves,
+            "version_conflicts": self.version_conflicts,
+            "bytes_saved": self.bytes_saved,
+            "cache_hits": self.cache_hits,
+            "reconstructions": self.reconstructions,
+            "versions_reencoded": self.versions_reencoded,
+            "cache_entries": len(self.cache),
+        }
+
+
+version_store = VersionStore(
+    keyframe_interval=settings.VERSION_KEYFRAME_INTERVAL,
+    delta_enabled=settings.VERSION_DELTA_ENABLED,
+    cache=LRUTTLCache(max_entries=settings.VERSION_CACHE_MAX_ENTRIES, ttl=86400),
+    compressor=content_compressor,
+)
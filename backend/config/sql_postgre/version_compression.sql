@@ -0,0 +1,33 @@
+BEGIN;
+
+-- 版本内容压缩的共享预设字典（zlib zdict），由近期完整版本训练，不可变
+CREATE TABLE IF NOT EXISTS compression_dictionaries (
+  id           SERIAL PRIMARY KEY,
+  codec        TEXT NOT NULL,
+  data         BYTEA NOT NULL,
+  sample_count INTEGER NOT NULL DEFAULT 0,
+  created_at   TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- 存储内容的编码：plain 时内容在 content 列，zlib 时压缩数据在 content_blob 列
+ALTER TABLE document_versions
+  ADD COLUMN IF NOT EXISTS content_codec TEXT NOT NULL DEFAULT 'plain'
+    CHECK (content_codec IN ('plain','zlib'));
+
+ALTER TABLE document_versions
+  ADD COLUMN IF NOT EXISTS content_blob BYTEA;
+
+ALTER TABLE document_versions
+  ADD COLUMN IF NOT EXISTS compression_dict_id INTEGER REFERENCES compression_dictionaries(id);
+
+-- 完整文本的字符数；content 可能是差分或为空，长度限制（沿用 migration.sql 的上限）改为约束该列。为空表示尚未经后台转换的历史版本
+ALTER TABLE document_versions
+  ADD COLUMN IF NOT EXISTS content_length INTEGER;
+
+ALTER TABLE document_versions DROP CONSTRAINT IF EXISTS chk_content_len;
+ALTER TABLE document_versions
+  ADD CONSTRAINT chk_content_len CHECK (content_length IS NULL OR content_length <= 5000);
+
+COMMIT;
+
+-- 历史版本在应用启动后由后台任务分批转换，也可运行：python -m scripts.migrate_db --compress
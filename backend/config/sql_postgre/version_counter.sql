@@ -0,0 +1,14 @@
+BEGIN;
+
+-- 每个文档已分配的最大版本号（含已软删除的版本）。保存时以
+--   UPDATE documents SET version_counter = version_counter + 1 WHERE id = $1 [AND version_counter = $2] RETURNING version_counter
+-- 原子地分配版本号，取代 max(version_number)+1 的读后写；带基准版本号的条件不满足时接口返回 409
+ALTER TABLE documents
+  ADD COLUMN IF NOT EXISTS version_counter INTEGER NOT NULL DEFAULT 0;
+
+UPDATE documents d
+   SET version_counter = v.max_num
+  FROM (SELECT document_id, MAX(version_number) AS max_num FROM document_versions GROUP BY document_id) v
+ WHERE v.document_id = d.id AND d.version_counter < v.max_num;
+
+COMMIT;
@@ -0,0 +1,17 @@
+BEGIN;
+
+-- 版本内容差分存储：content 为完整文本（full，关键帧）或相对 diff_from 版本的按行差分（delta）
+ALTER TABLE document_versions
+  ADD COLUMN IF NOT EXISTS storage_format TEXT NOT NULL DEFAULT 'full'
+    CHECK (storage_format IN ('full','delta'));
+
+-- 距最近关键帧的差分层数，达到 VERSION_KEYFRAME_INTERVAL 时写入完整文本
+ALTER TABLE document_versions
+  ADD COLUMN IF NOT EXISTS delta_depth INTEGER NOT NULL DEFAULT 0;
+
+-- 查找以某版本为差分基准的版本（清理、重新编码时使用）
+CREATE INDEX IF NOT EXISTS idx_doc_versions_diff_from ON document_versions(diff_from);
+
+COMMIT;
+
+-- 已有历史版本的重新编码：python -m scripts.migrate_db --reencode
@@ -0,0 +1,17 @@
+BEGIN;
+
+-- 完整文本的开头部分（前 200 字符），版本历史列表直接读取，无需还原差分或解压
+ALTER TABLE document_versions
+  ADD COLUMN IF NOT EXISTS content_preview TEXT;
+
+-- 文档列表按 (updated_at, id) 游标分页
+CREATE INDEX IF NOT EXISTS idx_documents_user_type_updated
+  ON documents(user_id, type, updated_at, id);
+
+-- 版本历史按 version_number 游标分页（ux_doc_versions_num 已覆盖时可省略）
+CREATE INDEX IF NOT EXISTS idx_doc_versions_doc_num
+  ON document_versions(document_id, version_number);
+
+COMMIT;
+
+-- 历史版本未补齐 content_preview 时，列表在 SQL 中截取完整明文版本的 content 作为预览
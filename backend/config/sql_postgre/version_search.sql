@@ -0,0 +1,16 @@
+BEGIN;
+
+-- 版本全文索引（旁路表）。版本内容以差分/压缩形式存储，无法在 document_versions 上直接建 tsvector，
+-- 由应用在写入版本时写入完整文本的 tsvector（中日韩文本预先拆为二元组，使用 simple 配置），软删除时移除。
+-- 取代 documents_versions.sql 中注释掉的 content_tsv 方案。
+CREATE TABLE IF NOT EXISTS version_search (
+  version_id  TEXT PRIMARY KEY,
+  document_id TEXT NOT NULL,
+  body_tsv    TSVECTOR NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_version_search_tsv ON version_search USING GIN (body_tsv);
+
+COMMIT;
+
+-- 历史版本的索引：python -m scripts.migrate_db --search-index
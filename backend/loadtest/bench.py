@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+后端压测脚本 —— 以目标并发驱动 routes.py、document_routes.py、version_routes.py、job_routes.py、export_routes.py 中的每个接口，
+统计 p50/p95/p99 延迟与吞吐量。配合 loadtest/fake_dify.py 使用时无需远程 Dify。
+
+用法：
+    python -m loadtest.bench --base-url http://127.0.0.1:8000 --concurrency 20 --requests 200
+    python -m loadtest.bench --routes optimize-text,document-save --json result.json
+    python -m loadtest.bench --baseline result.json --max-regression 0.2
+
+指定 --baseline 时，任一接口的 p95 比基线慢超过 --max-regression（比例）即以非零状态码退出，
+可在部署前的流水线中使用。
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+RESUME_TEXT = (
+    "张三\n电话：13800138000\n邮箱：zhangsan@example.com\n"
+    "教育背景：北京大学 计算机科学 学士 2018-2022\n"
+    "实习经历：某科技公司 后端开发实习生 2021.06-2021.09\n"
+    "- 负责订单服务接口开发，QPS 提升 30%\n"
+)
+BULLET = "负责订单服务接口开发，使用 Redis 缓存热点数据，接口响应时间降低 40%。"
+RESUME_PROFILE = {
+    "user_uid": "bench",
+    "user_name": "张三",
+    "user_contact_info": {"phone": "13800138000", "email": "zhangsan@example.com"},
+    "user_education": [{"user_university": "北京大学", "user_major": "计算机科学", "degree": "学士", "dates": "2018-2022"}],
+    "internship_experience": [{"company": "某科技公司", "role": "后端开发实习生", "dates": "2021.06-2021.09",
+                               "description_points": [BULLET]}],
+}
+
+
+@dataclass
+class Context:
+    """压测前准备好的账号与文档。"""
+    token: str = ""
+    user_id: str = ""
+    doc_id: str = ""
+    version_id: str = ""
+    base_version_id: str = ""  # 文档的上一个版本，用于版本差异
+    job_id: str = ""
+    pdf_bytes: bytes = b""
+    spare_versions: List[str] = field(default_factory=list)
+    bypass_cache: bool = False
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        headers = {"Authorization": f"Bearer {self.token}"}
+        if self.bypass_cache:
+            headers["X-Cache-Bypass"] = "1"
+        return headers
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str
+    # 根据上下文和请求序号构造 httpx 请求参数（json/data/files 等）
+    build: Callable[[Context, int], Dict[str, Any]] = lambda ctx, i: {}
+    # 每次请求都会消耗一个预先创建的版本（如删除版本）
+    consumes_version: bool = False
+    # 不可压测的原因（非空时跳过并在报告中注明）
+    skip: str = ""
+
+
+SCENARIOS: List[Scenario] = [
+    # --- routes.py ---
+    Scenario("parse-resume", "POST", "/parse-resume/",
+             lambda ctx, i: {"files": {"file": ("resume.pdf", ctx.pdf_bytes, "application/pdf")}}),
+    Scenario("parse-resume-text", "POST", "/parse-resume-text/", lambda ctx, i: {"json": {"text": RESUME_TEXT}}),
+    Scenario("optimize-text", "POST", "/optimize-text/", lambda ctx, i: {"json": {"text": BULLET}}),
+    Scenario("expand-text", "POST", "/expand-text/", lambda ctx, i: {"json": {"text": BULLET}}),
+    Scenario("contract-text", "POST", "/contract-text/", lambda ctx, i: {"json": {"text": BULLET}}),
+    Scenario("optimize-text-stream", "POST", "/optimize-text/?stream=1", lambda ctx, i: {"json": {"text": BULLET}}),
+    Scenario("optimize-text-batch", "POST", "/optimize-text/batch", lambda ctx, i: {"json": {"texts": [BULLET] * 5}}),
+    Scenario("expand-text-batch", "POST", "/expand-text/batch", lambda ctx, i: {"json": {"texts": [BULLET] * 5}}),
+    Scenario("contract-text-batch", "POST", "/contract-text/batch", lambda ctx, i: {"json": {"texts": [BULLET] * 5}}),
+    Scenario("evaluate-resume", "POST", "/evaluate-resume/", lambda ctx, i: {"json": {"user_name": "张三", "resume": RESUME_TEXT}}),
+    Scenario("modified-text-prompt", "POST", "/modified-text-prompt/",
+             lambda ctx, i: {"json": {"text": BULLET, "prompt": "请改写得更正式"}}),
+    Scenario("generate-statement", "POST", "/generate_statement/", lambda ctx, i: {"json": {"text": RESUME_TEXT}}),
+    Scenario("generate-recommendation", "POST", "/generate_recommendation/", lambda ctx, i: {"json": {"text": RESUME_TEXT}}),
+    Scenario("parse-resume-bulk", "POST", "/parse-resume/bulk",
+             lambda ctx, i: {"files": [("files", (f"resume-{n}.pdf", ctx.pdf_bytes, "application/pdf")) for n in range(5)]}),
+    Scenario("generate-resume", "POST", "/generate-resume/", lambda ctx, i: {"json": RESUME_PROFILE}),
+    Scenario("metrics-dify", "GET", "/metrics/dify"),
+    Scenario("local-documents-save", "POST", "/api/documents_save/resume", lambda ctx, i: {"json": {"content_md": RESUME_TEXT}}),
+    Scenario("local-documents-get", "POST", "/api/documents/resume", lambda ctx, i: {"json": {}}),
+    # --- main.py ---
+    Scenario("metrics", "GET", "/metrics"),
+    # --- document_routes.py ---
+    Scenario("document-upload", "POST", "/api/documents/upload",
+             skip="被 routes.py 中的 POST /api/documents/{doc_type}（本地缓存）遮蔽，请求无法到达"),
+    Scenario("document-add-version", "POST", "/api/documents/resume/{doc_id}/versions",
+             lambda ctx, i: {"data": {"content": f"{RESUME_TEXT}\n版本 {i}"}}),
+    Scenario("document-current", "GET", "/api/documents/resume/current"),
+    Scenario("document-detail", "GET", "/api/documents/resume/{doc_id}"),
+    Scenario("document-list", "GET", "/api/documents/resume"),
+    Scenario("document-history", "POST", "/api/documents/resume/history", lambda ctx, i: {"json": {"user_id": ctx.user_id}}),
+    Scenario("document-save", "POST", "/api/documents/resume/save",
+             lambda ctx, i: {"json": {"user_id": ctx.user_id, "content_md": f"{RESUME_TEXT}\n保存 {i}"}}),
+    Scenario("document-autosave", "POST", "/api/documents/resume/save",
+             lambda ctx, i: {"json": {"user_id": ctx.user_id, "content_md": f"{RESUME_TEXT}\n自动保存 {i}", "autosave": True}}),
+    # --- version_routes.py ---
+    Scenario("version-content", "GET", "/api/versions/{version_id}/content"),
+    Scenario("version-search", "GET", "/api/versions/search", lambda ctx, i: {"params": {"q": "订单服务"}}),
+    Scenario("version-diff", "GET", "/api/versions/{base_version_id}/diff/{version_id}"),
+    Scenario("version-delete", "DELETE", "/api/versions/{version_id}/delete",
+             lambda ctx, i: {"json": {"user_id": ctx.user_id}}, consumes_version=True),
+    # --- job_routes.py（提交内容各不相同，避免命中去重）---
+    Scenario("job-personal-statement", "POST", "/api/jobs/personal-statement",
+             lambda ctx, i: {"json": {"text": f"{RESUME_TEXT}\n{time.time_ns()}-{i}"}}),
+    Scenario("job-recommendation", "POST", "/api/jobs/recommendation",
+             lambda ctx, i: {"json": {"text": f"{RESUME_TEXT}\n{time.time_ns()}-{i}"}}),
+    Scenario("job-evaluation", "POST", "/api/jobs/evaluation",
+             lambda ctx, i: {"json": {"user_name": "张三", "resume": f"{RESUME_TEXT}\n{time.time_ns()}-{i}"}}),
+    Scenario("job-get", "GET", "/api/jobs/{job_id}"),
+    Scenario("job-events", "GET", "/api/jobs/{job_id}/events"),
+    # --- export_routes.py ---
+    Scenario("export-zip", "GET", "/api/export/documents", lambda ctx, i: {"params": {"format": "zip"}}),
+    Scenario("export-ndjson", "GET", "/api/export/documents", lambda ctx, i: {"params": {"format": "ndjson"}}),
+]
+
+
+def make_pdf() -> bytes:
+    """生成一个包含简历文本的单页 PDF。"""
+    import fitz
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), RESUME_TEXT.replace("：", ": "))
+    return doc.tobytes()
+
+
+async def prepare(client: httpx.AsyncClient) -> Context:
+    """注册并登录一个压测账号，创建一份简历文档。"""
+    ctx = Context(pdf_bytes=make_pdf())
+    stamp = time.time_ns()
+    account = {"username": f"bench_{stamp}", "email": f"bench_{stamp}@example.com", "password": "benchpassword"}
+    (await client.post("/auth/register", json=account)).raise_for_status()
+    login = await client.post("/auth/login", json={"username": account["email"], "password": account["password"]})
+    login.raise_for_status()
+    ctx.token = login.json()["access_token"]
+    ctx.user_id = login.json()["user_id"]
+
+    for content in (RESUME_TEXT, f"{RESUME_TEXT}- 主导缓存改造，订单服务 QPS 提升 2 倍\n"):
+        saved = await client.post("/api/documents/resume/save", headers=ctx.headers,
+                                  json={"user_id": ctx.user_id, "content_md": content})
+        saved.raise_for_status()
+        ctx.base_version_id, ctx.version_id = ctx.version_id, saved.json()["current_version_id"]
+    ctx.doc_id = saved.json()["id"]
+
+    # 等待一个已完成的任务，供查询任务状态与 SSE 的场景使用
+    job = await client.post("/api/jobs/evaluation", json={"user_name": "张三", "resume": f"{RESUME_TEXT}\n{stamp}"})
+    job.raise_for_status()
+    ctx.job_id = job.json()["job_id"]
+    for _ in range(60):
+        if (await client.get(f"/api/jobs/{ctx.job_id}")).json()["status"] in ("succeeded", "failed"):
+            break
+        await asyncio.sleep(0.5)
+    return ctx
+
+
+async def create_spare_versions(client: httpx.AsyncClient, ctx: Context, count: int) -> None:
+    for i in range(count):
+        r = await client.post("/api/documents/resume/save", headers=ctx.headers,
+                              json={"user_id": ctx.user_id, "content_md": f"{RESUME_TEXT}\n待删除 {i}"})
+        r.raise_for_status()
+        ctx.spare_versions.append(r.json()["current_version_id"])
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩法计算分位数。"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, scenario: Scenario, ctx: Context, total: int, concurrency: int
+) -> Dict[str, Any]:
+    if scenario.consumes_version:
+        await create_spare_versions(client, ctx, total)
+
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < total:
+            i = next_index
+            next_index += 1
+            version_id = ctx.spare_versions.pop() if scenario.consumes_version else ctx.version_id
+            path = scenario.path.format(doc_id=ctx.doc_id, version_id=version_id,
+                                        base_version_id=ctx.base_version_id, job_id=ctx.job_id)
+            started = time.perf_counter()
+            try:
+                response = await client.request(scenario.method, path, headers=ctx.headers, **scenario.build(ctx, i))
+                key = str(response.status_code)
+            except httpx.HTTPError as e:
+                key = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[key] = statuses.get(key, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    errors = sum(n for code, n in statuses.items() if not code.startswith("2"))
+    return {
+        "requests": total,
+        "errors": errors,
+        "statuses": statuses,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "throughput_rps": round(total / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def print_report(results: Dict[str, Dict[str, Any]]) -> None:
+    header = f"{'接口':<26}{'请求':>7}{'错误':>7}{'p50(ms)':>11}{'p95(ms)':>11}{'p99(ms)':>11}{'吞吐(req/s)':>13}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(f"{name:<26}{r['requests']:>7}{r['errors']:>7}{r['p50_ms']:>11}{r['p95_ms']:>11}"
+              f"{r['p99_ms']:>11}{r['throughput_rps']:>13}")
+
+
+def find_regressions(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+                     max_regression: float) -> List[str]:
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base or not base.get("p95_ms"):
+            continue
+        if r["p95_ms"] > base["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{name}: p95 {base['p95_ms']}ms -> {r['p95_ms']}ms")
+    return regressions
+
+
+async def run(args: argparse.Namespace) -> int:
+    selected = set(args.routes.split(",")) if args.routes else None
+    scenarios = [s for s in SCENARIOS if selected is None or s.name in selected]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        ctx = await prepare(client)
+        ctx.bypass_cache = args.no_cache
+        results = {}
+        for scenario in scenarios:
+            if scenario.skip:
+                print(f"⏭ {scenario.name}：{scenario.skip}", file=sys.stderr)
+                continue
+            print(f"▶ {scenario.name} ...", file=sys.stderr)
+            results[scenario.name] = await run_scenario(client, scenario, ctx, args.requests, args.concurrency)
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.max_regression)
+        if regressions:
+            print("\n❌ 性能回退：")
+            for line in regressions:
+                print(f"   {line}")
+            return 1
+        print("\n✅ 未发现性能回退")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CV Agent 后端压测")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=10, help="并发请求数")
+    parser.add_argument("--requests", type=int, default=100, help="每个接口的请求总数")
+    parser.add_argument("--timeout", type=float, default=180)
+    parser.add_argument("--routes", help="只压测指定接口，逗号分隔（见 SCENARIOS 中的 name）")
+    parser.add_argument("--no-cache", action="store_true", help="携带 X-Cache-Bypass，使每个请求都真正调用 Dify")
+    parser.add_argument("--json", help="把结果写入 JSON 文件，可作为下次的 --baseline")
+    parser.add_argument("--baseline", help="基线结果 JSON 文件")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="允许的 p95 回退比例")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
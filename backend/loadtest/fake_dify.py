@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+本地 Dify 替身服务 —— 用于压测和联调，无需访问远程 DIFY_API_URL。
+
+实现 POST /v1/chat-messages 的 blocking 与 streaming 两种模式，可按 API Key 配置：
+- latency：延迟分布（fixed / uniform / lognormal / exponential，单位秒）
+- error_rate / error_status：按概率返回错误状态码
+- answer：固定回答；未配置时按请求中的 user 字段返回与各工作流格式相符的默认回答
+- chunk_size：streaming 模式下每个 message 事件包含的字符数
+
+启动：
+    python -m loadtest.fake_dify --port 8681 --config loadtest/fake_dify.example.json
+
+然后把后端的 DIFY_API_URL 指向 http://127.0.0.1:8681 即可。
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from typing import Any, Dict
+
+from fastapi import FastAPI, Header, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# 各工作流的默认回答，键为 DifyClient.WORKFLOW_USERS 中的 user 标识
+DEFAULT_ANSWERS = {
+    "resume-parser-user": json.dumps({
+        "user_name": "张三",
+        "user_contact_info": {"phone": "13800138000", "email": "zhangsan@example.com"},
+        "user_education": [{
+            "user_university": "北京大学", "user_major": "计算机科学",
+            "degree": "学士", "dates": "2018-2022"
+        }],
+        "internship_experience": [],
+    }, ensure_ascii=False),
+    "statement-user": json.dumps({"personal_statement": "这是一段由本地替身服务生成的个人陈述。"}, ensure_ascii=False),
+    "recommendation-user": json.dumps({"recommendation": "# 推荐信\n\n这是一封由本地替身服务生成的推荐信。"}, ensure_ascii=False),
+}
+FALLBACK_ANSWER = "这是本地 Dify 替身服务返回的文本结果，用于压测后端接口。" * 3
+
+DEFAULT_PROFILE = {
+    "latency": {"dist": "lognormal", "median": 1.0, "sigma": 0.4},
+    "error_rate": 0.0,
+    "error_status": 503,
+    "chunk_size": 8,
+}
+
+
+def sample_latency(spec: Dict[str, Any]) -> float:
+    """按配置的分布采样一次延迟（秒）。"""
+    dist = spec.get("dist", "fixed")
+    if dist == "fixed":
+        return float(spec.get("value", 0))
+    if dist == "uniform":
+        return random.uniform(spec.get("min", 0), spec.get("max", 1))
+    if dist == "lognormal":
+        # 以中位数为参数更直观：median = exp(mu)
+        return random.lognormvariate(math.log(spec.get("median", 1.0)), spec.get("sigma", 0.5))
+    if dist == "exponential":
+        return random.expovariate(1.0 / spec.get("mean", 1.0))
+    raise ValueError(f"未知的延迟分布: {dist}")
+
+
+def create_app(config: Dict[str, Any]) -> FastAPI:
+    app = FastAPI(title="Fake Dify")
+    default_profile = {**DEFAULT_PROFILE, **config.get("default", {})}
+    key_profiles = config.get("keys", {})
+    counters = {"requests": 0, "errors": 0, "streams": 0}
+
+    def profile_for(api_key: str) -> Dict[str, Any]:
+        return {**default_profile, **key_profiles.get(api_key, {})}
+
+    @app.get("/stats")
+    async def stats():
+        return counters
+
+    @app.post("/v1/chat-messages")
+    async def chat_messages(request: Request, authorization: str = Header("")):
+        payload = await request.json()
+        api_key = authorization[7:] if authorization.startswith("Bearer ") else authorization
+        profile = profile_for(api_key)
+        counters["requests"] += 1
+
+        latency = sample_latency(profile["latency"])
+        answer = profile.get("answer") or DEFAULT_ANSWERS.get(payload.get("user"), FALLBACK_ANSWER)
+        message_id = str(uuid.uuid4())
+
+        if random.random() < profile["error_rate"]:
+            counters["errors"] += 1
+            await asyncio.sleep(latency)
+            return JSONResponse(status_code=profile["error_status"], content={"message": "fake dify error"})
+
+        if payload.get("response_mode") != "streaming":
+            await asyncio.sleep(latency)
+            return {
+                "event": "message",
+                "message_id": message_id,
+                "conversation_id": str(uuid.uuid4()),
+                "mode": "chat",
+                "answer": answer,
+                "created_at": int(time.time()),
+            }
+
+        counters["streams"] += 1
+        chunk_size = max(1, int(profile["chunk_size"]))
+        chunks = [answer[i:i + chunk_size] for i in range(0, len(answer), chunk_size)]
+
+        async def events():
+            # 总延迟平均分摊到每个片段上
+            delay = latency / max(len(chunks), 1)
+            for chunk in chunks:
+                await asyncio.sleep(delay)
+                event = {"event": "message", "message_id": message_id, "answer": chunk}
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+            yield f"data: {json.dumps({'event': 'message_end', 'message_id': message_id})}\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 Dify 替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8681)
+    parser.add_argument("--config", help="JSON 配置文件，格式见 fake_dify.example.json")
+    parser.add_argument("--seed", type=int, help="随机种子，便于复现")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    config = {}
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            config = json.load(f)
+
+    import uvicorn
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,32 @@
 
+import math
 import uuid
+from contextlib import asynccontextmanager
 from uuid import UUID
-from fastapi import FastAPI, Depends, HTTPException, Body, Path
+from fastapi import FastAPI, Depends, HTTPException, Body, Path, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.api.routes import router
 from app.api.auth_routes import router as auth_router
 from app.api.document_routes import router as document_router
 from app.api.version_routes import router as version_router
+from app.api.job_routes import router as job_router
+from app.api.export_routes import router as export_router
 from app.database import engine, test_database_connection
-from app.models import user_models, document_models
+from app.models import user_models, document_models, job_models, parse_cache_models
+from app.services.compression_backfill import compression_backfill
+from app.services.autosave import autosave_coalescer
+from app.services.version_retention import version_retention
+from app.services.document_cache import document_cache
+from app.services.dify_client import dify_client, DifyServiceError
+from app.services.job_queue import job_queue
+from app.services.pdf_extractor import pdf_extractor
+from app.services.resume_renderer import resume_renderer
+from app.services.uploads import RequestSizeLimitMiddleware
+from app.core.config import settings
+from app.services.version_search import version_search
+from app.services.version_store import version_store
+from app.services.text_diff import text_differ
 
 # 测试数据库连接
 print("🔍 测试数据库连接...")
@@ -17,13 +35,41 @@ if test_database_connection():
     print("📦 创建数据库表...")
     user_models.Base.metadata.create_all(bind=engine)
     document_models.Base.metadata.create_all(bind=engine)
+    job_models.Base.metadata.create_all(bind=engine)
+    parse_cache_models.Base.metadata.create_all(bind=engine)
+    version_search.ensure_schema(engine)
     print("✅ 数据库表创建完成")
 else:
     print("⚠️ 数据库连接失败，应用将在有限功能模式下运行")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：编译简历模板，启动 Dify 磁盘缓存清理、生成任务队列、版本压缩转换、自动保存合并、版本保留任务与文档缓存失效监听；关闭时写入缓冲的自动保存、停止后台任务，释放 Dify 连接池和各进程池。"""
+    resume_renderer.load_templates()
+    if dify_client.cache is not None:
+        await dify_client.cache.start()
+    await job_queue.start()
+    await compression_backfill.start()
+    await autosave_coalescer.start()
+    await version_retention.start()
+    document_cache.start()
+    yield
+    document_cache.stop()
+    await version_retention.stop()
+    await autosave_coalescer.stop()
+    await compression_backfill.stop()
+    await job_queue.stop()
+    if dify_client.cache is not None:
+        await dify_client.cache.stop()
+    await dify_client.aclose()
+    pdf_extractor.shutdown()
+    resume_renderer.shutdown()
+
+
 app = FastAPI(
     title="CV Agent Backend API",
-    description="一个结构清晰、模块化的API服务，提供简历处理和个人陈述生成服务。"
+    description="一个结构清晰、模块化的API服务，提供简历处理和个人陈述生成服务。",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -32,13 +78,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Document-Version"],
 )
 
+# 上传大小在接收请求体时限制（Starlette 会在进入路由前读完并解析整个 multipart 请求体）
+app.add_middleware(RequestSizeLimitMiddleware, max_bytes=settings.UPLOAD_MAX_REQUEST_BYTES)
+
+@app.exception_handler(DifyServiceError)
+async def dify_service_error_handler(request: Request, exc: DifyServiceError):
+    """将 Dify 调用失败映射为 502/503/504，熔断时附带 Retry-After。"""
+    headers = {"Retry-After": str(math.ceil(exc.retry_after))} if exc.retry_after else None
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)}, headers=headers)
+
 # 包含路由
 app.include_router(router)
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 app.include_router(document_router, prefix="/api", tags=["documents"])
 app.include_router(version_router, prefix="/api", tags=["versions"])
+app.include_router(job_router, prefix="/api", tags=["jobs"])
+app.include_router(export_router, prefix="/api", tags=["export"])
 
 @app.get("/", tags=["Health Check"])
 def read_root():
@@ -47,6 +105,17 @@ def read_root():
     """
     return {"status": "ok", "message": "CV Agent API服务已成功启动！"}
 
+@app.get("/metrics", tags=["Health Check"])
+def metrics():
+    """文档存储相关的运行指标：版本存储（压缩转换、差异计算）、全文检索、自动保存合并、版本保留与当前文档缓存。Dify 相关指标见 /metrics/dify。"""
+    return {
+        "version_store": {**version_store.stats(), "compression": compression_backfill.stats(), "diff": text_differ.stats()},
+        "search": version_search.stats(),
+        "autosave": autosave_coalescer.stats(),
+        "retention": version_retention.stats(),
+        "document_cache": document_cache.stats(),
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8700)
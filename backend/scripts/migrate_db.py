@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+数据库结构补齐与数据迁移脚本。create_all 只会新建表，不会给已有表加列，
+已有数据库升级时先运行本脚本补齐新增的列，再按需迁移历史数据。
+
+用法：
+    python -m scripts.migrate_db                 # 补齐缺失的列与索引，并校准文档的版本号计数器
+    python -m scripts.migrate_db --reencode      # 补齐列后，按当前差分策略重新编码所有文档的历史版本
+    python -m scripts.migrate_db --reencode --batch 50
+    python -m scripts.migrate_db --compress      # 补齐列后，把历史版本转换为压缩存储（需启用压缩）
+    python -m scripts.migrate_db --search-index  # 为历史版本补建全文索引
+    python -m scripts.migrate_db --retention     # 按版本保留策略立即执行一轮稀疏化与清除（不论是否启用后台任务）
+
+Postgres 也可以直接执行 config/sql_postgre/ 下对应的 SQL。
+"""
+
+import argparse
+import sys
+
+from sqlalchemy import inspect, text
+
+from app.database import engine, SessionLocal
+from app.models import user_models, document_models  # noqa: F401  注册全部模型
+
+# (模型, 列名)。列定义按当前数据库方言从模型生成
+COLUMN_MIGRATIONS = [
+    (document_models.DocumentVersion, "storage_format"),
+    (document_models.DocumentVersion, "delta_depth"),
+    (document_models.DocumentVersion, "content_codec"),
+    (document_models.DocumentVersion, "content_blob"),
+    (document_models.DocumentVersion, "compression_dict_id"),
+    (document_models.DocumentVersion, "content_length"),
+    (document_models.DocumentVersion, "content_preview"),
+    (document_models.Document, "version_counter"),
+]
+
+# 已有表上需要补建的索引（create_all 只为新建的表建索引）
+INDEX_MIGRATIONS = [document_models.Document, document_models.DocumentVersion]
+
+
+def column_ddl(column) -> str:
+    ddl = column.type.compile(dialect=engine.dialect)
+    if column.server_default is not None:
+        if not column.nullable:
+            ddl += " NOT NULL"
+        ddl += f" DEFAULT '{column.server_default.arg}'"
+    return ddl
+
+
+def add_missing_columns() -> int:
+    document_models.Base.metadata.create_all(bind=engine)  # 新增的表（如 compression_dictionaries）
+    inspector = inspect(engine)
+    added = 0
+    with engine.begin() as conn:
+        for model, column in COLUMN_MIGRATIONS:
+            table = model.__tablename__
+            if not inspector.has_table(table):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table)}
+            if column in existing:
+                continue
+            ddl = column_ddl(model.__table__.columns[column])
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+            print(f"+ {table}.{column}")
+            added += 1
+    return added
+
+
+def add_missing_indexes() -> int:
+    added = 0
+    for model in INDEX_MIGRATIONS:
+        existing = {i["name"] for i in inspect(engine).get_indexes(model.__tablename__)}
+        for index in model.__table__.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+                print(f"+ {index.name}")
+                added += 1
+    return added
+
+
+def sync_version_counters() -> int:
+    """把 documents.version_counter 校准为已有版本（含已软删除的版本）的最大版本号，返回更新的文档数。"""
+    with engine.begin() as conn:
+        result = conn.execute(text(
+            "UPDATE documents SET version_counter = ("
+            "SELECT MAX(v.version_number) FROM document_versions v WHERE v.document_id = documents.id) "
+            "WHERE version_counter < ("
+            "SELECT COALESCE(MAX(v.version_number), 0) FROM document_versions v WHERE v.document_id = documents.id)"
+        ))
+        return result.rowcount
+
+
+def reencode_versions(batch: int) -> None:
+    """逐个文档重新编码版本历史，每 batch 个文档提交一次。"""
+    from app.services.version_store import version_store
+
+    db = SessionLocal()
+    try:
+        document_ids = [row[0] for row in db.query(document_models.Document.id).order_by(document_models.Document.id)]
+        before = after = versions = 0
+        for index, document_id in enumerate(document_ids, 1):
+            result = version_store.reencode_document(db, document_id)
+            versions += result["versions"]
+            before += result["bytes_before"]
+            after += result["bytes_after"]
+            if index % batch == 0:
+                db.commit()
+                version_store.cache.clear()
+                print(f"  {index}/{len(document_ids)} documents")
+        db.commit()
+        print(f"重新编码 {len(document_ids)} 个文档、{versions} 个版本：{before} → {after} 字节")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def compress_versions() -> None:
+    """把尚未转换的历史版本转换为压缩存储（与启动后的后台转换相同，但一次跑完）。"""
+    from app.services.compression_backfill import compression_backfill
+
+    if not compression_backfill.store.compressor.enabled:
+        print("未启用 VERSION_COMPRESSION_ENABLED，跳过压缩")
+        return
+    compression_backfill.prepare_dictionary()
+    while compression_backfill.convert_batch():
+        print(f"  已转换 {compression_backfill.converted} 个版本")
+    print(f"压缩转换完成，共 {compression_backfill.converted} 个版本")
+
+
+def build_search_index(batch: int) -> None:
+    """为尚未建全文索引的历史版本补建索引。"""
+    from app.services.version_search import version_search
+
+    version_search.ensure_schema(engine)
+    if not version_search.available:
+        print("当前数据库不支持全文检索，跳过")
+        return
+    db = SessionLocal()
+    try:
+        print(f"补建全文索引 {version_search.rebuild(db, batch)} 个版本")
+    finally:
+        db.close()
+
+
+def apply_retention() -> None:
+    """按 RETENTION_* 配置执行一轮版本保留：稀疏化自动保存版本、清除软删除期满的版本，之后 ANALYZE / VACUUM。"""
+    from app.services.version_retention import version_retention
+
+    cursor = version_retention.thin_batch(None)
+    while cursor is not None:
+        cursor = version_retention.thin_batch(cursor)
+    print(f"稀疏化 {version_retention.thinned} 个自动保存版本")
+    while version_retention.purge_batch():
+        print(f"  已清除 {version_retention.purged} 个版本")
+    if version_retention.purged:
+        version_retention.maintain()
+    print(f"清除 {version_retention.purged} 个版本，重新编码 {version_retention.rebased} 个依赖版本")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="补齐数据库新增列并迁移历史数据")
+    parser.add_argument("--reencode", action="store_true", help="按当前差分策略重新编码所有版本历史")
+    parser.add_argument("--batch", type=int, default=100, help="每处理多少个文档提交一次")
+    parser.add_argument("--compress", action="store_true", help="把历史版本转换为压缩存储")
+    parser.add_argument("--search-index", action="store_true", help="为历史版本补建全文索引")
+    parser.add_argument("--retention", action="store_true", help="按版本保留策略执行一轮稀疏化与清除")
+    args = parser.parse_args()
+
+    added = add_missing_columns()
+    print(f"补齐 {added} 个列")
+    print(f"补建 {add_missing_indexes()} 个索引")
+    print(f"校准 {sync_version_counters()} 个文档的版本号计数器")
+    if args.reencode:
+        reencode_versions(max(1, args.batch))
+    if args.compress:
+        compress_versions()
+    if args.search_index:
+        build_search_index(max(1, args.batch))
+    if args.retention:
+        apply_retention()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
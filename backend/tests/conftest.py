@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# 应用使用相对路径的 SQLite（./cv_agent.db），在临时目录中运行，不触碰开发数据库
+os.chdir(tempfile.mkdtemp(prefix="cv-agent-tests-"))
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import document_models, job_models, parse_cache_models, user_models  # noqa: E402,F401
+from app.services.version_search import version_search  # noqa: E402
+
+Base.metadata.create_all(bind=engine)
+version_search.ensure_schema(engine)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+
+
+@pytest.fixture
+def user(db):
+    """数据库中的一个普通用户。"""
+    stamp = uuid.uuid4().hex
+    account = user_models.User(email=f"{stamp}@example.com", username=f"u{stamp}", password_hash="x" * 60, role="guest")
+    db.add(account)
+    db.commit()
+    return account
+
+
+@pytest.fixture
+def document(db, user):
+    """user 的一份空简历文档（尚无版本）。"""
+    doc = document_models.Document(user_id=user.id, type="resume", title="Resume Document", doc_metadata="{}")
+    db.add(doc)
+    db.commit()
+    return doc
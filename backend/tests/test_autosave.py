@@ -0,0 +1,138 @@
+import json
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.models import document_models
+from app.services import autosave
+from app.services.autosave import AutosaveCoalescer
+from app.services.version_store import VersionConflictError, version_store
+
+
+def _versions(db, owner_id):
+    db.expire_all()
+    Document, Version = document_models.Document, document_models.DocumentVersion
+    return db.query(Version).join(Document, Version.document_id == Document.id).filter(
+        Document.user_id == owner_id, Document.type == "resume"
+    ).order_by(Version.version_number).all()
+
+
+def _contents(db, owner_id):
+    return [version_store.get_content(db, v) for v in _versions(db, owner_id)]
+
+
+def test_flush_writes_latest_content_once(db, user):
+    coalescer = AutosaveCoalescer(window=300)
+    for i in range(3):
+        assert coalescer.buffer(db, user.id, "resume", f"草稿 {i}")
+
+    assert coalescer.flush_due() == 0  # 窗口未结束
+    assert coalescer.flush(user.id, "resume") is True
+    assert coalescer.flush(user.id, "resume") is False
+
+    versions = _versions(db, user.id)
+    assert len(versions) == 1
+    assert version_store.get_content(db, versions[0]) == "草稿 2"
+    assert json.loads(versions[0].version_metadata) == {"source": "autosave", "coalesced": 3}
+    assert coalescer.flushed == 1
+
+
+def test_flush_due_after_window(db, user):
+    coalescer = AutosaveCoalescer(window=0)
+    coalescer.buffer(db, user.id, "resume", "草稿")
+    assert coalescer.flush_due() == 1
+    assert len(_versions(db, user.id)) == 1
+
+
+def test_manual_save_supersedes_pending(db, user):
+    coalescer = AutosaveCoalescer()
+    coalescer.buffer(db, user.id, "resume", "自动保存")
+    coalescer.buffer(db, user.id, "resume", "自动保存 2")
+
+    _, version, unchanged = coalescer.save_now(db, user.id, "resume", "手动保存")
+    assert not unchanged
+    assert coalescer.superseded == 2
+    assert coalescer.stats()["pending"] == 0
+    assert _contents(db, user.id) == ["手动保存"]
+
+
+def test_failed_save_keeps_pending(db, user):
+    coalescer = AutosaveCoalescer()
+    coalescer.save_now(db, user.id, "resume", "v1")
+    coalescer.buffer(db, user.id, "resume", "自动保存")
+
+    with pytest.raises(VersionConflictError):
+        coalescer.save_now(db, user.id, "resume", "基于旧版本", expected=0)
+    db.rollback()
+    assert coalescer.superseded == 0
+    assert coalescer.flush(user.id, "resume") is True
+    assert _contents(db, user.id) == ["v1", "自动保存"]
+
+
+def test_failed_write_is_retried_then_dropped(db, user, monkeypatch):
+    coalescer = AutosaveCoalescer(max_attempts=3)
+    coalescer.buffer(db, user.id, "resume", "草稿")
+
+    def unavailable(*args, **kwargs):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(autosave, "save_content", unavailable)
+    assert coalescer.flush(user.id, "resume") is False
+    assert coalescer.flush_due(force=True) == 0
+    assert coalescer.stats()["pending"] == 1  # 放回缓冲，下一轮重试
+    assert coalescer.flush(user.id, "resume") is False
+    assert coalescer.stats()["pending"] == 0  # 达到重试上限后丢弃
+    assert coalescer.failures == 3
+    assert coalescer.dropped == 1
+    assert _versions(db, user.id) == []
+
+
+def test_constraint_violation_is_dropped_immediately(db, user, monkeypatch):
+    coalescer = AutosaveCoalescer(max_attempts=5)
+    coalescer.buffer(db, user.id, "resume", "草稿")
+
+    def violates(*args, **kwargs):
+        raise IntegrityError("INSERT", {}, Exception("CHECK constraint failed"))
+
+    monkeypatch.setattr(autosave, "save_content", violates)
+    assert coalescer.flush(user.id, "resume") is False
+    assert coalescer.stats()["pending"] == 0
+    assert coalescer.failures == 1
+    assert coalescer.dropped == 1
+
+
+def test_newer_autosave_wins_over_failed_retry(db, user, monkeypatch):
+    coalescer = AutosaveCoalescer()
+    coalescer.buffer(db, user.id, "resume", "旧草稿")
+    calls = []
+
+    def fails_once(*args, **kwargs):
+        calls.append(args[3])
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(autosave, "save_content", fails_once)
+    assert coalescer.flush(user.id, "resume") is False
+    monkeypatch.undo()
+    # 重试前到达新的自动保存
+    coalescer.buffer(db, user.id, "resume", "新草稿")
+    assert coalescer.flush(user.id, "resume") is True
+    assert calls == ["旧草稿"]
+    assert _contents(db, user.id) == ["新草稿"]
+
+
+def test_pending_is_dropped_when_document_changed_elsewhere(db, user):
+    coalescer = AutosaveCoalescer()
+    coalescer.save_now(db, user.id, "resume", "v1")
+    coalescer.buffer(db, user.id, "resume", "自动保存")
+
+    # 缓冲之后另一个进程（另一个合并器）写入了更新的手动保存
+    AutosaveCoalescer().save_now(db, user.id, "resume", "其他 worker 的手动保存")
+    assert coalescer.flush(user.id, "resume") is False
+    assert coalescer.stale == 1
+    assert coalescer.failures == 0
+    assert _contents(db, user.id) == ["v1", "其他 worker 的手动保存"]
+
+    # 之后的自动保存以新的版本为基准，正常写入
+    coalescer.buffer(db, user.id, "resume", "自动保存 2")
+    assert coalescer.flush(user.id, "resume") is True
+    assert _contents(db, user.id)[-1] == "自动保存 2"
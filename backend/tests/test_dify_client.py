@@ -0,0 +1,39 @@
+import asyncio
+
+import httpx
+
+from app.services.dify_client import DifyClient, DifyServiceError
+
+
+def _client(responses):
+    codes = iter(responses)
+    calls = []
+
+    def handler(request):
+        code, headers = next(codes)
+        calls.append(code)
+        return httpx.Response(code, json={"answer": "ok"}, headers=headers)
+
+    client = DifyClient("http://dify.test", {"rewrite": "key"}, retry_attempts=2, retry_base_delay=0.001)
+    client._client = httpx.AsyncClient(base_url=client.base_url, transport=httpx.MockTransport(handler))
+    return client, calls
+
+
+def test_retries_only_requests_dify_did_not_process():
+    client, calls = _client([(429, {}), (503, {"Retry-After": "0"}), (200, {})])
+    assert asyncio.run(client._chat("rewrite", "文本")) == "ok"
+    assert calls == [429, 503, 200]
+    assert client.stats()["retry_reasons"] == {"HTTP 429": 1, "HTTP 503": 1}
+
+
+def test_gateway_errors_are_not_retried():
+    for code in (502, 503, 504):
+        client, calls = _client([(code, {}), (200, {})])
+        try:
+            asyncio.run(client._chat("rewrite", "文本"))
+        except DifyServiceError as e:
+            assert e.status_code == 503
+        else:
+            raise AssertionError("expected DifyServiceError")
+        assert calls == [code]
+        assert client.retries == 0
@@ -0,0 +1,159 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from app.core.config import settings
+from app.services.autosave import autosave_coalescer
+from app.services.pagination import encode_cursor
+
+
+@pytest.fixture(scope="module")
+def client():
+    # 不进入 lifespan：不启动后台任务，自动保存只在请求中写入
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def auth(client):
+    """注册并登录一个新账号，返回 (请求头, 用户 id)。"""
+    stamp = uuid.uuid4().hex[:12]
+    account = {"username": f"u{stamp}", "email": f"u{stamp}@example.com", "password": "password123"}
+    client.post("/auth/register", json=account).raise_for_status()
+    login = client.post("/auth/login", json={"username": account["email"], "password": account["password"]})
+    login.raise_for_status()
+    return {"Authorization": f"Bearer {login.json()['access_token']}"}, login.json()["user_id"]
+
+
+@pytest.fixture
+def coalescing(monkeypatch):
+    # 合并默认关闭；测试中在当前进程内开启（TestClient 与测试同一进程）
+    monkeypatch.setattr(autosave_coalescer, "enabled", True)
+
+
+def _save(client, auth, content, **extra):
+    headers, user_id = auth
+    return client.post("/api/documents/resume/save", headers={**headers, **extra.pop("headers", {})},
+                       json={"user_id": user_id, "content_md": content, **extra})
+
+
+def test_save_with_stale_base_version_conflicts(client, auth):
+    first = _save(client, auth, "v1", base_version=0)
+    assert first.status_code == 200
+    assert first.json()["version_number"] == 1
+    assert _save(client, auth, "v2", base_version=1).json()["version_number"] == 2
+
+    stale = _save(client, auth, "基于 v1 的修改", base_version=1)
+    assert stale.status_code == 409
+    assert stale.headers["X-Document-Version"] == "2"
+
+
+def test_save_new_document_with_base_version_conflicts(client, auth):
+    response = _save(client, auth, "v1", base_version=1)
+    assert response.status_code == 409
+    assert response.headers["X-Document-Version"] == "0"
+
+
+def test_save_if_match(client, auth):
+    _save(client, auth, "v1")
+    assert _save(client, auth, "v2", headers={"If-Match": '"1"'}).status_code == 200
+    assert _save(client, auth, "v3", headers={"If-Match": '"1"'}).status_code == 409
+    assert _save(client, auth, "v3", headers={"If-Match": "abc"}).status_code == 400
+    # If-Match 与 base_version 不一致
+    assert _save(client, auth, "v3", base_version=1, headers={"If-Match": '"2"'}).status_code == 400
+
+
+def test_unchanged_content_is_not_a_conflict(client, auth):
+    _save(client, auth, "v1")
+    _save(client, auth, "v2")
+    response = _save(client, auth, "v2", base_version=1)
+    assert response.status_code == 200
+    assert response.json()["unchanged"] is True
+
+
+def test_add_version_if_match(client, auth):
+    headers, _ = auth
+    doc_id = _save(client, auth, "v1").json()["id"]
+    url = f"/api/documents/resume/{doc_id}/versions"
+
+    ok = client.post(url, headers={**headers, "If-Match": '"1"'}, data={"content": "v2"})
+    assert ok.status_code == 200
+    assert ok.json()["version_number"] == 2
+
+    stale = client.post(url, headers={**headers, "If-Match": '"1"'}, data={"content": "v3"})
+    assert stale.status_code == 409
+    assert stale.headers["X-Document-Version"] == "2"
+
+    stale = client.post(url, headers=headers, data={"content": "v3", "base_version": "1"})
+    assert stale.status_code == 409
+
+
+def test_autosave_is_buffered_and_flushed_on_read(client, auth, coalescing):
+    headers, user_id = auth
+    for i in range(3):
+        response = _save(client, auth, f"草稿 {i}", autosave=True)
+        assert response.status_code == 202
+        assert response.json()["buffered"] is True
+
+    current = client.get("/api/documents/resume/current", headers=headers)
+    assert current.status_code == 200
+    assert current.json()["content"] == "草稿 2"
+    assert current.json()["version_number"] == 1
+
+
+def test_autosave_is_written_directly_by_default(client, auth):
+    response = _save(client, auth, "草稿", autosave=True)
+    assert response.status_code == 200
+    assert response.json()["buffered"] is False
+    assert response.json()["version_number"] == 1
+
+
+def test_autosave_rejects_invalid_content(client, auth, coalescing):
+    too_long = _save(client, auth, "x" * 50001, autosave=True)
+    assert too_long.status_code == 400
+    assert too_long.json()["detail"] == "Content too long. Maximum 50000 characters allowed."
+    assert _save(client, auth, 42, autosave=True).status_code == 400
+    assert autosave_coalescer.stats()["pending"] == 0
+
+
+def test_add_version_supersedes_own_autosave(client, auth, coalescing):
+    headers, user_id = auth
+    doc_id = _save(client, auth, "v1").json()["id"]
+    assert _save(client, auth, "自动保存", autosave=True).status_code == 202
+
+    # 基于 v1 添加版本：缓冲中的自动保存被取代，不与之冲突
+    response = client.post(f"/api/documents/resume/{doc_id}/versions",
+                           headers={**headers, "If-Match": '"1"'}, data={"content": "v2"})
+    assert response.status_code == 200
+    assert response.json()["version_number"] == 2
+    assert autosave_coalescer.flush(user_id, "resume") is False
+
+
+def test_history_without_limit_returns_everything(client, auth, monkeypatch):
+    monkeypatch.setattr(settings, "LIST_PAGE_SIZE", 2)
+    headers, user_id = auth
+    for n in range(5):
+        _save(client, auth, f"v{n}")
+    url = "/api/documents/resume/history"
+
+    full = client.post(url, headers=headers, json={"user_id": user_id})
+    assert [v["version_number"] for v in full.json()] == [5, 4, 3, 2, 1]
+    assert "X-Next-Cursor" not in full.headers
+
+    page = client.post(url, headers=headers, json={"user_id": user_id, "limit": 2})
+    assert [v["version_number"] for v in page.json()] == [5, 4]
+    rest = client.post(url, headers=headers, json={"user_id": user_id, "cursor": page.headers["X-Next-Cursor"]})
+    assert [v["version_number"] for v in rest.json()] == [3, 2]
+
+
+def test_invalid_page_params_are_rejected(client, auth):
+    headers, user_id = auth
+    _save(client, auth, "v1")
+    history = "/api/documents/resume/history"
+    assert client.post(history, headers=headers, json={"user_id": user_id, "fields": ["id"]}).status_code == 400
+    assert client.post(history, headers=headers, json={"user_id": user_id, "cursor": "!!"}).status_code == 400
+
+    tampered = encode_cursor(["not-a-date", "x"])
+    assert client.get("/api/documents/resume", headers=headers, params={"cursor": tampered}).status_code == 400
+    assert client.get("/api/documents/resume", headers=headers, params={"cursor": encode_cursor([1, 2])}).status_code == 400
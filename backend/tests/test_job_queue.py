@@ -0,0 +1,27 @@
+import asyncio
+
+from app.services import job_queue as job_queue_module
+from app.services.dify_client import DifyServiceError
+from app.services.job_queue import JobQueue
+
+
+def test_failed_job_reports_error_status(monkeypatch):
+    async def unavailable(payload):
+        raise DifyServiceError("Dify 暂不可用", 503)
+
+    monkeypatch.setitem(job_queue_module.JOB_RUNNERS, "evaluation", unavailable)
+    queue = JobQueue(concurrency=1, poll_interval=60)
+
+    async def run():
+        await queue.start()
+        try:
+            job = await queue.submit("evaluation", "{\"resume\": \"failing\"}")
+            await queue.wait_for_change(job["job_id"], 5)
+            return await queue.get(job["job_id"])
+        finally:
+            await queue.stop()
+
+    job = asyncio.run(run())
+    assert job["status"] == "failed"
+    assert job["error_status"] == 503
+    assert queue.stats()["failed_by_status"] == {503: 1}
@@ -0,0 +1,22 @@
+import asyncio
+import time
+
+from app.services.llm_cache import LLMResponseCache, LRUTTLCache, SQLiteCacheTier
+
+
+def test_expired_disk_rows_are_purged_on_start(tmp_path):
+    disk = SQLiteCacheTier(str(tmp_path / "llm_cache.db"), ttl=60)
+    disk.set("fresh", "保留")
+    disk.set("stale", "过期")
+    disk._connect().execute("UPDATE llm_cache SET expires_at = ? WHERE key = 'stale'", (time.time() - 1,))
+    disk._connect().commit()
+    cache = LLMResponseCache(LRUTTLCache(), disk, purge_interval=3600)
+
+    async def run():
+        await cache.start()
+        await asyncio.sleep(0.2)
+        await cache.stop()
+
+    asyncio.run(run())
+    assert cache.disk_purged == 1
+    assert disk._connect().execute("SELECT key FROM llm_cache").fetchall() == [("fresh",)]
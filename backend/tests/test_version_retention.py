@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+from app.models import document_models
+from app.services.llm_cache import LRUTTLCache
+from app.services.version_retention import VersionRetention
+from app.services.version_store import VersionStore
+
+
+def test_purge_rebases_dependents(db, document):
+    store = VersionStore(keyframe_interval=10)
+    lines = [f"第 {n} 行" for n in range(30)]
+    contents, versions = [], []
+    for i in range(5):
+        lines[i] = f"修改 {i}"
+        content = "\n".join(lines)
+        number = store.allocate_version_number(db, document)
+        versions.append(store.create_version(db, document.id, number, content, base=store.latest_version(db, document.id)))
+        contents.append(content)
+    document.current_version_id = versions[-1].id
+    # 删除中间两个版本，且已超过清除期
+    for version in versions[1:3]:
+        version.deleted_at = datetime.utcnow() - timedelta(days=31)
+    db.commit()
+    assert versions[3].diff_from == versions[2].id
+
+    retention = VersionRetention(store, purge_after_days=30)
+    assert retention.purge_batch() == 2
+    assert retention.rebased == 2  # v3 改基于 v1，随后 v4 改基于 v1
+
+    db.expire_all()
+    store.cache = LRUTTLCache(max_entries=16, ttl=60)
+    Version = document_models.DocumentVersion
+    remaining = db.query(Version).filter(Version.document_id == document.id).order_by(Version.version_number).all()
+    assert [v.version_number for v in remaining] == [1, 4, 5]
+    assert remaining[1].diff_from == remaining[0].id
+    assert remaining[1].storage_format == document_models.StorageFormat.delta.value
+    assert [store.get_content(db, v) for v in remaining] == [contents[0], contents[3], contents[4]]
+
+
+def test_purge_keeps_recent_and_current_versions(db, document):
+    store = VersionStore()
+    number = store.allocate_version_number(db, document)
+    current = store.create_version(db, document.id, number, "当前版本")
+    document.current_version_id = current.id
+    current.deleted_at = datetime.utcnow() - timedelta(days=60)
+    number = store.allocate_version_number(db, document)
+    recent = store.create_version(db, document.id, number, "最近删除", base=current)
+    recent.deleted_at = datetime.utcnow() - timedelta(days=1)
+    db.commit()
+
+    VersionRetention(store, purge_after_days=30).purge_batch()
+    db.expire_all()
+    Version = document_models.DocumentVersion
+    assert db.query(Version).filter(Version.document_id == document.id).count() == 2
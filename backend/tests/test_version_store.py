@@ -0,0 +1,95 @@
+import pytest
+
+from app.models import document_models
+from app.services.content_codec import ContentCompressor
+from app.services.llm_cache import LRUTTLCache
+from app.services.version_store import VersionConflictError, VersionStore
+
+FULL = document_models.StorageFormat.full.value
+DELTA = document_models.StorageFormat.delta.value
+
+
+def _contents(count):
+    lines = [f"第 {n} 行：负责订单服务接口开发，QPS 提升 {n}%" for n in range(40)]
+    result = []
+    for i in range(count):
+        lines[i % len(lines)] = f"第 {i} 次修改"
+        result.append("\n".join(lines) + "\n")
+    return result
+
+
+def _write_chain(db, store, document, contents):
+    versions = []
+    for content in contents:
+        number = store.allocate_version_number(db, document)
+        base = store.latest_version(db, document.id)
+        versions.append(store.create_version(db, document.id, number, content, base=base))
+    db.commit()
+    return versions
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_round_trip_across_keyframe_boundary(db, document, compressed):
+    store = VersionStore(keyframe_interval=3, compressor=ContentCompressor(enabled=compressed))
+    contents = _contents(8)
+    versions = _write_chain(db, store, document, contents)
+
+    # 每 3 个版本一个关键帧：深度 0,1,2,0,1,2,0,1
+    assert [v.storage_format for v in versions] == [FULL, DELTA, DELTA] * 2 + [FULL, DELTA]
+    assert [v.delta_depth for v in versions] == [0, 1, 2, 0, 1, 2, 0, 1]
+    assert all(v.diff_from == prev.id for prev, v in zip(versions, versions[1:]))
+
+    # 换一个空缓存，从数据库沿差分链还原
+    store.cache = LRUTTLCache(max_entries=16, ttl=60)
+    db.expire_all()
+    for version, content in zip(versions, contents):
+        assert store.get_content(db, version) == content
+
+    previous = None
+    for version, content in zip(versions, contents):
+        assert store.next_content(db, version, previous) == content
+        previous = (version.id, content)
+
+
+def test_encode_delta_only_when_smaller(db, document):
+    store = VersionStore(keyframe_interval=10)
+    first, second = _write_chain(db, store, document, ["a\n", "完全不同的内容\n"])
+    assert first.storage_format == FULL
+    # 差分不比全文小时存为关键帧，但仍记录前一版本
+    assert second.storage_format == FULL
+    assert second.delta_depth == 0
+    assert second.diff_from == first.id
+
+
+def test_reencode_does_not_count_as_write(db, document):
+    store = VersionStore(keyframe_interval=3)
+    contents = _contents(5)
+    _write_chain(db, store, document, contents)
+    written = (store.keyframes_written, store.deltas_written, store.bytes_saved)
+
+    result = store.reencode_document(db, document.id)
+    db.commit()
+    assert result["versions"] == 5
+    assert (store.keyframes_written, store.deltas_written, store.bytes_saved) == written
+    assert store.versions_reencoded == 5
+
+    store.cache = LRUTTLCache(max_entries=16, ttl=60)
+    db.expire_all()
+    versions = db.query(document_models.DocumentVersion).filter(
+        document_models.DocumentVersion.document_id == document.id
+    ).order_by(document_models.DocumentVersion.version_number).all()
+    assert [store.get_content(db, v) for v in versions] == contents
+
+
+def test_allocate_version_number_precondition(db, document):
+    store = VersionStore()
+    assert store.allocate_version_number(db, document, expected=0) == 1
+    assert store.allocate_version_number(db, document, expected=1) == 2
+    db.commit()
+
+    with pytest.raises(VersionConflictError) as info:
+        store.allocate_version_number(db, document, expected=1)
+    assert info.value.current == 2
+    db.rollback()
+    db.refresh(document)
+    assert document.version_counter == 2
@@ -199,9 +199,39 @@ const CVPage = () => {
     }
   }, []);
 
+  // 打开编辑器时载入已登录用户保存在后端的当前简历（编辑器已有内容时不覆盖）
+  useEffect(() => {
+    if (!localStorage.getItem('user_id')) {
+      return;
+    }
+    let cancelled = false;
+    agentAPI.getCurrentDocument('resume')
+      .then((currentDoc) => {
+        if (!cancelled && currentDoc.content) {
+          setEditContent((current) => current || currentDoc.content);
+          setPreviewContent((current) => current || currentDoc.content);
+        }
+      })
+      .catch((error) => {
+        // 尚未保存过简历时返回 404
+        console.log('未载入已保存的简历:', error.message);
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, []);
+
   // 自动保存回调
   const handleAutoSave = useCallback((historyItem) => {
     saveHistoryItem(historyItem);
+
+    // 已登录时同步到后端（标记为自动保存，后端开启合并时一段时间内只写入一个版本）
+    const userId = localStorage.getItem('user_id');
+    if (userId) {
+      agentAPI.saveResume(historyItem.content, userId, { autosave: true }).catch((error) => {
+        console.error('自动保存到后端失败:', error);
+      });
+    }
   }, []);
 
   // 初始化自动保存管理器
@@ -166,9 +166,11 @@ const agentAPI = {
    * 保存简历到数据库
    * @param {string} content - 简历内容
    * @param {string} userId - 用户ID
+   * @param {Object} [options]
+   * @param {boolean} [options.autosave] - 自动保存：后端合并一段时间内的多次保存后再写入一个版本（返回 202）
    * @returns {Promise<Object>}
    */
-  saveResume: async (content, userId) => {
+  saveResume: async (content, userId, { autosave = false } = {}) => {
     const res = await fetch(`${API_BASE_URL}${API_ENDPOINTS.CV.SAVE}`, {
       method: 'POST',
       headers: getHeaders(),
@@ -176,6 +178,7 @@ const agentAPI = {
       body: JSON.stringify({
         user_id: userId,
         content_md: content,
+        autosave,
       }),
     });
     return handleResponse(res);
@@ -194,6 +197,20 @@ const agentAPI = {
     return handleResponse(res);
   },
 
+  /**
+   * 获取当前用户该类型的当前文档（含当前版本内容），后端有读穿缓存
+   * @param {string} docType - 文档类型（resume / personal_statement / recommendation）
+   * @returns {Promise<Object>}
+   */
+  getCurrentDocument: async (docType = 'resume') => {
+    const res = await fetch(`${API_BASE_URL}/api/documents/${docType}/current`, {
+      method: 'GET',
+      headers: getHeaders(),
+      credentials: 'include',
+    });
+    return handleResponse(res);
+  },
+
   /**
    * 为简历添加新版本
    * @param {string} docId - 文档ID